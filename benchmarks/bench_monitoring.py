@@ -0,0 +1,214 @@
+"""Нагрузочный бенчмарк мониторинга на локальной ферме фейковых сайтов.
+
+Поднимает aiohttp сервер, который изображает тысячи сайтов с заданной
+задержкой, долей ошибок и зависаний, и гоняет через них настоящие
+WebsiteChecker, MonitoringScheduler, ResultWriter и AsyncDatabase.
+Telegram заменен заглушкой, уведомления считаются, но никуда не уходят.
+
+Запуск из корня репозитория:
+
+    python -m benchmarks.bench_monitoring --sites 2000 --interval 10 --duration 60
+"""
+import argparse
+import asyncio
+import os
+import random
+import resource
+import statistics
+import tempfile
+import time
+
+from aiohttp import web
+
+from bot.checker import WebsiteChecker, PROBE_MODES
+from bot.database import Database, AsyncDatabase
+from bot.notifier import NotificationDispatcher
+from bot.scheduler import MonitoringScheduler
+from bot.registry import WebsiteRegistry
+from bot.writer import ResultWriter
+
+
+def site_profile(number, args):
+    """Поведение фейкового сайта: задержка в мс и режим ответа"""
+    rng = random.Random(number)
+    latency = max(0.0, rng.gauss(args.latency_ms, args.latency_spread_ms))
+    roll = rng.random()
+    if roll < args.timeout_rate:
+        return latency, 'timeout'
+    if roll < args.timeout_rate + args.error_rate:
+        return latency, 'error'
+    return latency, 'ok'
+
+
+def create_farm(args):
+    """aiohttp приложение, отвечающее за все фейковые сайты"""
+    profiles = {}
+
+    async def handler(request):
+        number = int(request.match_info['number'])
+        profile = profiles.get(number)
+        if profile is None:
+            profile = profiles[number] = site_profile(number, args)
+        latency, mode = profile
+        if mode == 'timeout':
+            await asyncio.sleep(args.check_timeout * 2)
+        else:
+            await asyncio.sleep(latency / 1000)
+        if mode == 'error':
+            return web.Response(status=500, text="error")
+        return web.Response(text="ok" * 256)
+
+    app = web.Application()
+    app.router.add_route('*', '/site/{number}', handler)
+    return app
+
+
+class StubBot:
+    """Заглушка Telegram бота"""
+
+    def __init__(self):
+        self.sent = 0
+
+    async def send_message(self, chat_id, text):
+        self.sent += 1
+
+
+class TimedDatabase(AsyncDatabase):
+    """AsyncDatabase, замеряющая пропускную способность записи"""
+
+    def __init__(self, db):
+        super().__init__(db)
+        self.rows_written = 0
+        self.write_time = 0.0
+        self.flushes = 0
+
+    async def save_check_results(self, results):
+        started = time.perf_counter()
+        await super().save_check_results(results)
+        self.write_time += time.perf_counter() - started
+        self.rows_written += len(results)
+        self.flushes += 1
+
+
+class RecordingWriter(ResultWriter):
+    """ResultWriter, запоминающий результаты для оценки точности замеров"""
+
+    def __init__(self, db, **kwargs):
+        super().__init__(db, **kwargs)
+        self.samples = []
+
+    async def put(self, website_id, result):
+        self.samples.append((website_id, result['status'], result['response_time'], time.perf_counter()))
+        await super().put(website_id, result)
+
+
+async def measure_loop_lag(samples, period=0.05):
+    """Замеряет, насколько event loop опаздывает с пробуждением"""
+    loop = asyncio.get_running_loop()
+    while True:
+        started = loop.time()
+        await asyncio.sleep(period)
+        samples.append((loop.time() - started - period) * 1000)
+
+
+def percentile(values, fraction):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+async def run(args):
+    workdir = tempfile.mkdtemp(prefix="monitor-bench-")
+    database = Database(f"sqlite:///{os.path.join(workdir, 'bench.db')}")
+
+    runner = web.AppRunner(create_farm(args))
+    await runner.setup()
+    site = web.TCPSite(runner, '127.0.0.1', 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+
+    # Сайты заводим одной транзакцией, чтобы подготовка не влияла на замер
+    database.add_user(1, 1)
+    with database.get_connection() as conn:
+        conn.executemany(
+            "INSERT INTO websites (url, user_id, check_interval, probe_mode) VALUES (?, ?, ?, ?)",
+            [(f"http://127.0.0.1:{port}/site/{number}", 1, args.interval, args.mode)
+             for number in range(args.sites)]
+        )
+        conn.commit()
+
+    db = TimedDatabase(database)
+    checker = WebsiteChecker(
+        timeout=args.check_timeout,
+        limit=args.concurrency,
+        limit_per_host=args.concurrency
+    )
+    await checker.start()
+    writer = RecordingWriter(db, batch_size=args.batch_size, flush_interval=args.flush_interval)
+    await writer.start()
+    bot = StubBot()
+    notifier = NotificationDispatcher(bot, rate=1000, chat_interval=0)
+    await notifier.start()
+    registry = WebsiteRegistry(db)
+    await registry.load()
+    scheduler = MonitoringScheduler(notifier, registry, checker, writer, concurrency=args.concurrency, jitter=1.0)
+
+    lag_samples = []
+    lag_task = asyncio.create_task(measure_loop_lag(lag_samples))
+    started = time.perf_counter()
+    await scheduler.start()
+    await asyncio.sleep(args.duration)
+    elapsed = time.perf_counter() - started
+
+    await scheduler.stop()
+    await writer.stop()
+    await notifier.stop()
+    lag_task.cancel()
+    await checker.close()
+    await db.close()
+    await runner.cleanup()
+
+    # Точность: измеренное время ответа минус заложенная задержка сайта
+    errors = []
+    for website_id, status, response_time, _ in writer.samples:
+        latency, mode = site_profile(website_id - 1, args)
+        if mode == 'ok' and status == 'up':
+            errors.append(response_time - latency)
+
+    checks = len(writer.samples)
+    print(f"Сайтов: {args.sites}, интервал: {args.interval} с, режим: {args.mode}, длительность: {elapsed:.1f} с")
+    print(f"Проверок: {checks} ({checks / elapsed:.1f}/с, "
+          f"ожидалось ~{args.sites / args.interval:.1f}/с в установившемся режиме)")
+    if errors:
+        print(f"Погрешность времени ответа, мс: медиана {statistics.median(errors):.2f}, "
+              f"p95 {percentile(errors, 0.95):.2f}, p99 {percentile(errors, 0.99):.2f}")
+    print(f"Задержка event loop, мс: медиана {percentile(lag_samples, 0.5):.2f}, "
+          f"p99 {percentile(lag_samples, 0.99):.2f}, максимум {max(lag_samples, default=0):.2f}")
+    if db.write_time:
+        print(f"Запись в базу: {db.rows_written} строк за {db.flushes} транзакций, "
+              f"{db.rows_written / db.write_time:.0f} строк/с во время записи")
+    print(f"Уведомлений отправлено: {bot.sent}")
+    print(f"Пиковая память процесса: {resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024:.1f} МБ")
+    print(f"База бенчмарка: {workdir}")
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sites', type=int, default=2000)
+    parser.add_argument('--interval', type=int, default=10, help="интервал проверки сайта, с")
+    parser.add_argument('--duration', type=float, default=30, help="длительность замера, с")
+    parser.add_argument('--mode', default='get', choices=PROBE_MODES)
+    parser.add_argument('--latency-ms', type=float, default=50)
+    parser.add_argument('--latency-spread-ms', type=float, default=20)
+    parser.add_argument('--error-rate', type=float, default=0.05)
+    parser.add_argument('--timeout-rate', type=float, default=0.01)
+    parser.add_argument('--check-timeout', type=float, default=2)
+    parser.add_argument('--concurrency', type=int, default=200)
+    parser.add_argument('--batch-size', type=int, default=500)
+    parser.add_argument('--flush-interval', type=float, default=1.0)
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    asyncio.run(run(parse_args()))
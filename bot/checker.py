@@ -1,28 +1,330 @@
 import aiohttp
 import asyncio
+import hashlib
+import socket
+import ssl
+import time
 from datetime import datetime
+from urllib.parse import urlsplit, urlunsplit
+from bot.metrics import PROBES, PROBE_DURATION
+
+DEFAULT_PORTS = {'http': 80, 'https': 443}
+
+# Режимы проверки: GET с отброшенным телом, HEAD, проверка TCP/TLS соединения
+# и проверка содержимого (ключевое слово и изменение тела)
+PROBE_MODES = ('get', 'head', 'tcp', 'content')
+DEFAULT_PROBE_MODE = 'get'
+
+
+def canonicalize_url(url):
+    """Приводит URL к каноническому виду, чтобы одинаковые адреса совпадали"""
+    parts = urlsplit(url.strip())
+    scheme = parts.scheme.lower()
+    host = (parts.hostname or '').lower()
+    if parts.port and parts.port != DEFAULT_PORTS.get(scheme):
+        host = f"{host}:{parts.port}"
+    if parts.username:
+        userinfo = parts.username
+        if parts.password:
+            userinfo += f":{parts.password}"
+        host = f"{userinfo}@{host}"
+    return urlunsplit((scheme, host, parts.path or '/', parts.query, ''))
+
 
 class WebsiteChecker:
+    def __init__(self, timeout=10, limit=100, limit_per_host=4,
+                 ttl_dns_cache=300, keepalive_timeout=30, drain_limit=65536, content_limit=1048576):
+        self.timeout = aiohttp.ClientTimeout(total=timeout)
+        self.limit = limit
+        self.limit_per_host = limit_per_host
+        self.ttl_dns_cache = ttl_dns_cache
+        self.keepalive_timeout = keepalive_timeout
+        # Сколько байт тела дочитываем, чтобы вернуть соединение в пул
+        self.drain_limit = drain_limit
+        # Сколько байт тела читает проверка содержимого
+        self.content_limit = content_limit
+        # Ключ проверки -> ETag, Last-Modified и итог последней полной проверки содержимого.
+        # Планировщик передает свой ключ (url, interval, mode, keyword): проверки одного
+        # адреса с разными интервалами не должны забирать друг у друга изменения тела
+
+        self._content_cache = {}
+        self.session = None
+
+    @classmethod
+    def from_config(cls, config):
+        """Создает проверщик с настройками пула из конфигурации"""
+        return cls(
+            timeout=config.check_timeout,
+            limit=config.checker_connection_limit,
+            limit_per_host=config.checker_connection_limit_per_host,
+            ttl_dns_cache=config.checker_dns_cache_ttl,
+            keepalive_timeout=config.checker_keepalive_timeout,
+            content_limit=config.content_max_bytes
+        )
+
+    async def start(self):
+        """Создает общую сессию с пулом соединений для всех проверок"""
+        if self.session is not None and not self.session.closed:
+            return
+
+        connector = aiohttp.TCPConnector(
+            limit=self.limit,
+            limit_per_host=self.limit_per_host,
+            use_dns_cache=True,
+            ttl_dns_cache=self.ttl_dns_cache,
+            keepalive_timeout=self.keepalive_timeout,
+            ssl=False
+        )
+        self.session = aiohttp.ClientSession(
+            connector=connector,
+            timeout=self.timeout,
+            trace_configs=[self._trace_config()]
+        )
+
     @staticmethod
-    async def check_website(url):
-        """Проверяет доступность сайта и возвращает результат"""
-        start_time = datetime.now()
+    def _trace_config():
+        """Хуки aiohttp, замеряющие фазы запроса в словарь trace_request_ctx"""
+
+        def started(phase):
+            async def hook(session, context, params):
+                context.trace_request_ctx[phase] = time.perf_counter()
+            return hook
+
+        def finished(phase):
+            async def hook(session, context, params):
+                timings = context.trace_request_ctx
+                started_at = timings.pop(phase, None)
+                if started_at is not None:
+                    timings[phase] = (time.perf_counter() - started_at) * 1000
+            return hook
+
+        trace_config = aiohttp.TraceConfig()
+        trace_config.on_dns_resolvehost_start.append(started('dns'))
+        trace_config.on_dns_resolvehost_end.append(finished('dns'))
+        # В aiohttp установка соединения включает TLS-рукопожатие
+        trace_config.on_connection_create_start.append(started('connect'))
+        trace_config.on_connection_create_end.append(finished('connect'))
+        return trace_config
+
+    async def close(self):
+        """Закрывает сессию и все соединения пула"""
+        if self.session is not None and not self.session.closed:
+            await self.session.close()
+        self.session = None
+
+    async def _drain(self, response):
+        """Дочитывает тело ответа, чтобы соединение можно было переиспользовать"""
+        received = 0
+        async for chunk in response.content.iter_chunked(16384):
+            received += len(chunk)
+            if received > self.drain_limit:
+                # Слишком большое тело: проще закрыть соединение, чем качать его целиком
+                response.close()
+                return
+
+    async def check_website(self, url, mode=DEFAULT_PROBE_MODE, keyword=None, cache_key=None):
+        """Проверяет доступность сайта и возвращает результат.
+
+        cache_key - ключ кэша проверки содержимого, по умолчанию (url, keyword).
+        """
+        started = time.perf_counter()
         try:
-            timeout = aiohttp.ClientTimeout(total=10)
-            async with aiohttp.ClientSession(timeout=timeout) as session:
-                async with session.get(url, ssl=False) as response:
-                    response_time = (datetime.now() - start_time).total_seconds() * 1000
-                    return {
-                        'status': 'up' if response.status < 400 else 'down',
-                        'status_code': response.status,
-                        'response_time': response_time,
-                        'timestamp': datetime.now()
+            if mode == 'tcp':
+                result = await self._check_connect(url)
+            elif mode == 'content':
+                result = await self._check_content(url, keyword, cache_key or (url, keyword))
+            else:
+                result = await self._check_http(url, mode)
+        except (aiohttp.ClientError, asyncio.TimeoutError, OSError) as e:
+            result = {
+                'status': 'down',
+                'status_code': 0,
+                'response_time': 0,
+                'timestamp': datetime.now(),
+                'error': str(e) or type(e).__name__
+            }
+
+        PROBES.inc(mode=mode, status=result['status'])
+        PROBE_DURATION.observe(time.perf_counter() - started, mode=mode)
+        return result
+
+    async def _check_http(self, url, mode):
+        """Проверка HTTP-запросом GET или HEAD с разбивкой времени по фазам.
+
+        У aiohttp нет отдельных хуков для TLS-рукопожатия: оно входит в фазу
+        connect (on_connection_create_*), поэтому 'tls' здесь всегда None.
+        Отдельно TLS замеряет только режим tcp.
+        """
+        if self.session is None or self.session.closed:
+            await self.start()
+
+        timings = {}
+        method = self.session.head if mode == 'head' else self.session.get
+        start_time = time.perf_counter()
+        async with method(url, trace_request_ctx=timings) as response:
+            response_time = (time.perf_counter() - start_time) * 1000
+            if mode != 'head':
+                await self._drain(response)
+            return {
+                'status': 'up' if response.status < 400 else 'down',
+                'status_code': response.status,
+                'response_time': response_time,
+                'timestamp': datetime.now(),
+                'timings': {
+                    'dns': timings.get('dns'),
+                    'connect': timings.get('connect'),
+                    'tls': None,
+                    'ttfb': response_time
+                }
+            }
+
+    async def _inspect_body(self, response, keyword):
+        """Читает тело по частям до content_limit байт, ищет ключевое слово и считает хэш.
+
+        Тело не накапливается: между частями хранится только хвост длиной
+        в ключевое слово без одного байта, чтобы найти слово на стыке частей.
+        """
+        needle = keyword.encode() if keyword else None
+        tail = b''
+        found = needle is None
+        digest = hashlib.sha256()
+        received = 0
+        truncated = False
+        async for chunk in response.content.iter_chunked(16384):
+            if received + len(chunk) > self.content_limit:
+                chunk = chunk[:self.content_limit - received]
+                truncated = True
+            received += len(chunk)
+            digest.update(chunk)
+            if not found:
+                window = tail + chunk
+                found = needle in window
+                tail = window[-(len(needle) - 1):] if len(needle) > 1 else b''
+            if truncated:
+                # Остаток тела не нужен: закрываем соединение, а не качаем его
+                response.close()
+                break
+        return found, digest.hexdigest(), received, truncated
+
+    def forget(self, cache_key):
+        """Забывает сохраненный итог проверки содержимого по ключу кэша"""
+        self._content_cache.pop(cache_key, None)
+
+    async def _check_content(self, url, keyword, cache_key):
+        """Проверка GET-запросом с разбором тела: ключевое слово и хэш содержимого.
+
+        Если сервер отдал ETag или Last-Modified, следующая проверка
+        условная: ответ 304 означает, что тело не изменилось, и прошлый
+        итог проверки переиспользуется без скачивания.
+        """
+        if self.session is None or self.session.closed:
+            await self.start()
+
+        cached = self._content_cache.get(cache_key)
+        headers = {}
+        if cached is not None:
+            if cached['etag']:
+                headers['If-None-Match'] = cached['etag']
+            if cached['last_modified']:
+                headers['If-Modified-Since'] = cached['last_modified']
+
+        timings = {}
+        start_time = time.perf_counter()
+        async with self.session.get(url, headers=headers, trace_request_ctx=timings) as response:
+            response_time = (time.perf_counter() - start_time) * 1000
+            not_modified = response.status == 304 and cached is not None
+            changed = False
+            if not_modified:
+                found, digest, size, truncated = cached['found'], cached['digest'], 0, cached['truncated']
+            else:
+                found, digest, size, truncated = await self._inspect_body(response, keyword)
+                if response.status < 400:
+                    # Изменение считается только относительно уже известного тела
+                    changed = cached is not None and cached['digest'] != digest
+                    self._content_cache[cache_key] = {
+                        'etag': response.headers.get('ETag'),
+                        'last_modified': response.headers.get('Last-Modified'),
+                        'found': found,
+                        'digest': digest,
+                        'truncated': truncated
                     }
-        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+
+            status = 'up' if response.status < 400 and found else 'down'
+            result = {
+                'status': status,
+                'status_code': response.status,
+                'response_time': response_time,
+                'timestamp': datetime.now(),
+                'timings': {
+                    'dns': timings.get('dns'),
+                    'connect': timings.get('connect'),
+                    'tls': None,
+                    'ttfb': response_time
+                },
+                'content': {
+                    'keyword_found': found,
+                    'digest': digest,
+                    'changed': changed,
+                    'bytes': size,
+                    'truncated': truncated,
+                    'not_modified': not_modified
+                }
+            }
+            if response.status < 400 and not found:
+                result['error'] = f"На странице нет ключевого слова «{keyword}»"
+            return result
+
+    async def _check_connect(self, url):
+        """Проверка только установкой TCP (и TLS для https) соединения"""
+        parts = urlsplit(url)
+        host = parts.hostname
+        try:
+            port = parts.port or DEFAULT_PORTS.get(parts.scheme, 80)
+        except ValueError:
+            host = None
+        if not host:
             return {
                 'status': 'down',
                 'status_code': 0,
                 'response_time': 0,
                 'timestamp': datetime.now(),
-                'error': str(e)
-            }
\ No newline at end of file
+                'error': f"Не удается определить хост и порт в адресе {url}"
+            }
+        loop = asyncio.get_running_loop()
+
+        async def connect():
+            started = time.perf_counter()
+            addresses = await loop.getaddrinfo(host, port, type=socket.SOCK_STREAM)
+            family, type_, proto, _, address = addresses[0]
+            dns_time = (time.perf_counter() - started) * 1000
+
+            started = time.perf_counter()
+            transport, protocol = await loop.create_connection(asyncio.Protocol, address[0], address[1])
+            connect_time = (time.perf_counter() - started) * 1000
+
+            tls_time = None
+            try:
+                if parts.scheme == 'https':
+                    started = time.perf_counter()
+                    context = ssl.create_default_context()
+                    context.check_hostname = False
+                    context.verify_mode = ssl.CERT_NONE
+                    transport = await loop.start_tls(transport, protocol, context, server_hostname=host)
+                    tls_time = (time.perf_counter() - started) * 1000
+            finally:
+                transport.close()
+            return dns_time, connect_time, tls_time
+
+        dns_time, connect_time, tls_time = await asyncio.wait_for(connect(), self.timeout.total)
+        return {
+            'status': 'up',
+            'status_code': None,
+            'response_time': dns_time + connect_time + (tls_time or 0),
+            'timestamp': datetime.now(),
+            'timings': {
+                'dns': dns_time,
+                'connect': connect_time,
+                'tls': tls_time,
+                'ttfb': None
+            }
+        }
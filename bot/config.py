@@ -4,4 +4,82 @@ from dataclasses import dataclass
 class Config:
     bot_token: str = ""
     db_url: str = "sqlite:///database/monitor.db"
+    # Пул соединений SQLAlchemy для db_url вида "postgresql+asyncpg://..."
+    # (для "sqlite:///..." используется встроенный sqlite3 без пула)
+    db_pool_size: int = 10
+    db_max_overflow: int = 20
+    db_pool_timeout: int = 30
+    db_pool_recycle: int = 1800
 
+    # Пул соединений проверщика сайтов
+    check_timeout: int = 10
+    checker_connection_limit: int = 100
+    checker_connection_limit_per_host: int = 4
+    checker_dns_cache_ttl: int = 300
+    checker_keepalive_timeout: int = 30
+    # Сколько байт тела читает проверка содержимого (режим content)
+    content_max_bytes: int = 1048576
+
+    # Отложенная запись результатов проверок
+    write_batch_size: int = 500
+    write_flush_interval: float = 1.0
+    write_queue_size: int = 10000
+
+    # Время жизни кэша статистики пользователя, секунд
+    stats_cache_ttl: int = 30
+    # Время жизни кэша SLA-отчета по каждому окну, секунд
+    report_cache_ttl: int = 300
+
+    # Планировщик проверок: одновременные проверки и разброс запусков (доля интервала)
+    probe_concurrency: int = 100
+    probe_jitter: float = 0.1
+
+    # Холодный старт: сайты читаются из базы страницами, а первые warmup_period
+    # секунд лимит одновременных проверок растет от warmup_concurrency до probe_concurrency
+    startup_page_size: int = 1000
+    warmup_period: int = 180
+    warmup_concurrency: int = 10
+
+    # Хранение истории: сколько дней держать сырые результаты и агрегаты
+    # (0 для дневных агрегатов - хранить всегда)
+    raw_retention_days: int = 7
+    minute_retention_days: int = 30
+    hourly_retention_days: int = 180
+    daily_retention_days: int = 0
+    compaction_interval: int = 3600
+    compaction_batch_size: int = 1000
+
+    # Отправка уведомлений: сообщений в секунду всего, пауза между сообщениями в один чат
+    notify_rate: int = 25
+    notify_chat_interval: float = 1.0
+    notify_max_in_flight: int = 10
+    notify_max_retries: int = 5
+
+    # Количество процессов-воркеров для проверок (0 - проверять в основном процессе)
+    worker_processes: int = 0
+    # Как часто воркеры присылают метрики проверок в основной процесс, секунд
+    worker_metrics_interval: float = 5.0
+
+    # Метрики в формате Prometheus на http://metrics_host:metrics_port/metrics (0 - выключены)
+    metrics_host: str = "127.0.0.1"
+    metrics_port: int = 0
+    loop_lag_interval: float = 0.5
+
+    # Адаптивные проверки: подтверждение смены статуса, редкие проверки упавших
+    # сайтов и подавление уведомлений о "мигающих" сайтах
+    confirm_probes: int = 2
+    confirm_delay: float = 5.0
+    down_backoff_factor: float = 2.0
+    down_backoff_max: int = 3600
+    flap_window: int = 3600
+    flap_threshold: int = 6
+    flap_reset: int = 2
+
+    # Получение обновлений: пустой webhook_url - long polling, иначе webhook,
+    # который принимает встроенный aiohttp сервер на webhook_host:webhook_port
+    webhook_url: str = ""
+    webhook_path: str = "/webhook"
+    webhook_host: str = "0.0.0.0"
+    webhook_port: int = 8080
+    webhook_secret: str = ""
+    webhook_max_updates: int = 100
@@ -1,23 +1,87 @@
 import sqlite3
 import os
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from contextlib import contextmanager
+from datetime import timedelta, timezone
+from functools import partial
+import numpy as np
+from bot.metrics import DB_OPERATIONS, DB_DURATION
+from bot.sketch import LatencySketch, register_sqlite_functions
+from bot.storage import StorageBackend, sqlite_path
+
+
+def to_db_timestamp(moment):
+    """Переводит время проверки в формат CURRENT_TIMESTAMP (UTC)"""
+    return moment.astimezone(timezone.utc).strftime('%Y-%m-%d %H:%M:%S')
+
+
+# Таблицы агрегатов, которые может прореживать фоновое сжатие
+ROLLUP_TABLES = ('check_results_minute', 'check_results_hourly', 'check_results_daily')
+
+# Слияние агрегата с уже существующим бакетом
+MERGE_BUCKET_SQL = (
+    "ON CONFLICT (website_id, bucket) DO UPDATE SET "
+    "total_checks = total_checks + excluded.total_checks, "
+    "up_checks = up_checks + excluded.up_checks, "
+    "response_time_sum = response_time_sum + excluded.response_time_sum, "
+    "response_time_min = MIN(response_time_min, excluded.response_time_min), "
+    "response_time_max = MAX(response_time_max, excluded.response_time_max), "
+    "response_time_sketch = sketch_merge(response_time_sketch, excluded.response_time_sketch)"
+)
+
+# Ключи текущей пачки сжатия, см. Database._select_batch
+COMPACTION_BATCH = "SELECT id FROM compaction_batch"
+
+# Ряд результатов проверок для отчетов: сайт, время (unix), проверок и успешных в точке
+SERIES_DTYPE = np.dtype([('website_id', np.int64), ('t', np.int64), ('total', np.int32), ('up', np.int32)])
+
+# Квантили времени ответа, которые показывает статистика
+LATENCY_QUANTILES = {'p50': 0.5, 'p95': 0.95, 'p99': 0.99}
+
+
+def to_hour_bucket(moment):
+    """Начало часа, в который попадает момент, в формате базы"""
+    return moment.astimezone(timezone.utc).strftime('%Y-%m-%d %H:00:00')
+
+
+def aggregate_by_minute(series):
+    """Складывает точки ряда одного сайта и одной минуты, результат отсортирован по сайту и времени"""
+    # Минуты от эпохи умещаются в 32 бита, поэтому сайт и минута кодируются одним числом
+    keys = (series['website_id'] << 32) | (series['t'] // 60)
+    keys, inverse = np.unique(keys, return_inverse=True)
+    aggregated = np.empty(len(keys), dtype=SERIES_DTYPE)
+    aggregated['website_id'] = keys >> 32
+    aggregated['t'] = (keys & 0xFFFFFFFF) * 60
+    aggregated['total'] = np.bincount(inverse, weights=series['total'], minlength=len(keys))
+    aggregated['up'] = np.bincount(inverse, weights=series['up'], minlength=len(keys))
+    return aggregated
+
+
+def first_full_hour(moment):
+    """Начало первого часа, целиком лежащего после момента (UTC, без микросекунд)"""
+    moment = moment.astimezone(timezone.utc).replace(microsecond=0)
+    hour = moment.replace(minute=0, second=0)
+    return hour if hour == moment else hour + timedelta(hours=1)
 
 
 class Database:
     def __init__(self, db_url):
-        if db_url.startswith('sqlite:///'):
-            db_path = db_url[10:]
-        else:
-            db_path = db_url
-
-        # Создаем абсолютный путь
-        self.db_path = os.path.abspath(db_path)
+        # Абсолютный путь к файлу из sqlite:///... или просто пути
+        self.db_path = sqlite_path(db_url)
 
         # Создаем директорию для базы данных если нужно
         db_dir = os.path.dirname(self.db_path)
         if db_dir:  # Если путь содержит директории
             os.makedirs(db_dir, exist_ok=True)
 
+        # Постоянные соединения: по одному на поток
+        self._local = threading.local()
+        self._connections = []
+        self._connections_lock = threading.Lock()
+
         print(f"База данных будет создана по пути: {self.db_path}")
         self.init_db()
 
@@ -55,25 +119,164 @@ class Database:
                         FOREIGN KEY (website_id) REFERENCES websites (id)
                     )
                 ''')
+                self.migrate(conn)
                 conn.commit()
                 print("База данных успешно инициализирована")
         except Exception as e:
             print(f"Ошибка при инициализации базы данных: {e}")
             raise
 
+    def migrate(self, conn):
+        """Применяет недостающие миграции, версия схемы хранится в user_version"""
+        version = conn.execute("PRAGMA user_version").fetchone()[0]
+        for number, migration in enumerate(self.MIGRATIONS[version:], start=version + 1):
+            migration(self, conn)
+            conn.execute(f"PRAGMA user_version = {number}")
+            print(f"Применена миграция базы данных №{number}")
+
+    def _migration_rollups(self, conn):
+        """Индексы по check_results и агрегаты статистики с заполнением из истории"""
+        conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_check_results_website_time "
+            "ON check_results (website_id, timestamp)"
+        )
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS website_stats (
+                website_id INTEGER PRIMARY KEY,
+                total_checks INTEGER NOT NULL DEFAULT 0,
+                up_checks INTEGER NOT NULL DEFAULT 0,
+                response_time_sum REAL NOT NULL DEFAULT 0,
+                FOREIGN KEY (website_id) REFERENCES websites (id)
+            )
+        ''')
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS check_results_hourly (
+                website_id INTEGER NOT NULL,
+                bucket DATETIME NOT NULL,
+                total_checks INTEGER NOT NULL DEFAULT 0,
+                up_checks INTEGER NOT NULL DEFAULT 0,
+                response_time_sum REAL NOT NULL DEFAULT 0,
+                response_time_min REAL,
+                response_time_max REAL,
+                PRIMARY KEY (website_id, bucket),
+                FOREIGN KEY (website_id) REFERENCES websites (id)
+            )
+        ''')
+        conn.execute('''
+            INSERT OR REPLACE INTO website_stats (website_id, total_checks, up_checks, response_time_sum)
+            SELECT website_id, COUNT(*), SUM(status = 'up'), COALESCE(SUM(response_time), 0)
+            FROM check_results GROUP BY website_id
+        ''')
+        conn.execute('''
+            INSERT OR REPLACE INTO check_results_hourly
+                (website_id, bucket, total_checks, up_checks, response_time_sum,
+                 response_time_min, response_time_max)
+            SELECT website_id, strftime('%Y-%m-%d %H:00:00', timestamp), COUNT(*), SUM(status = 'up'),
+                   COALESCE(SUM(response_time), 0), MIN(response_time), MAX(response_time)
+            FROM check_results GROUP BY website_id, strftime('%Y-%m-%d %H:00:00', timestamp)
+        ''')
+
+    def _migration_retention(self, conn):
+        """Агрегаты по минутам и дням для прореживания старых результатов"""
+        for table in ('check_results_minute', 'check_results_daily'):
+            conn.execute(f'''
+                CREATE TABLE IF NOT EXISTS {table} (
+                    website_id INTEGER NOT NULL,
+                    bucket DATETIME NOT NULL,
+                    total_checks INTEGER NOT NULL DEFAULT 0,
+                    up_checks INTEGER NOT NULL DEFAULT 0,
+                    response_time_sum REAL NOT NULL DEFAULT 0,
+                    response_time_min REAL,
+                    response_time_max REAL,
+                    PRIMARY KEY (website_id, bucket),
+                    FOREIGN KEY (website_id) REFERENCES websites (id)
+                )
+            ''')
+        for table in ROLLUP_TABLES:
+            conn.execute(f"CREATE INDEX IF NOT EXISTS idx_{table}_bucket ON {table} (bucket)")
+        conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_check_results_timestamp ON check_results (timestamp)"
+        )
+
+    @staticmethod
+    def _add_column(conn, table, column, definition):
+        """Добавляет столбец, если его еще нет"""
+        columns = {row['name'] for row in conn.execute(f"PRAGMA table_info({table})")}
+        if column not in columns:
+            conn.execute(f"ALTER TABLE {table} ADD COLUMN {column} {definition}")
+
+    def _migration_probe_modes(self, conn):
+        """Режим проверки сайта и время по фазам для каждого результата"""
+        self._add_column(conn, 'websites', 'probe_mode', "TEXT DEFAULT 'get'")
+        for column in ('dns_time', 'connect_time', 'tls_time', 'ttfb_time'):
+            self._add_column(conn, 'check_results', column, 'REAL')
+
+    def _migration_latency_sketches(self, conn):
+        """Скетчи квантилей времени ответа в агрегатах, часовые заполняются из истории"""
+        for table in ROLLUP_TABLES:
+            self._add_column(conn, table, 'response_time_sketch', 'BLOB')
+        conn.execute('''
+            UPDATE check_results_hourly SET response_time_sketch = (
+                SELECT sketch_of(CASE WHEN r.status = 'up' THEN r.response_time END)
+                FROM check_results r
+                WHERE r.website_id = check_results_hourly.website_id
+                  AND strftime('%Y-%m-%d %H:00:00', r.timestamp) = check_results_hourly.bucket
+            )
+        ''')
+
+    def _migration_content_checks(self, conn):
+        """Ключевое слово для проверки содержимого"""
+        self._add_column(conn, 'websites', 'content_keyword', 'TEXT')
+
+    def _migration_user_websites_index(self, conn):
+        """Индекс для постраничного вывода сайтов пользователя"""
+        conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_websites_user_active ON websites (user_id, is_active, id)"
+        )
+
+    def _migration_covering_results_index(self, conn):
+        """Индекс результатов со статусом: поминутный ряд для отчетов читается без обращения к таблице"""
+        conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_check_results_website_time_status "
+            "ON check_results (website_id, timestamp, status)"
+        )
+        conn.execute("DROP INDEX IF EXISTS idx_check_results_website_time")
+
+    MIGRATIONS = [
+        _migration_rollups,
+        _migration_retention,
+        _migration_probe_modes,
+        _migration_latency_sketches,
+        _migration_content_checks,
+        _migration_user_websites_index,
+        _migration_covering_results_index,
+    ]
+
+    def _connect(self):
+        """Открывает соединение и включает WAL, чтобы чтение не ждало запись"""
+        conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute("PRAGMA busy_timeout=5000")
+        register_sqlite_functions(conn)
+        return conn
+
     @contextmanager
     def get_connection(self):
         try:
-            conn = sqlite3.connect(self.db_path)
-            conn.row_factory = sqlite3.Row
+            conn = getattr(self._local, 'conn', None)
+            if conn is None:
+                conn = self._connect()
+                self._local.conn = conn
+                with self._connections_lock:
+                    self._connections.append(conn)
             try:
                 yield conn
             except Exception as e:
                 conn.rollback()
                 print(f"Ошибка в транзакции: {e}")
                 raise
-            finally:
-                conn.close()
         except sqlite3.Error as e:
             print(f"Ошибка подключения к базе данных: {e}")
             print(f"Путь к базе: {self.db_path}")
@@ -92,13 +295,14 @@ class Database:
                 print(f"Ошибка при добавлении пользователя: {e}")
                 return False
 
-    def add_website(self, user_id, url, interval):
+    def add_website(self, user_id, url, interval, probe_mode='get', content_keyword=None):
         with self.get_connection() as conn:
             try:
                 cursor = conn.cursor()
                 cursor.execute(
-                    "INSERT INTO websites (url, user_id, check_interval, last_status) VALUES (?, ?, ?, ?)",
-                    (url, user_id, interval, 'unknown')
+                    "INSERT INTO websites (url, user_id, check_interval, last_status, probe_mode, content_keyword) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    (url, user_id, interval, 'unknown', probe_mode, content_keyword)
                 )
                 conn.commit()
                 return cursor.lastrowid
@@ -106,6 +310,34 @@ class Database:
                 print(f"Ошибка при добавлении сайта: {e}")
                 return None
 
+    def add_websites(self, user_id, rows):
+        """Добавляет сайты пачкой в одной транзакции.
+
+        rows - кортежи (url, interval, probe_mode). Возвращает словари
+        добавленных сайтов или пустой список при ошибке.
+        """
+        with self.get_connection() as conn:
+            try:
+                # id берем из lastrowid каждой вставки: так они верны, даже если
+                # в базу параллельно пишет другое соединение
+                websites = []
+                for url, interval, probe_mode in rows:
+                    cursor = conn.execute(
+                        "INSERT INTO websites (url, user_id, check_interval, last_status, probe_mode) "
+                        "VALUES (?, ?, ?, 'unknown', ?)",
+                        (url, user_id, interval, probe_mode)
+                    )
+                    websites.append({
+                        'id': cursor.lastrowid, 'url': url, 'user_id': user_id, 'check_interval': interval,
+                        'last_status': 'unknown', 'probe_mode': probe_mode, 'content_keyword': None
+                    })
+                conn.commit()
+                return websites
+            except sqlite3.Error as e:
+                conn.rollback()
+                print(f"Ошибка при импорте сайтов: {e}")
+                return []
+
     def get_user_websites(self, user_id):
         with self.get_connection() as conn:
             try:
@@ -138,15 +370,448 @@ class Database:
             try:
                 cursor = conn.cursor()
 
-                # Общая статистика
+                # Общая статистика из инкрементальных счетчиков
                 cursor.execute(
-                    "SELECT COUNT(*) as total_checks, "
-                    "SUM(CASE WHEN status = 'up' THEN 1 ELSE 0 END) as up_checks, "
-                    "AVG(response_time) as avg_response_time "
-                    "FROM check_results WHERE website_id = ?",
+                    "SELECT COALESCE(s.total_checks, 0) as total_checks, "
+                    "COALESCE(s.up_checks, 0) as up_checks, "
+                    "CASE WHEN s.total_checks > 0 THEN s.response_time_sum / s.total_checks ELSE 0 END "
+                    "as avg_response_time "
+                    "FROM websites w LEFT JOIN website_stats s ON s.website_id = w.id "
+                    "WHERE w.id = ?",
                     (website_id,)
                 )
                 return cursor.fetchone()
             except sqlite3.Error as e:
                 print(f"Ошибка при получении статистики: {e}")
-                return None
\ No newline at end of file
+                return None
+
+    def get_user_websites_stats(self, user_id):
+        """Статистика по всем активным сайтам пользователя одним запросом"""
+        with self.get_connection() as conn:
+            try:
+                cursor = conn.cursor()
+                cursor.execute(
+                    "SELECT w.id, w.url, w.check_interval, w.last_status, "
+                    "COALESCE(s.total_checks, 0) as total_checks, "
+                    "COALESCE(s.up_checks, 0) as up_checks, "
+                    "CASE WHEN s.total_checks > 0 THEN s.response_time_sum / s.total_checks ELSE 0 END "
+                    "as avg_response_time "
+                    "FROM websites w LEFT JOIN website_stats s ON s.website_id = w.id "
+                    "WHERE w.user_id = ? AND w.is_active = TRUE "
+                    "ORDER BY w.id",
+                    (user_id,)
+                )
+                return cursor.fetchall()
+            except sqlite3.Error as e:
+                print(f"Ошибка при получении статистики: {e}")
+                return []
+
+    def get_hourly_stats(self, website_id, since):
+        """Часовые агрегаты сайта начиная с момента since"""
+        with self.get_connection() as conn:
+            try:
+                cursor = conn.cursor()
+                cursor.execute(
+                    "SELECT bucket, total_checks, up_checks, "
+                    "response_time_sum / total_checks as avg_response_time, "
+                    "response_time_min, response_time_max "
+                    "FROM check_results_hourly WHERE website_id = ? AND bucket >= ? "
+                    "ORDER BY bucket",
+                    (website_id, to_hour_bucket(since))
+                )
+                return cursor.fetchall()
+            except sqlite3.Error as e:
+                print(f"Ошибка при получении статистики: {e}")
+                return []
+
+    def get_user_latency_percentiles(self, user_id, since):
+        """Квантили времени ответа по сайтам пользователя с момента since.
+
+        Полные часы окна берутся из часовых скетчей, неполный первый час -
+        из сырых результатов и минутных агрегатов, поэтому окно начинается
+        ровно в since. Стоимость зависит от числа часов в окне, а не от числа
+        проверок. Возвращает словарь website_id -> {'p50': ..., 'p95': ..., 'p99': ...}.
+        """
+        full_hour = to_db_timestamp(first_full_hour(since))
+        since = to_db_timestamp(since)
+        with self.get_connection() as conn:
+            try:
+                cursor = conn.execute(
+                    "SELECT website_id, sketch_union(sketch) as sketch FROM ("
+                    "SELECT h.website_id, h.response_time_sketch AS sketch "
+                    "FROM check_results_hourly h JOIN websites w ON w.id = h.website_id "
+                    "WHERE w.user_id = ? AND w.is_active = TRUE AND h.bucket >= ? "
+                    "UNION ALL "
+                    "SELECT m.website_id, m.response_time_sketch "
+                    "FROM check_results_minute m JOIN websites w ON w.id = m.website_id "
+                    "WHERE w.user_id = ? AND w.is_active = TRUE AND m.bucket >= ? AND m.bucket < ? "
+                    "UNION ALL "
+                    "SELECT r.website_id, sketch_of(CASE WHEN r.status = 'up' THEN r.response_time END) "
+                    "FROM check_results r JOIN websites w ON w.id = r.website_id "
+                    "WHERE w.user_id = ? AND w.is_active = TRUE AND r.timestamp >= ? AND r.timestamp < ? "
+                    "GROUP BY r.website_id"
+                    ") GROUP BY website_id",
+                    (user_id, full_hour, user_id, since, full_hour, user_id, since, full_hour)
+                )
+                percentiles = {}
+                for row in cursor.fetchall():
+                    sketch = LatencySketch.from_bytes(row['sketch'])
+                    if sketch.count:
+                        percentiles[row['website_id']] = {
+                            name: sketch.quantile(q) for name, q in LATENCY_QUANTILES.items()
+                        }
+                return percentiles
+            except sqlite3.Error as e:
+                print(f"Ошибка при получении статистики: {e}")
+                return {}
+
+    def get_user_check_series(self, user_id, since):
+        """Поминутный ряд результатов по активным сайтам пользователя с момента since.
+
+        Сырые результаты читаются по покрывающему индексу, без обращения к
+        таблице, дополняются минутными агрегатами, в которые свернута старая
+        история, и сворачиваются по минутам векторно в NumPy. Возвращает
+        массив SERIES_DTYPE, отсортированный по сайту и времени.
+        """
+        since = to_db_timestamp(since)
+        return aggregate_by_minute(self._read_series(
+            "SELECT r.website_id, substr(r.timestamp, 1, 16), 1, r.status = 'up' "
+            "FROM check_results r JOIN websites w ON w.id = r.website_id "
+            "WHERE w.user_id = ? AND w.is_active = TRUE AND r.timestamp >= ? "
+            "UNION ALL "
+            "SELECT m.website_id, substr(m.bucket, 1, 16), m.total_checks, m.up_checks "
+            "FROM check_results_minute m JOIN websites w ON w.id = m.website_id "
+            "WHERE w.user_id = ? AND w.is_active = TRUE AND m.bucket >= ?",
+            (user_id, since, user_id, since)
+        ))
+
+    def get_user_hourly_series(self, user_id, since, until):
+        """Почасовой ряд результатов из часовых агрегатов за [since, until)"""
+        series = self._read_series(
+            "SELECT h.website_id, substr(h.bucket, 1, 16), h.total_checks, h.up_checks "
+            "FROM check_results_hourly h JOIN websites w ON w.id = h.website_id "
+            "WHERE w.user_id = ? AND w.is_active = TRUE AND h.bucket >= ? AND h.bucket < ?",
+            (user_id, to_db_timestamp(since), to_db_timestamp(until))
+        )
+        return series[np.lexsort((series['t'], series['website_id']))]
+
+    def _read_series(self, query, params):
+        """Строки (сайт, минута UTC 'YYYY-MM-DD HH:MM', проверок, успешных) в массив SERIES_DTYPE.
+
+        Строки забираются обычными кортежами, а время разбирается векторно:
+        без sqlite3.Row и strftime на каждую строку.
+        """
+        with self.get_connection() as conn:
+            try:
+                cursor = conn.cursor()
+                cursor.row_factory = None
+                rows = cursor.execute(query, params).fetchall()
+            except sqlite3.Error as e:
+                print(f"Ошибка при получении истории проверок: {e}")
+                rows = []
+
+        series = np.empty(len(rows), dtype=SERIES_DTYPE)
+        if rows:
+            website_ids, moments, totals, ups = zip(*rows)
+            series['website_id'] = website_ids
+            series['t'] = np.array(moments, dtype='datetime64[m]').astype('datetime64[s]').astype(np.int64)
+            series['total'] = totals
+            series['up'] = ups
+        return series
+
+    def get_active_websites_page(self, after_id, limit):
+        """Страница активных сайтов с id больше after_id (пагинация по ключу)"""
+        with self.get_connection() as conn:
+            try:
+                cursor = conn.execute(
+                    "SELECT * FROM websites WHERE is_active = TRUE AND id > ? ORDER BY id LIMIT ?",
+                    (after_id, limit)
+                )
+                return cursor.fetchall()
+            except sqlite3.Error as e:
+                print(f"Ошибка при получении сайтов: {e}")
+                return []
+
+    def get_user_websites_page(self, user_id, after_id=0, limit=20, before_id=None):
+        """Страница активных сайтов пользователя по ключу id.
+
+        Сайты с id больше after_id, а если задан before_id - последние
+        limit сайтов с id меньше before_id. Порядок всегда по возрастанию id.
+        """
+        with self.get_connection() as conn:
+            try:
+                if before_id is None:
+                    cursor = conn.execute(
+                        "SELECT * FROM websites WHERE user_id = ? AND is_active = TRUE AND id > ? "
+                        "ORDER BY id LIMIT ?",
+                        (user_id, after_id, limit)
+                    )
+                    return cursor.fetchall()
+                cursor = conn.execute(
+                    "SELECT * FROM websites WHERE user_id = ? AND is_active = TRUE AND id < ? "
+                    "ORDER BY id DESC LIMIT ?",
+                    (user_id, before_id, limit)
+                )
+                return cursor.fetchall()[::-1]
+            except sqlite3.Error as e:
+                print(f"Ошибка при получении сайтов: {e}")
+                return []
+
+    def get_active_websites(self):
+        with self.get_connection() as conn:
+            try:
+                cursor = conn.cursor()
+                cursor.execute("SELECT * FROM websites WHERE is_active = TRUE")
+                return cursor.fetchall()
+            except sqlite3.Error as e:
+                print(f"Ошибка при получении сайтов: {e}")
+                return []
+
+    def save_check_results(self, results):
+        """Сохраняет пачку результатов проверок одной транзакцией"""
+        with self.get_connection() as conn:
+            conn.executemany(
+                "INSERT INTO check_results (website_id, status, status_code, response_time, timestamp, "
+                "dns_time, connect_time, tls_time, ttfb_time) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                [(website_id, result['status'], result['status_code'], result['response_time'],
+                  to_db_timestamp(result['timestamp']), *self._phase_timings(result))
+                 for website_id, result in results]
+            )
+            conn.executemany(
+                "UPDATE websites SET last_status = ?, last_response_time = ? WHERE id = ?",
+                [(result.get('confirmed_status', result['status']), result['response_time'], website_id)
+                 for website_id, result in results]
+            )
+            self._update_rollups(conn, results)
+            conn.commit()
+
+    @staticmethod
+    def _phase_timings(result):
+        timings = result.get('timings') or {}
+        return timings.get('dns'), timings.get('connect'), timings.get('tls'), timings.get('ttfb')
+
+    def _update_rollups(self, conn, results):
+        """Добавляет пачку результатов в счетчики сайтов и часовые агрегаты"""
+        totals = {}
+        hourly = {}
+        for website_id, result in results:
+            up = 1 if result['status'] == 'up' else 0
+            response_time = result['response_time'] or 0
+
+            total = totals.setdefault(website_id, [0, 0, 0.0])
+            total[0] += 1
+            total[1] += up
+            total[2] += response_time
+
+            key = (website_id, to_hour_bucket(result['timestamp']))
+            bucket = hourly.get(key)
+            if bucket is None:
+                bucket = hourly[key] = [1, up, response_time, response_time, response_time, LatencySketch()]
+            else:
+                bucket[0] += 1
+                bucket[1] += up
+                bucket[2] += response_time
+                bucket[3] = min(bucket[3], response_time)
+                bucket[4] = max(bucket[4], response_time)
+            # В квантили идут только успешные проверки: у упавших времени ответа нет
+            if up:
+                bucket[5].add(response_time)
+
+        conn.executemany(
+            "INSERT INTO website_stats (website_id, total_checks, up_checks, response_time_sum) "
+            "VALUES (?, ?, ?, ?) "
+            "ON CONFLICT (website_id) DO UPDATE SET "
+            "total_checks = total_checks + excluded.total_checks, "
+            "up_checks = up_checks + excluded.up_checks, "
+            "response_time_sum = response_time_sum + excluded.response_time_sum",
+            [(website_id, *total) for website_id, total in totals.items()]
+        )
+        conn.executemany(
+            "INSERT INTO check_results_hourly (website_id, bucket, total_checks, up_checks, "
+            "response_time_sum, response_time_min, response_time_max, response_time_sketch) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?) " + MERGE_BUCKET_SQL,
+            [(*key, *bucket[:5], bucket[5].to_bytes() if bucket[5].count else None)
+             for key, bucket in hourly.items()]
+        )
+
+    @staticmethod
+    def _select_batch(conn, query, params):
+        """Запоминает ключи пачки во временной таблице соединения.
+
+        Свертка и удаление берут строки из нее, а не повторяют подзапрос с
+        LIMIT: иначе на границе пачки с одинаковым временем они могли бы
+        выбрать разные строки и посчитать их дважды или потерять.
+        """
+        conn.execute("CREATE TEMP TABLE IF NOT EXISTS compaction_batch (id INTEGER PRIMARY KEY)")
+        conn.execute("DELETE FROM compaction_batch")
+        conn.execute(f"INSERT INTO compaction_batch (id) {query}", params)
+
+    def compact_raw_results(self, cutoff, batch_size):
+        """Сворачивает пачку сырых результатов старше cutoff в минутные агрегаты.
+
+        Возвращает количество удаленных строк; транзакция короткая, чтобы
+        не держать блокировку записи.
+        """
+        with self.get_connection() as conn:
+            self._select_batch(
+                conn,
+                "SELECT id FROM check_results WHERE timestamp < ? ORDER BY timestamp, id LIMIT ?",
+                (to_db_timestamp(cutoff), batch_size)
+            )
+            conn.execute(
+                "INSERT INTO check_results_minute (website_id, bucket, total_checks, up_checks, "
+                "response_time_sum, response_time_min, response_time_max, response_time_sketch) "
+                "SELECT website_id, strftime('%Y-%m-%d %H:%M:00', timestamp), COUNT(*), SUM(status = 'up'), "
+                "COALESCE(SUM(response_time), 0), MIN(response_time), MAX(response_time), "
+                "sketch_of(CASE WHEN status = 'up' THEN response_time END) "
+                f"FROM check_results WHERE id IN ({COMPACTION_BATCH}) "
+                "GROUP BY website_id, strftime('%Y-%m-%d %H:%M:00', timestamp) " + MERGE_BUCKET_SQL
+            )
+            deleted = conn.execute(f"DELETE FROM check_results WHERE id IN ({COMPACTION_BATCH})").rowcount
+            conn.commit()
+            return deleted
+
+    def compact_hourly_stats(self, cutoff, batch_size):
+        """Сворачивает пачку часовых агрегатов старше cutoff в дневные"""
+        with self.get_connection() as conn:
+            self._select_batch(
+                conn,
+                "SELECT rowid FROM check_results_hourly WHERE bucket < ? ORDER BY bucket, website_id LIMIT ?",
+                (to_db_timestamp(cutoff), batch_size)
+            )
+            conn.execute(
+                "INSERT INTO check_results_daily (website_id, bucket, total_checks, up_checks, "
+                "response_time_sum, response_time_min, response_time_max, response_time_sketch) "
+                "SELECT website_id, strftime('%Y-%m-%d 00:00:00', bucket), SUM(total_checks), SUM(up_checks), "
+                "SUM(response_time_sum), MIN(response_time_min), MAX(response_time_max), "
+                "sketch_union(response_time_sketch) "
+                f"FROM check_results_hourly WHERE rowid IN ({COMPACTION_BATCH}) "
+                "GROUP BY website_id, strftime('%Y-%m-%d 00:00:00', bucket) " + MERGE_BUCKET_SQL
+            )
+            deleted = conn.execute(
+                f"DELETE FROM check_results_hourly WHERE rowid IN ({COMPACTION_BATCH})"
+            ).rowcount
+            conn.commit()
+            return deleted
+
+    def prune_rollup(self, table, cutoff, batch_size):
+        """Удаляет пачку бакетов агрегата старше cutoff"""
+        if table not in ROLLUP_TABLES:
+            raise ValueError(f"Неизвестная таблица агрегатов: {table}")
+        with self.get_connection() as conn:
+            deleted = conn.execute(
+                f"DELETE FROM {table} WHERE rowid IN "
+                f"(SELECT rowid FROM {table} WHERE bucket < ? ORDER BY bucket, website_id LIMIT ?)",
+                (to_db_timestamp(cutoff), batch_size)
+            ).rowcount
+            conn.commit()
+            return deleted
+
+    def close(self):
+        """Закрывает все постоянные соединения"""
+        with self._connections_lock:
+            connections, self._connections = self._connections, []
+        for conn in connections:
+            conn.close()
+        self._local = threading.local()
+
+
+class AsyncDatabase(StorageBackend):
+    """Асинхронный фасад над Database.
+
+    Запись идет через единственный поток-писатель, чтение - через отдельный
+    пул потоков. У каждого потока свое постоянное соединение, а WAL позволяет
+    читателям не ждать писателя, поэтому event loop никогда не блокируется на диске.
+    """
+
+    def __init__(self, db, readers=2, stats_cache_ttl=30):
+        super().__init__(stats_cache_ttl)
+        self.db = db
+        self._writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="db-writer")
+        self._readers = ThreadPoolExecutor(max_workers=readers, thread_name_prefix="db-reader")
+
+    async def _run(self, executor, func, *args):
+        loop = asyncio.get_running_loop()
+        started = time.perf_counter()
+        result = 'ok'
+        try:
+            return await loop.run_in_executor(executor, partial(func, *args))
+        except Exception:
+            result = 'error'
+            raise
+        finally:
+            DB_OPERATIONS.inc(operation=func.__name__, result=result)
+            DB_DURATION.observe(time.perf_counter() - started, operation=func.__name__)
+
+    async def _write(self, func, *args):
+        return await self._run(self._writer, func, *args)
+
+    async def _read(self, func, *args):
+        return await self._run(self._readers, func, *args)
+
+    async def add_user(self, user_id, chat_id):
+        return await self._write(self.db.add_user, user_id, chat_id)
+
+    async def add_website(self, user_id, url, interval, probe_mode='get', content_keyword=None):
+        self._invalidate_stats(user_id)
+        return await self._write(self.db.add_website, user_id, url, interval, probe_mode, content_keyword)
+
+    async def add_websites(self, user_id, rows):
+        self._invalidate_stats(user_id)
+        return await self._write(self.db.add_websites, user_id, rows)
+
+    async def delete_website(self, user_id, website_id):
+        self._invalidate_stats(user_id)
+        return await self._write(self.db.delete_website, user_id, website_id)
+
+    async def save_check_results(self, results):
+        await self._write(self.db.save_check_results, results)
+        self._invalidate_stats_for_results(results)
+
+    async def get_user_websites(self, user_id):
+        return await self._read(self.db.get_user_websites, user_id)
+
+    async def get_website_stats(self, website_id):
+        return await self._read(self.db.get_website_stats, website_id)
+
+    async def get_user_websites_stats(self, user_id):
+        """Статистика по сайтам пользователя с коротким кэшем"""
+        return await self._cached_user_stats(user_id, partial(self._read, self.db.get_user_websites_stats))
+
+    async def get_hourly_stats(self, website_id, since):
+        return await self._read(self.db.get_hourly_stats, website_id, since)
+
+    async def get_user_latency_percentiles(self, user_id, since):
+        return await self._read(self.db.get_user_latency_percentiles, user_id, since)
+
+    async def get_user_check_series(self, user_id, since):
+        return await self._read(self.db.get_user_check_series, user_id, since)
+
+    async def get_user_hourly_series(self, user_id, since, until):
+        return await self._read(self.db.get_user_hourly_series, user_id, since, until)
+
+    async def get_user_websites_page(self, user_id, after_id=0, limit=20, before_id=None):
+        return await self._read(self.db.get_user_websites_page, user_id, after_id, limit, before_id)
+
+    async def get_active_websites(self):
+        return await self._read(self.db.get_active_websites)
+
+    async def get_active_websites_page(self, after_id, limit):
+        return await self._read(self.db.get_active_websites_page, after_id, limit)
+
+    async def compact_raw_results(self, cutoff, batch_size):
+        return await self._write(self.db.compact_raw_results, cutoff, batch_size)
+
+    async def compact_hourly_stats(self, cutoff, batch_size):
+        return await self._write(self.db.compact_hourly_stats, cutoff, batch_size)
+
+    async def prune_rollup(self, table, cutoff, batch_size):
+        return await self._write(self.db.prune_rollup, table, cutoff, batch_size)
+
+    async def close(self):
+        """Дожидается завершения запросов и закрывает соединения"""
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(None, self._writer.shutdown)
+        await loop.run_in_executor(None, self._readers.shutdown)
+        self.db.close()
\ No newline at end of file
@@ -0,0 +1,183 @@
+import asyncio
+import heapq
+import itertools
+import random
+
+
+class ProbeEngine:
+    """Планировщик периодических проверок на min-heap.
+
+    Каждая задача - это ключ с интервалом. Ближайшие сроки лежат в куче,
+    один диспетчер ждет ближайший срок и передает ключ ограниченному пулу
+    воркеров. Если probe возвращает число, следующий запуск переносится
+    на столько секунд от момента окончания проверки. Добавление и перепланирование стоят O(log n), отмена - O(1):
+    устаревшие записи кучи просто пропускаются при извлечении.
+
+    Первые warmup секунд после запуска одновременных проверок разрешено
+    меньше: лимит линейно растет от warmup_concurrency до concurrency, чтобы
+    холодный старт не обрушил на сеть и базу все проверки сразу.
+    """
+
+    # Как часто пересчитывать лимит прогрева, пока диспетчер ждет свободное место
+    RAMP_STEP = 0.5
+
+    def __init__(self, probe, concurrency=100, jitter=0.1, warmup=0, warmup_concurrency=None):
+        self.probe = probe
+        self.concurrency = concurrency
+        self.jitter = jitter
+        self.warmup = warmup
+        self.warmup_concurrency = warmup_concurrency if warmup_concurrency is not None else max(1, concurrency // 10)
+        self._started_at = None
+        self._slot_freed = asyncio.Event()
+        self._heap = []
+        # key -> [interval, seq, base]: актуальная запись кучи и опорное время
+        self._entries = {}
+        self._running = set()
+        self._counter = itertools.count()
+        self._wakeup = asyncio.Event()
+        self._queue = asyncio.Queue(maxsize=concurrency)
+        self._tasks = []
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key):
+        return key in self._entries
+
+    def overdue(self):
+        """Количество проверок, срок которых наступил, но которые еще не начались.
+
+        Обходит только наступившие записи кучи: потомки записи не раньше
+        ее самой, поэтому поддерево с еще не наступившим сроком пропускается.
+        """
+        now = asyncio.get_running_loop().time()
+        heap = self._heap
+        waiting = 0
+        stack = [0] if heap else []
+        while stack:
+            index = stack.pop()
+            due, seq, key = heap[index]
+            if due > now:
+                continue
+            if self._is_current(key, seq):
+                waiting += 1
+            stack.extend(child for child in (2 * index + 1, 2 * index + 2) if child < len(heap))
+        return waiting + self._queue.qsize()
+
+    def start(self):
+        """Запускает диспетчер и воркеры"""
+        if self._tasks:
+            return
+        self._started_at = asyncio.get_running_loop().time()
+        self._tasks.append(asyncio.create_task(self._dispatch()))
+        for _ in range(self.concurrency):
+            self._tasks.append(asyncio.create_task(self._worker()))
+
+    async def stop(self):
+        """Останавливает диспетчер и воркеры"""
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def schedule(self, key, interval, delay=None):
+        """Добавляет или перепланирует задачу, первый запуск через delay секунд"""
+        if interval <= 0:
+            # Нулевой интервал делит на ноль при расчете фазы, отрицательный зацикливает перепланирование
+            raise ValueError(f"Интервал проверки должен быть положительным: {interval}")
+        loop = asyncio.get_running_loop()
+        base = loop.time() + (interval if delay is None else delay)
+        self._push(key, interval, base)
+
+    def cancel(self, key):
+        """Снимает задачу с расписания"""
+        self._entries.pop(key, None)
+
+    def _push(self, key, interval, base, spread=None):
+        seq = next(self._counter)
+        self._entries[key] = [interval, seq, base]
+        due = base + random.uniform(0, self.jitter * (interval if spread is None else spread))
+        earliest = self._heap[0][0] if self._heap else None
+        heapq.heappush(self._heap, (due, seq, key))
+        if earliest is None or due < earliest:
+            self._wakeup.set()
+
+    def warming_up(self, now):
+        return bool(self.warmup) and self._started_at is not None and now - self._started_at < self.warmup
+
+    def current_limit(self, now):
+        """Сколько проверок можно выполнять одновременно в момент now"""
+        if not self.warming_up(now):
+            return self.concurrency
+        progress = (now - self._started_at) / self.warmup
+        return min(self.concurrency, int(
+            self.warmup_concurrency + (self.concurrency - self.warmup_concurrency) * progress
+        ))
+
+    async def _wait_for_slot(self, loop):
+        """Во время прогрева ждет, пока число идущих проверок опустится ниже лимита"""
+        while self.warming_up(loop.time()) and len(self._running) >= self.current_limit(loop.time()):
+            self._slot_freed.clear()
+            try:
+                await asyncio.wait_for(self._slot_freed.wait(), self.RAMP_STEP)
+            except asyncio.TimeoutError:
+                pass
+
+    def _is_current(self, key, seq):
+        entry = self._entries.get(key)
+        return entry is not None and entry[1] == seq
+
+    async def _dispatch(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            if not self._heap:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                continue
+
+            due, seq, key = self._heap[0]
+            if not self._is_current(key, seq):
+                heapq.heappop(self._heap)
+                continue
+
+            delay = due - loop.time()
+            if delay > 0:
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), delay)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            heapq.heappop(self._heap)
+
+            # Следующий запуск считаем от опорного времени, чтобы темп не плыл,
+            # а пропущенные из-за отставания запуски не выполняем пачкой
+            interval, _, base = self._entries[key]
+            now = loop.time()
+            missed = int((now - base) // interval) if now > base else 0
+            self._push(key, interval, base + interval * (missed + 1))
+
+            # Предыдущая проверка еще идет - пропускаем этот запуск
+            if key in self._running:
+                continue
+            await self._wait_for_slot(loop)
+            self._running.add(key)
+            await self._queue.put(key)
+
+    async def _worker(self):
+        while True:
+            key = await self._queue.get()
+            try:
+                if key in self._entries:
+                    delay = await self.probe(key)
+                    # Проверка может попросить следующий запуск раньше или позже обычного
+                    entry = self._entries.get(key)
+                    if delay is not None and entry is not None:
+                        loop = asyncio.get_running_loop()
+                        self._push(key, entry[0], loop.time() + delay, spread=delay)
+            except Exception as e:
+                print(f"Ошибка при проверке {key}: {e}")
+            finally:
+                self._running.discard(key)
+                self._slot_freed.set()
@@ -1,23 +1,48 @@
+import asyncio
+import io
+from datetime import datetime, timedelta
 from aiogram import Router, types, F
 from aiogram.filters import Command
-from aiogram.types import ReplyKeyboardMarkup, KeyboardButton
+from aiogram.exceptions import TelegramBadRequest
+from aiogram.types import ReplyKeyboardMarkup, KeyboardButton, InlineKeyboardMarkup, InlineKeyboardButton
 from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import State, StatesGroup
 from aiogram import Bot
+from bot.checker import PROBE_MODES, DEFAULT_PROBE_MODE
+from bot.importer import SiteImport, MAX_IMPORT_BYTES, normalize_site_url
+from bot.reports import REPORT_WINDOWS, format_duration
 
 router = Router()
 
 
+# Окна, за которые статистика показывает квантили времени ответа
+LATENCY_WINDOWS = (("1ч", timedelta(hours=1)), ("24ч", timedelta(days=1)), ("7д", timedelta(days=7)))
+
+# Постраничный вывод сайтов: размер страницы и callback_data переходов
+# "<префикс><направление>_<id сайта-курсора>"
+SITES_PAGE_SIZE = 20
+LIST_PAGE_PREFIX = "sites:"
+DELETE_PAGE_PREFIX = "delpage:"
+PAGE_FORWARD = "a"
+PAGE_BACK = "b"
+
+
 class AddWebsite(StatesGroup):
     waiting_for_url = State()
     waiting_for_interval = State()
+    waiting_for_probe_mode = State()
+    waiting_for_keyword = State()
+
+
+class ImportWebsites(StatesGroup):
+    waiting_for_document = State()
 
 
 @router.message(Command("start"))
 async def cmd_start(message: types.Message, db):
     """Обработчик команды /start"""
     # Добавляем пользователя в базу
-    db.add_user(message.from_user.id, message.chat.id)
+    await db.add_user(message.from_user.id, message.chat.id)
 
     keyboard = ReplyKeyboardMarkup(
         keyboard=[
@@ -45,11 +70,12 @@ async def button_add_website(message: types.Message, state: FSMContext):
 @router.message(AddWebsite.waiting_for_url)
 async def process_website_url(message: types.Message, state: FSMContext):
     """Обработка введенного URL"""
-    url = message.text.strip()
-
-    # Простая валидация URL
-    if not url.startswith(('http://', 'https://')):
-        url = 'https://' + url
+    try:
+        url = normalize_site_url(message.text or '')
+    except ValueError:
+        # Остаемся на этом шаге: в базу попадают только адреса, которые можно проверить
+        await message.answer("❌ Некорректный URL. Введите адрес сайта, например https://example.com:")
+        return
 
     await state.update_data(url=url)
     await message.answer("Введите интервал проверки в секундах (по умолчанию 300):")
@@ -57,76 +83,231 @@ async def process_website_url(message: types.Message, state: FSMContext):
 
 
 @router.message(AddWebsite.waiting_for_interval)
-async def process_website_interval(
+async def process_website_interval(message: types.Message, state: FSMContext):
+    """Обработка введенного интервала проверки"""
+    try:
+        interval = int(message.text) if message.text.strip() else 300
+    except ValueError:
+        interval = 300
+    if interval < 1:
+        # Нулевой или отрицательный интервал сломал бы расписание проверок
+        await message.answer("❌ Интервал должен быть не меньше 1 секунды. Введите интервал проверки в секундах:")
+        return
+
+    await state.update_data(interval=interval)
+    await message.answer(
+        "Выберите режим проверки (по умолчанию get):\n"
+        "get - GET-запрос, тело ответа не скачивается\n"
+        "head - HEAD-запрос, только заголовки\n"
+        "tcp - только установка TCP/TLS соединения\n"
+        "content - проверка содержимого: ключевое слово и изменения страницы"
+    )
+    await state.set_state(AddWebsite.waiting_for_probe_mode)
+
+
+@router.message(AddWebsite.waiting_for_probe_mode)
+async def process_website_probe_mode(
         message: types.Message,
         state: FSMContext,
-        db,  # Зависимость будет автоматически внедрена
+        registry,  # Зависимость будет автоматически внедрена
         scheduler  # Зависимость будет автоматически внедрена
 ):
-    """Обработка введенного интервала проверки"""
+    """Обработка выбранного режима проверки"""
+    probe_mode = message.text.strip().lower()
+    if probe_mode not in PROBE_MODES:
+        probe_mode = DEFAULT_PROBE_MODE
+
+    if probe_mode == 'content':
+        await state.update_data(probe_mode=probe_mode)
+        await message.answer(
+            "Введите ключевое слово, которое должно быть на странице, "
+            "или - чтобы следить только за изменениями:"
+        )
+        await state.set_state(AddWebsite.waiting_for_keyword)
+        return
+
+    await add_website_from_state(message, state, registry, scheduler, probe_mode)
+
+
+@router.message(AddWebsite.waiting_for_keyword)
+async def process_website_keyword(
+        message: types.Message,
+        state: FSMContext,
+        registry,  # Зависимость будет автоматически внедрена
+        scheduler  # Зависимость будет автоматически внедрена
+):
+    """Обработка ключевого слова для проверки содержимого"""
+    keyword = message.text.strip()
     data = await state.get_data()
-    url = data['url']
+    await add_website_from_state(
+        message, state, registry, scheduler, data['probe_mode'],
+        keyword if keyword and keyword != '-' else None
+    )
 
-    try:
-        interval = int(message.text) if message.text.strip() else 300
-    except ValueError:
-        interval = 300
 
-    # Добавляем сайт в базу данных
-    website_id = db.add_website(message.from_user.id, url, interval)
+async def add_website_from_state(message, state, registry, scheduler, probe_mode, content_keyword=None):
+    """Добавляет сайт, собранный по шагам диалога, и ставит его в мониторинг"""
+    data = await state.get_data()
+    url = data['url']
+    interval = data['interval']
+
+    # Добавляем сайт в базу данных и в реестр
+    website = await registry.add_website(message.from_user.id, url, interval, probe_mode, content_keyword)
 
-    if website_id:
+    if website:
         # Добавляем сайт в мониторинг
-        website = {
-            'id': website_id,
-            'url': url,
-            'user_id': message.from_user.id,
-            'check_interval': interval
-        }
         scheduler.add_website_to_monitor(website)
 
-        await message.answer(f"✅ Сайт {url} добавлен в мониторинг с интервалом {interval} секунд")
+        text = f"✅ Сайт {url} добавлен в мониторинг с интервалом {interval} секунд (режим {probe_mode})"
+        if content_keyword:
+            text += f", ключевое слово «{content_keyword}»"
+        await message.answer(text)
     else:
         await message.answer("❌ Ошибка при добавлении сайта")
 
     await state.clear()
 
 
+@router.message(Command("import"))
+async def cmd_import(message: types.Message, state: FSMContext):
+    """Обработчик команды /import"""
+    await message.answer(
+        "Отправьте файл .txt или .csv (или просто текст) со списком сайтов.\n"
+        "Одна строка - один сайт: URL, интервал в секундах и режим проверки, например:\n"
+        "example.com, 60, head\n"
+        "Интервал и режим можно не указывать."
+    )
+    await state.set_state(ImportWebsites.waiting_for_document)
+
+
+@router.message(ImportWebsites.waiting_for_document)
+async def process_import_document(
+        message: types.Message,
+        state: FSMContext,
+        bot: Bot,
+        registry,  # Зависимость будет автоматически внедрена
+        scheduler  # Зависимость будет автоматически внедрена
+):
+    """Массовый импорт сайтов из документа или текста"""
+    if message.document:
+        if message.document.file_size and message.document.file_size > MAX_IMPORT_BYTES:
+            await message.answer(f"❌ Файл слишком большой, максимум {MAX_IMPORT_BYTES // 1024} КБ")
+            await state.clear()
+            return
+        document = await bot.download(message.document)
+        lines = io.TextIOWrapper(document, encoding='utf-8-sig', errors='replace')
+    elif message.text:
+        lines = io.StringIO(message.text)
+    else:
+        await message.answer("❌ Отправьте файл или текст со списком сайтов")
+        return
+
+    user_id = message.from_user.id
+    site_import = SiteImport(known_urls=[site['url'] for site in registry.get_user_websites(user_id)])
+    rows = list(site_import.parse(lines))
+
+    websites = await registry.add_websites(user_id, rows) if rows else []
+    if rows and not websites:
+        await message.answer("❌ Ошибка при импорте сайтов")
+    else:
+        scheduler.add_websites_to_monitor(websites)
+        await message.answer(site_import.summary(len(websites)))
+
+    await state.clear()
+
+
 @router.message(F.text == "Мои сайты")
-async def button_list_websites(message: types.Message, db):
+async def button_list_websites(message: types.Message, db, registry):
     """Обработчик нажатия кнопки 'Мои сайты'"""
-    websites = db.get_user_websites(message.from_user.id)
+    page, has_prev, has_next = await load_sites_page(db, message.from_user.id, PAGE_FORWARD, 0)
 
-    if not websites:
+    if not page:
         await message.answer("У вас нет сайтов для мониторинга.")
         return
 
-    text = "📋 Ваши сайты:\n\n"
-    for site in websites:
-        status_emoji = "🟢" if site['last_status'] == 'up' else "🔴"
-        text += f"{status_emoji} {site['url']} (каждые {site['check_interval']} сек.)\n"
+    await message.answer(
+        render_sites_page(page, registry),
+        reply_markup=sites_page_keyboard(LIST_PAGE_PREFIX, page, has_prev, has_next)
+    )
 
-    await message.answer(text)
+
+@router.callback_query(F.data.startswith(LIST_PAGE_PREFIX))
+async def process_list_page(callback: types.CallbackQuery, db, registry):
+    """Переход по страницам списка сайтов в том же сообщении"""
+    direction, cursor = parse_page_callback(callback.data)
+    page, has_prev, has_next = await load_sites_page(db, callback.from_user.id, direction, cursor)
+
+    if not page:
+        await edit_page(callback.message, "У вас нет сайтов для мониторинга.")
+    else:
+        await edit_page(
+            callback.message,
+            render_sites_page(page, registry),
+            sites_page_keyboard(LIST_PAGE_PREFIX, page, has_prev, has_next)
+        )
+    await callback.answer()
 
 
 @router.message(F.text == "Статистика")
-async def button_stats(message: types.Message, db):
+async def button_stats(message: types.Message, db, reports):
     """Обработчик нажатия кнопки 'Статистика'"""
-    websites = db.get_user_websites(message.from_user.id)
+    websites = await db.get_user_websites_stats(message.from_user.id)
 
     if not websites:
         await message.answer("У вас нет сайтов для мониторинга.")
         return
 
+    now = datetime.now()
+    percentiles = await asyncio.gather(*(
+        db.get_user_latency_percentiles(message.from_user.id, now - window)
+        for _, window in LATENCY_WINDOWS
+    ))
+    sla = await reports.report(message.from_user.id)
+
     text = "📊 Статистика:\n\n"
+    for stats in websites:
+        uptime_percent = (stats['up_checks'] / stats['total_checks'] * 100) if stats['total_checks'] > 0 else 0
+        text += f"🌐 {stats['url']}\n"
+        text += f"   Доступность: {uptime_percent:.1f}%\n"
+        uptimes = [sla[name].get(stats['id'], {}).get('uptime') for name, _ in REPORT_WINDOWS]
+        if any(uptime is not None for uptime in uptimes):
+            text += "   SLA " + "/".join(name for name, _ in REPORT_WINDOWS) + ": " + "/".join(
+                f"{uptime:.2f}%" if uptime is not None else "-" for uptime in uptimes
+            ) + "\n"
+        text += f"   Время ответа: {stats['avg_response_time']:.2f}мс\n"
+        for (name, _), window_percentiles in zip(LATENCY_WINDOWS, percentiles):
+            latency = window_percentiles.get(stats['id'])
+            if latency:
+                text += (f"   p50/p95/p99 за {name}: "
+                         f"{latency['p50']:.0f}/{latency['p95']:.0f}/{latency['p99']:.0f}мс\n")
+        text += f"   Проверок: {stats['total_checks']}\n\n"
+
+    await message.answer(text)
+
+
+@router.message(Command("report"))
+async def cmd_report(message: types.Message, registry, reports):
+    """SLA-отчет по сайтам пользователя: доступность, инциденты и простой"""
+    websites = registry.get_user_websites(message.from_user.id)
+    if not websites:
+        await message.answer("У вас нет сайтов для мониторинга.")
+        return
+
+    sla = await reports.report(message.from_user.id)
+    text = "📈 SLA-отчет:\n\n"
     for site in websites:
-        stats = db.get_website_stats(site['id'])
-        if stats:
-            uptime_percent = (stats['up_checks'] / stats['total_checks'] * 100) if stats['total_checks'] > 0 else 0
-            text += f"🌐 {site['url']}\n"
-            text += f"   Доступность: {uptime_percent:.1f}%\n"
-            text += f"   Время ответа: {stats['avg_response_time']:.2f}мс\n"
-            text += f"   Проверок: {stats['total_checks']}\n\n"
+        text += f"🌐 {site['url']}\n"
+        for name, _ in REPORT_WINDOWS:
+            metrics = sla[name].get(site['id'])
+            if metrics is None or metrics['uptime'] is None:
+                text += f"   {name}: нет данных\n"
+                continue
+            text += f"   {name}: {metrics['uptime']:.2f}%, сбоев {metrics['outages']}"
+            if metrics['outages']:
+                text += (f", простой {format_duration(metrics['downtime'])}, "
+                         f"самый долгий {format_duration(metrics['longest'])}")
+            text += "\n"
+        text += "\n"
 
     await message.answer(text)
 
@@ -134,39 +315,137 @@ async def button_stats(message: types.Message, db):
 @router.message(F.text == "Удалить сайт")
 async def button_delete_website(message: types.Message, db):
     """Обработчик нажатия кнопки 'Удалить сайт'"""
-    websites = db.get_user_websites(message.from_user.id)
+    page, has_prev, has_next = await load_sites_page(db, message.from_user.id, PAGE_FORWARD, 0)
 
-    if not websites:
+    if not page:
         await message.answer("У вас нет сайтов для удаления.")
         return
 
-    # Создаем инлайн-клавиатуру с сайтами для удаления
-    from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
-
-    keyboard = InlineKeyboardMarkup(inline_keyboard=[])
+    await message.answer(
+        "Выберите сайт для удаления:",
+        reply_markup=sites_page_keyboard(DELETE_PAGE_PREFIX, page, has_prev, has_next, delete=True)
+    )
 
-    for site in websites:
-        keyboard.inline_keyboard.append([
-            InlineKeyboardButton(
-                text=f"❌ {site['url']}",
-                callback_data=f"delete_{site['id']}"
-            )
-        ])
 
-    await message.answer("Выберите сайт для удаления:", reply_markup=keyboard)
+@router.callback_query(F.data.startswith(DELETE_PAGE_PREFIX))
+async def process_delete_page(callback: types.CallbackQuery, db):
+    """Переход по страницам клавиатуры удаления в том же сообщении"""
+    direction, cursor = parse_page_callback(callback.data)
+    await show_delete_page(callback, db, direction, cursor)
+    await callback.answer()
 
 
 @router.callback_query(F.data.startswith("delete_"))
-async def process_delete_website(callback: types.CallbackQuery, db):
+async def process_delete_website(callback: types.CallbackQuery, db, registry, scheduler):
     """Обработка удаления сайта"""
-    website_id = int(callback.data.split("_")[1])
+    # delete_<id>_<курсор страницы>; у старых клавиатур курсора нет
+    _, website_id, *cursor = callback.data.split("_")
+    website_id = int(website_id)
+
+    if await registry.delete_website(callback.from_user.id, website_id):
+        scheduler.remove_website_from_monitor(website_id)
+        # Перерисовываем ту же страницу уже без удаленного сайта
+        await show_delete_page(callback, db, PAGE_FORWARD, int(cursor[0]) if cursor else 0)
+        await callback.answer("✅ Сайт удален из мониторинга")
+    else:
+        await callback.answer("❌ Ошибка при удалении сайта", show_alert=True)
+
 
-    if db.delete_website(callback.from_user.id, website_id):
-        await callback.message.answer("✅ Сайт удален из мониторинга")
+async def show_delete_page(callback, db, direction, cursor):
+    page, has_prev, has_next = await load_sites_page(db, callback.from_user.id, direction, cursor)
+    if not page:
+        await edit_page(callback.message, "У вас нет сайтов для удаления.")
     else:
-        await callback.message.answer("❌ Ошибка при удалении сайта")
+        await edit_page(
+            callback.message,
+            "Выберите сайт для удаления:",
+            sites_page_keyboard(DELETE_PAGE_PREFIX, page, has_prev, has_next, delete=True)
+        )
+
+
+async def load_sites_page(db, user_id, direction, cursor):
+    """Страница сайтов пользователя по курсору и признаки соседних страниц.
+
+    Все запросы идут по индексу (user_id, is_active, id). Страница читается
+    с одной лишней строкой в сторону перехода - она и есть признак следующей
+    страницы в этом направлении. Обратное направление проверяется отдельным
+    запросом на одну строку, и только если курсор не в начале списка. Если
+    страница опустела (сайты удалили), показывается первая.
+    """
+    if direction == PAGE_BACK:
+        page = await db.get_user_websites_page(user_id, before_id=cursor, limit=SITES_PAGE_SIZE + 1)
+        if page:
+            has_prev = len(page) > SITES_PAGE_SIZE
+            page = page[-SITES_PAGE_SIZE:]
+            has_next = bool(await db.get_user_websites_page(user_id, after_id=page[-1]['id'], limit=1))
+            return page, has_prev, has_next
+    else:
+        page = await db.get_user_websites_page(user_id, after_id=cursor, limit=SITES_PAGE_SIZE + 1)
+    if not page and cursor:
+        cursor = 0
+        page = await db.get_user_websites_page(user_id, limit=SITES_PAGE_SIZE + 1)
+    if not page:
+        return page, False, False
 
-    await callback.answer()
+    has_next = len(page) > SITES_PAGE_SIZE
+    page = page[:SITES_PAGE_SIZE]
+    has_prev = bool(cursor) and bool(await db.get_user_websites_page(user_id, before_id=page[0]['id'], limit=1))
+    return page, has_prev, has_next
+
+
+def render_sites_page(page, registry):
+    """Текст страницы списка; статусы берутся из реестра, они свежее базы"""
+    text = "📋 Ваши сайты:\n\n"
+    for row in page:
+        site = registry.get(row['id']) or row
+        status_emoji = "🟢" if site['last_status'] == 'up' else "🔴"
+        text += f"{status_emoji} {site['url']} (каждые {site['check_interval']} сек.)\n"
+    return text
+
+
+def sites_page_keyboard(prefix, page, has_prev, has_next, delete=False):
+    """Инлайн-клавиатура страницы: кнопки удаления и переходы с курсором в callback_data"""
+    keyboard = InlineKeyboardMarkup(inline_keyboard=[])
+
+    if delete:
+        # Курсор, с которого заново загрузится текущая страница
+        cursor = page[0]['id'] - 1
+        for site in page:
+            keyboard.inline_keyboard.append([
+                InlineKeyboardButton(
+                    text=f"❌ {site['url']}",
+                    callback_data=f"delete_{site['id']}_{cursor}"
+                )
+            ])
+
+    navigation = []
+    if has_prev:
+        navigation.append(InlineKeyboardButton(
+            text="⬅️ Назад", callback_data=f"{prefix}{PAGE_BACK}_{page[0]['id']}"
+        ))
+    if has_next:
+        navigation.append(InlineKeyboardButton(
+            text="Вперед ➡️", callback_data=f"{prefix}{PAGE_FORWARD}_{page[-1]['id']}"
+        ))
+    if navigation:
+        keyboard.inline_keyboard.append(navigation)
+    return keyboard
+
+
+def parse_page_callback(data):
+    """(направление, курсор) из callback_data перехода по страницам"""
+    direction, cursor = data.rsplit(":", 1)[1].split("_")
+    return direction, int(cursor)
+
+
+async def edit_page(message, text, keyboard=None):
+    """Заменяет страницу в том же сообщении"""
+    try:
+        await message.edit_text(text, reply_markup=keyboard)
+    except TelegramBadRequest as e:
+        # Повторное нажатие на ту же страницу: сообщение не изменилось
+        if "message is not modified" not in str(e):
+            raise
 
 
 @router.message()
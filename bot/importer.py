@@ -0,0 +1,112 @@
+import re
+from urllib.parse import urlsplit
+from bot.checker import PROBE_MODES, DEFAULT_PROBE_MODE, canonicalize_url
+
+# Разделители колонок: запятая или точка с запятой (пустая колонка допустима),
+# либо пробелы и табуляция
+COLUMN_SEPARATOR = re.compile(r'\s*[,;]\s*|\s+')
+
+# Максимальный размер импортируемого документа, байт
+MAX_IMPORT_BYTES = 1024 * 1024
+
+# Сколько строк с ошибками показывать пользователю в отчете
+MAX_REPORTED_ERRORS = 5
+
+
+def normalize_site_url(text):
+    """Проверяет введенный пользователем адрес и приводит его к каноническому виду.
+
+    Без схемы подставляется https://. ValueError, если адрес не http(s), без
+    хоста или не разбирается (например, порт вне диапазона).
+    """
+    url = text.strip()
+    if '://' not in url:
+        url = 'https://' + url
+    try:
+        parts = urlsplit(url)
+        if parts.scheme in ('http', 'https') and parts.hostname:
+            return canonicalize_url(url)
+    except ValueError:
+        pass
+    raise ValueError(f"некорректный URL {text.strip()}")
+
+
+class SiteImport:
+    """Разбор документа со списком сайтов для массового импорта.
+
+    Каждая строка - URL, затем необязательные интервал и режим проверки:
+    "example.com, 60, head". Пустые строки, комментарии (#) и строка
+    заголовка пропускаются. Строки разбираются по одной, поэтому документ не
+    нужно держать в памяти целиком; повторы внутри документа и сайты,
+    которые у пользователя уже есть, отбрасываются по каноническому URL.
+    """
+
+    def __init__(self, default_interval=300, known_urls=()):
+        self.default_interval = default_interval
+        self.seen = set()
+        for url in known_urls:
+            try:
+                self.seen.add(canonicalize_url(url))
+            except ValueError:
+                # Такой адрес не совпадет ни с одной корректной строкой документа
+                pass
+        self.duplicates = 0
+        self.invalid = 0
+        self.errors = []
+
+    def parse(self, lines):
+        """Генератор кортежей (url, interval, probe_mode) для новых сайтов"""
+        for number, line in enumerate(lines, 1):
+            line = line.strip()
+            if not line or line.startswith('#'):
+                continue
+            columns = COLUMN_SEPARATOR.split(line)
+            if number == 1 and columns[0].lower() == 'url':
+                continue
+
+            try:
+                row = self.parse_row(columns)
+            except ValueError as e:
+                self.invalid += 1
+                if len(self.errors) < MAX_REPORTED_ERRORS:
+                    self.errors.append(f"строка {number}: {e}")
+                continue
+
+            if row[0] in self.seen:
+                self.duplicates += 1
+                continue
+            self.seen.add(row[0])
+            yield row
+
+    def parse_row(self, columns):
+        """Проверяет и нормализует колонки одной строки"""
+        url = normalize_site_url(columns[0])
+
+        interval = self.default_interval
+        if len(columns) > 1 and columns[1]:
+            try:
+                interval = int(columns[1])
+            except ValueError:
+                raise ValueError(f"некорректный интервал {columns[1]}")
+            if interval <= 0:
+                raise ValueError(f"некорректный интервал {columns[1]}")
+
+        probe_mode = DEFAULT_PROBE_MODE
+        if len(columns) > 2 and columns[2]:
+            probe_mode = columns[2].lower()
+            if probe_mode not in PROBE_MODES:
+                raise ValueError(f"неизвестный режим проверки {columns[2]}")
+
+        return url, interval, probe_mode
+
+    def summary(self, added):
+        """Текст отчета об импорте"""
+        text = (f"📥 Импорт завершен\n\n"
+                f"✅ Добавлено: {added}\n"
+                f"🔁 Повторы и уже отслеживаемые: {self.duplicates}\n"
+                f"❌ Ошибки: {self.invalid}")
+        if self.errors:
+            text += "\n\n" + "\n".join(self.errors)
+            if self.invalid > len(self.errors):
+                text += f"\n... и еще {self.invalid - len(self.errors)}"
+        return text
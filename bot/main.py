@@ -1,12 +1,22 @@
 import asyncio
 import logging
+from contextlib import AsyncExitStack
 from aiogram import Bot, Dispatcher
 from aiogram.fsm.storage.memory import MemoryStorage
 from aiogram.types import BotCommand
 from bot.config import Config
-from bot.database import Database
+from bot.storage import create_database
 from bot.checker import WebsiteChecker
 from bot.scheduler import MonitoringScheduler
+from bot.workers import ShardedScheduler
+from bot.policy import ProbePolicy
+from bot.registry import WebsiteRegistry
+from bot.writer import ResultWriter
+from bot.notifier import NotificationDispatcher
+from bot.retention import RetentionCompactor
+from bot.reports import SlaReportEngine
+from bot.webhook import WebhookServer
+from bot.metrics import MetricsServer, LoopLagMonitor, SCHEDULED_PROBES, OVERDUE_PROBES
 from bot.handlers import router
 
 # Настройка логирования
@@ -20,56 +30,140 @@ async def set_bot_commands(bot: Bot):
         BotCommand(command="/start", description="Запустить бота"),
         BotCommand(command="/add", description="Добавить сайт"),
         BotCommand(command="/list", description="Список сайтов"),
+        BotCommand(command="/report", description="SLA-отчет"),
+        BotCommand(command="/import", description="Импорт списка сайтов"),
         BotCommand(command="/stats", description="Статистика"),
         BotCommand(command="/delete", description="Удалить сайт")
     ]
     await bot.set_my_commands(commands)
 
 
-from bot.middleware import DependenciesMiddleware
+from bot.middleware import DependenciesMiddleware, MetricsMiddleware
 
 
 async def main():
-    try:
-        # Загрузка конфигурации
-        config = Config()
-
-        # Инициализация базы данных
-        db = Database(config.db_url)
-        print("База данных подключена успешно")
-
-        # Инициализация проверщика
-        checker = WebsiteChecker()
-
-        # Создание бота и диспетчера
-        bot = Bot(token=config.bot_token)
-        storage = MemoryStorage()
-        dp = Dispatcher(storage=storage)
-
-        # Инициализация планировщика
-        scheduler = MonitoringScheduler(bot, db, checker)
-
-        # Создаем и регистрируем middleware
-        dependencies_middleware = DependenciesMiddleware(db, checker, scheduler)
-        dp.message.outer_middleware.register(dependencies_middleware)
-        dp.callback_query.outer_middleware.register(dependencies_middleware)
-
-        # Включаем роутер
-        dp.include_router(router)
-
-        # Устанавливаем команды бота
-        await set_bot_commands(bot)
-
-        # Запускаем планировщик
-        await scheduler.start()
-
-        # Запуск бота
-        logger.info("Бот запущен!")
-        await dp.start_polling(bot)
-
-    except Exception as e:
-        logger.error(f"Ошибка при запуске бота: {e}")
-        raise
+    async with AsyncExitStack() as stack:
+        try:
+            # Загрузка конфигурации
+            config = Config()
+
+            # Метрики и контроль задержки event loop
+            if config.metrics_port:
+                metrics_server = MetricsServer(config.metrics_host, config.metrics_port)
+                await metrics_server.start()
+                stack.push_async_callback(metrics_server.stop)
+                lag_monitor = LoopLagMonitor(config.loop_lag_interval)
+                await lag_monitor.start()
+                stack.push_async_callback(lag_monitor.stop)
+
+            # Инициализация базы данных
+            db = create_database(config)
+            stack.push_async_callback(db.close)
+            await db.start()
+            print("База данных подключена успешно")
+
+            # Реестр активных сайтов в памяти
+            registry = WebsiteRegistry(db)
+            await registry.load(config.startup_page_size)
+
+            # Инициализация проверщика
+            checker = WebsiteChecker.from_config(config)
+            await checker.start()
+            stack.push_async_callback(checker.close)
+
+            # Создание бота и диспетчера
+            bot = Bot(token=config.bot_token)
+            # В режиме webhook сессию не закрывает start_polling, закрываем сами
+            stack.push_async_callback(bot.session.close)
+            storage = MemoryStorage()
+            dp = Dispatcher(storage=storage)
+
+            # Буфер отложенной записи результатов
+            writer = ResultWriter(
+                db,
+                batch_size=config.write_batch_size,
+                flush_interval=config.write_flush_interval,
+                max_pending=config.write_queue_size
+            )
+            await writer.start()
+            stack.push_async_callback(writer.stop)
+
+            # Очередь уведомлений с ограничением скорости
+            notifier = NotificationDispatcher(
+                bot,
+                rate=config.notify_rate,
+                chat_interval=config.notify_chat_interval,
+                max_in_flight=config.notify_max_in_flight,
+                max_retries=config.notify_max_retries
+            )
+            await notifier.start()
+            stack.push_async_callback(notifier.stop)
+
+            # Инициализация планировщика: в этом процессе или в процессах-воркерах
+            if config.worker_processes > 0:
+                # Метрики проверок и очередь воркеры присылают по каналу IPC
+                scheduler = ShardedScheduler(notifier, registry, writer, config, config.worker_processes)
+            else:
+                scheduler = MonitoringScheduler(
+                    notifier, registry, checker, writer,
+                    concurrency=config.probe_concurrency,
+                    jitter=config.probe_jitter,
+                    policy=ProbePolicy.from_config(config),
+                    warmup=config.warmup_period,
+                    warmup_concurrency=config.warmup_concurrency
+                )
+                SCHEDULED_PROBES.set_function(lambda: len(scheduler.engine))
+                OVERDUE_PROBES.set_function(scheduler.engine.overdue)
+
+            # SLA-отчеты по истории проверок
+            reports = SlaReportEngine(db, cache_ttl=config.report_cache_ttl)
+
+            # Создаем и регистрируем middleware
+            dependencies_middleware = DependenciesMiddleware(db, checker, scheduler, registry, reports)
+            dp.message.outer_middleware.register(dependencies_middleware)
+            dp.callback_query.outer_middleware.register(dependencies_middleware)
+            dp.message.middleware.register(MetricsMiddleware())
+            dp.callback_query.middleware.register(MetricsMiddleware())
+
+            # Включаем роутер
+            dp.include_router(router)
+
+            # Устанавливаем команды бота
+            await set_bot_commands(bot)
+
+            # Запускаем планировщик
+            await scheduler.start()
+            stack.push_async_callback(scheduler.stop)
+
+            # Фоновое прореживание истории проверок
+            compactor = RetentionCompactor(
+                db,
+                raw_days=config.raw_retention_days,
+                minute_days=config.minute_retention_days,
+                hourly_days=config.hourly_retention_days,
+                daily_days=config.daily_retention_days,
+                interval=config.compaction_interval,
+                batch_size=config.compaction_batch_size
+            )
+            await compactor.start()
+            stack.push_async_callback(compactor.stop)
+
+            # Запуск бота: webhook на встроенном сервере или long polling
+            if config.webhook_url:
+                webhook = WebhookServer.from_config(dp, bot, config)
+                await webhook.start()
+                stack.push_async_callback(webhook.stop)
+                logger.info(f"Бот запущен, webhook: {config.webhook_url}")
+                await asyncio.Event().wait()
+            else:
+                # Telegram не отдает обновления через getUpdates, пока установлен webhook
+                await bot.delete_webhook()
+                logger.info("Бот запущен!")
+                await dp.start_polling(bot)
+
+        except Exception as e:
+            logger.error(f"Ошибка при запуске бота: {e}")
+            raise
 
 
 if __name__ == "__main__":
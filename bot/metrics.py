@@ -0,0 +1,243 @@
+import asyncio
+from aiohttp import web
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+
+class Metric:
+    """Базовая метрика с набором меток"""
+
+    kind = 'untyped'
+
+    def __init__(self, name, documentation, labels=(), registry=None):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self._values = {}
+        # Значения, присланные другими процессами: источник -> {метки: значение}
+        self._remote = {}
+        (registry if registry is not None else REGISTRY).register(self)
+
+    def _key(self, labels):
+        return tuple(labels.get(name, '') for name in self.labels)
+
+    def _combine(self, first, second):
+        return first + second
+
+    def snapshot(self):
+        """Локальные значения в виде, пригодном для JSON"""
+        return [[list(key), value] for key, value in self._values.items()]
+
+    def set_remote(self, source, snapshot):
+        """Заменяет значения, присланные источником (например, воркером)"""
+        self._remote[source] = {tuple(key): value for key, value in snapshot}
+
+    def drop_remote(self, source):
+        self._remote.pop(source, None)
+
+    def values(self):
+        """Локальные значения, сложенные со значениями всех источников"""
+        values = dict(self._values)
+        for remote in self._remote.values():
+            for key, value in remote.items():
+                values[key] = self._combine(values[key], value) if key in values else value
+        return values
+
+    def collect(self):
+        """Строки с текущими значениями в текстовом формате Prometheus"""
+        for key, value in sorted(self.values().items()):
+            yield f"{self.name}{_format_labels(self.labels, key)} {value}"
+
+
+class Counter(Metric):
+    kind = 'counter'
+
+    def inc(self, value=1, **labels):
+        key = self._key(labels)
+        self._values[key] = self._values.get(key, 0) + value
+
+
+class Gauge(Metric):
+    kind = 'gauge'
+
+    def __init__(self, name, documentation, labels=(), registry=None):
+        super().__init__(name, documentation, labels, registry)
+        self._function = None
+
+    def set(self, value, **labels):
+        self._values[self._key(labels)] = value
+
+    def set_function(self, function):
+        """Значение без меток, вычисляемое в момент сбора метрик"""
+        self._function = function
+
+    def _refresh(self):
+        if self._function is not None:
+            self._values[()] = self._function()
+
+    def snapshot(self):
+        self._refresh()
+        return super().snapshot()
+
+    def collect(self):
+        self._refresh()
+        return super().collect()
+
+
+class Histogram(Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labels=(), buckets=DEFAULT_BUCKETS, registry=None):
+        super().__init__(name, documentation, labels, registry)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        state = self._values.get(key)
+        if state is None:
+            state = self._values[key] = [[0] * len(self.buckets), 0.0, 0]
+        counts, _, _ = state
+        for index, bound in enumerate(self.buckets):
+            if value <= bound:
+                counts[index] += 1
+                break
+        state[1] += value
+        state[2] += 1
+
+    def _combine(self, first, second):
+        return [[a + b for a, b in zip(first[0], second[0])], first[1] + second[1], first[2] + second[2]]
+
+    def collect(self):
+        for key, (counts, total, count) in sorted(self.values().items()):
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                yield f"{self.name}_bucket{_format_labels(self.labels, key, [('le', bound)])} {cumulative}"
+            yield f"{self.name}_bucket{_format_labels(self.labels, key, [('le', '+Inf')])} {count}"
+            yield f"{self.name}_sum{_format_labels(self.labels, key)} {total}"
+            yield f"{self.name}_count{_format_labels(self.labels, key)} {count}"
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics = {}
+
+    def register(self, metric):
+        if metric.name in self._metrics:
+            raise ValueError(f"Метрика {metric.name} уже зарегистрирована")
+        self._metrics[metric.name] = metric
+
+    def snapshot(self, names):
+        """Значения метрик names для передачи в другой процесс"""
+        return {name: self._metrics[name].snapshot() for name in names}
+
+    def set_remote(self, source, snapshots):
+        """Принимает значения метрик от источника (воркера)"""
+        for name, snapshot in snapshots.items():
+            metric = self._metrics.get(name)
+            if metric is not None:
+                metric.set_remote(source, snapshot)
+
+    def drop_remote(self, source):
+        """Забывает значения источника, например отключившегося воркера"""
+        for metric in self._metrics.values():
+            metric.drop_remote(source)
+
+    def render(self):
+        """Все метрики в текстовом формате Prometheus"""
+        lines = []
+        for metric in self._metrics.values():
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.collect())
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = MetricsRegistry()
+
+PROBES = Counter('monitor_probes_total', "Выполненные проверки сайтов", ('mode', 'status'))
+PROBE_DURATION = Histogram('monitor_probe_duration_seconds', "Длительность проверки сайта", ('mode',))
+DB_OPERATIONS = Counter('monitor_db_operations_total', "Операции с базой данных", ('operation', 'result'))
+DB_DURATION = Histogram('monitor_db_operation_duration_seconds', "Длительность операции с базой", ('operation',))
+NOTIFICATIONS = Counter('monitor_notifications_total', "Попытки отправки уведомлений", ('result',))
+NOTIFICATION_DURATION = Histogram('monitor_notification_send_duration_seconds', "Длительность отправки уведомления")
+HANDLERS = Counter('monitor_handler_calls_total', "Вызовы обработчиков бота", ('handler', 'result'))
+HANDLER_DURATION = Histogram('monitor_handler_duration_seconds', "Длительность обработчика бота", ('handler',))
+WEBHOOK_UPDATES = Counter('monitor_webhook_updates_total', "Обновления, полученные через webhook", ('result',))
+SCHEDULED_PROBES = Gauge('monitor_scheduler_probes', "Проверок в расписании")
+OVERDUE_PROBES = Gauge('monitor_scheduler_overdue_probes', "Проверок, срок которых уже наступил, но они не начались")
+LOOP_LAG = Histogram(
+    'monitor_event_loop_lag_seconds', "Опоздание пробуждения event loop",
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0)
+)
+
+# Метрики, которые процессы-воркеры проверок пересылают в основной процесс
+WORKER_METRICS = (PROBES.name, PROBE_DURATION.name, SCHEDULED_PROBES.name, OVERDUE_PROBES.name)
+
+
+class LoopLagMonitor:
+    """Периодически засыпает и замеряет, насколько loop опоздал с пробуждением"""
+
+    def __init__(self, interval=0.5):
+        self.interval = interval
+        self._task = None
+
+    async def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            started = loop.time()
+            await asyncio.sleep(self.interval)
+            LOOP_LAG.observe(max(0.0, loop.time() - started - self.interval))
+
+
+class MetricsServer:
+    """Локальный HTTP сервер с метриками по адресу /metrics"""
+
+    def __init__(self, host='127.0.0.1', port=9100, registry=None):
+        self.host = host
+        self.port = port
+        self.registry = registry if registry is not None else REGISTRY
+        self._runner = None
+
+    async def handle_metrics(self, request):
+        return web.Response(
+            text=self.registry.render(),
+            headers={'Content-Type': 'text/plain; version=0.0.4; charset=utf-8'}
+        )
+
+    async def start(self):
+        app = web.Application()
+        app.router.add_get('/metrics', self.handle_metrics)
+        self._runner = web.AppRunner(app)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, self.host, self.port).start()
+
+    async def stop(self):
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
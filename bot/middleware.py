@@ -1,13 +1,17 @@
+import time
 from aiogram import BaseMiddleware
 from typing import Callable, Dict, Any, Awaitable
 from aiogram.types import Message, CallbackQuery
+from bot.metrics import HANDLERS, HANDLER_DURATION
 
 
 class DependenciesMiddleware(BaseMiddleware):
-    def __init__(self, db, checker, scheduler):
+    def __init__(self, db, checker, scheduler, registry, reports):
         self.db = db
         self.checker = checker
         self.scheduler = scheduler
+        self.registry = registry
+        self.reports = reports
 
     async def __call__(
             self,
@@ -19,5 +23,30 @@ class DependenciesMiddleware(BaseMiddleware):
         data['db'] = self.db
         data['checker'] = self.checker
         data['scheduler'] = self.scheduler
+        data['registry'] = self.registry
+        data['reports'] = self.reports
 
-        return await handler(event, data)
\ No newline at end of file
+        return await handler(event, data)
+
+
+class MetricsMiddleware(BaseMiddleware):
+    """Считает вызовы и время выполнения обработчиков"""
+
+    async def __call__(
+            self,
+            handler: Callable[[Message, Dict[str, Any]], Awaitable[Any]],
+            event: Message,
+            data: Dict[str, Any]
+    ) -> Any:
+        handler_object = data.get('handler')
+        name = handler_object.callback.__name__ if handler_object is not None else 'unknown'
+        started = time.perf_counter()
+        result = 'ok'
+        try:
+            return await handler(event, data)
+        except Exception:
+            result = 'error'
+            raise
+        finally:
+            HANDLERS.inc(handler=name, result=result)
+            HANDLER_DURATION.observe(time.perf_counter() - started, handler=name)
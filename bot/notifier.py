@@ -0,0 +1,185 @@
+import asyncio
+import heapq
+import time
+from aiogram.exceptions import TelegramNetworkError, TelegramRetryAfter, TelegramServerError
+from bot.metrics import NOTIFICATIONS, NOTIFICATION_DURATION
+
+
+class NotificationDispatcher:
+    """Очередь уведомлений с ограничением скорости отправки.
+
+    notify() только кладет текст в очередь чата и сразу возвращается, поэтому
+    проверки и запись в базу никогда не ждут Telegram. Диспетчер отправляет
+    не больше rate сообщений в секунду в целом и не чаще одного раза в
+    chat_interval секунд в каждый чат; все, что накопилось для чата за это
+    время, уходит одним сводным сообщением. На flood-wait отправка
+    приостанавливается на указанное Telegram время, сетевые ошибки
+    повторяются с экспоненциальной задержкой.
+    """
+
+    MAX_MESSAGE_LENGTH = 4096
+
+    def __init__(self, bot, rate=25, chat_interval=1.0, max_in_flight=10,
+                 max_retries=5, retry_delay=1.0):
+        self.bot = bot
+        self.rate = rate
+        self.chat_interval = chat_interval
+        self.max_retries = max_retries
+        self.retry_delay = retry_delay
+
+        # chat_id -> тексты, ожидающие отправки
+        self._pending = {}
+        self._attempts = {}
+        self._last_sent = {}
+        # Куча (время готовности, chat_id) и чаты, уже стоящие в ней или в отправке
+        self._heap = []
+        self._scheduled = set()
+        self._wakeup = asyncio.Event()
+        self._in_flight = asyncio.Semaphore(max_in_flight)
+        self._tokens = float(rate)
+        self._tokens_updated = None
+        self._paused_until = 0.0
+        self._sends = set()
+        self._task = None
+
+    async def start(self):
+        """Запускает диспетчер"""
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Останавливает диспетчер, дожидаясь уже начатых отправок"""
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+        if self._sends:
+            await asyncio.gather(*self._sends, return_exceptions=True)
+
+        dropped = sum(len(texts) for texts in self._pending.values())
+        if dropped:
+            print(f"Не отправлено уведомлений при остановке: {dropped}")
+
+    def notify(self, chat_id, text):
+        """Ставит уведомление в очередь, не дожидаясь отправки"""
+        self._pending.setdefault(chat_id, []).append(text)
+        if chat_id not in self._scheduled:
+            loop = asyncio.get_running_loop()
+            last_sent = self._last_sent.get(chat_id)
+            ready_at = loop.time() if last_sent is None else last_sent + self.chat_interval
+            self._schedule(chat_id, ready_at)
+
+    def _schedule(self, chat_id, ready_at):
+        self._scheduled.add(chat_id)
+        heapq.heappush(self._heap, (ready_at, chat_id))
+        self._wakeup.set()
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            if not self._heap:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                continue
+
+            ready_at, chat_id = self._heap[0]
+            delay = max(ready_at, self._paused_until) - loop.time()
+            if delay > 0:
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), delay)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            await self._acquire_token()
+            await self._in_flight.acquire()
+            # Пока ждали токен, в кучу мог попасть чат с более ранним временем
+            # готовности: отправляем актуальную вершину, а не прочитанную выше
+            _, chat_id = heapq.heappop(self._heap)
+
+            task = asyncio.create_task(self._send(chat_id))
+            self._sends.add(task)
+            task.add_done_callback(self._sends.discard)
+
+    async def _acquire_token(self):
+        """Глобальное ограничение скорости (token bucket)"""
+        loop = asyncio.get_running_loop()
+        while True:
+            now = loop.time()
+            if self._tokens_updated is not None:
+                self._tokens = min(self.rate, self._tokens + (now - self._tokens_updated) * self.rate)
+            self._tokens_updated = now
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return
+            await asyncio.sleep((1 - self._tokens) / self.rate)
+
+    def _build_digest(self, texts):
+        """Собирает сводное сообщение, остаток не влезшего возвращает отдельно"""
+        if len(texts) == 1:
+            return texts[0], texts, []
+
+        header = f"📬 Изменения статуса ({len(texts)}):\n\n"
+        taken = []
+        length = len(header)
+        for text in texts:
+            if taken and length + len(text) + 2 > self.MAX_MESSAGE_LENGTH:
+                break
+            taken.append(text)
+            length += len(text) + 2
+        if len(taken) == 1:
+            return taken[0], taken, texts[1:]
+        header = f"📬 Изменения статуса ({len(taken)}):\n\n"
+        return header + "\n\n".join(taken), taken, texts[len(taken):]
+
+    async def _send(self, chat_id):
+        loop = asyncio.get_running_loop()
+        texts = self._pending.pop(chat_id, [])
+        if not texts:
+            self._in_flight.release()
+            self._scheduled.discard(chat_id)
+            return
+        message, sent, rest = self._build_digest(texts)
+        retry_at = None
+        started = time.perf_counter()
+        try:
+            await self.bot.send_message(chat_id, message)
+            self._attempts.pop(chat_id, None)
+            NOTIFICATIONS.inc(result='sent')
+        except TelegramRetryAfter as e:
+            # Flood-wait касается всего бота: приостанавливаем все отправки
+            self._paused_until = loop.time() + e.retry_after
+            retry_at = self._paused_until
+            rest = sent + rest
+            NOTIFICATIONS.inc(result='flood_wait')
+        except (TelegramNetworkError, TelegramServerError) as e:
+            attempts = self._attempts.get(chat_id, 0) + 1
+            if attempts <= self.max_retries:
+                self._attempts[chat_id] = attempts
+                retry_at = loop.time() + self.retry_delay * 2 ** (attempts - 1)
+                rest = sent + rest
+                NOTIFICATIONS.inc(result='retry')
+            else:
+                self._attempts.pop(chat_id, None)
+                NOTIFICATIONS.inc(result='failed')
+                print(f"Ошибка при отправке уведомления: {e}")
+        except Exception as e:
+            self._attempts.pop(chat_id, None)
+            NOTIFICATIONS.inc(result='failed')
+            print(f"Ошибка при отправке уведомления: {e}")
+        finally:
+            NOTIFICATION_DURATION.observe(time.perf_counter() - started)
+            self._in_flight.release()
+            self._last_sent[chat_id] = loop.time()
+            self._scheduled.discard(chat_id)
+
+            # Пока шла отправка, для чата могли прийти новые уведомления
+            pending = rest + self._pending.pop(chat_id, [])
+            if pending:
+                self._pending[chat_id] = pending
+                self._schedule(chat_id, retry_at or loop.time() + self.chat_interval)
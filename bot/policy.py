@@ -0,0 +1,121 @@
+from collections import deque
+from dataclasses import dataclass
+from typing import Optional
+
+
+@dataclass
+class ProbeDecision:
+    """Решение политики по результату проверки"""
+    # Подтвержденный статус, с которым сравниваются статусы сайтов
+    status: str
+    # Через сколько секунд проверить снова (None - по обычному интервалу)
+    next_delay: Optional[float] = None
+    # Отправлять ли уведомления о смене статуса (False, пока сайт "мигает")
+    notify: bool = True
+    # 'flapping_started' или 'flapping_stopped', если сменился режим мигания
+    event: Optional[str] = None
+
+
+class ProbeState:
+    __slots__ = ('confirmed', 'candidate', 'confirmations', 'down_streak', 'transitions', 'flapping')
+
+    def __init__(self, confirmed=None):
+        self.confirmed = confirmed
+        self.candidate = None
+        self.confirmations = 0
+        self.down_streak = 0
+        self.transitions = deque()
+        self.flapping = False
+
+
+class ProbePolicy:
+    """Адаптивная политика проверок.
+
+    Смена статуса принимается только после confirm_probes подряд одинаковых
+    повторных проверок с коротким интервалом confirm_delay. Сайты, которые
+    остаются недоступными, проверяются все реже: интервал умножается на
+    backoff_factor после каждой проверки, но не превышает backoff_max.
+    Если за flap_window секунд статус сменился flap_threshold раз, сайт
+    считается "мигающим" и уведомления о смене статуса приостанавливаются,
+    пока число смен в окне не опустится до flap_reset (гистерезис).
+    """
+
+    def __init__(self, confirm_probes=2, confirm_delay=5.0, backoff_factor=2.0, backoff_max=3600,
+                 flap_window=3600, flap_threshold=6, flap_reset=2):
+        self.confirm_probes = confirm_probes
+        self.confirm_delay = confirm_delay
+        self.backoff_factor = backoff_factor
+        self.backoff_max = backoff_max
+        self.flap_window = flap_window
+        self.flap_threshold = flap_threshold
+        self.flap_reset = flap_reset
+        self._states = {}
+
+    @classmethod
+    def from_config(cls, config):
+        """Создает политику с настройками из конфигурации"""
+        return cls(
+            confirm_probes=config.confirm_probes,
+            confirm_delay=config.confirm_delay,
+            backoff_factor=config.down_backoff_factor,
+            backoff_max=config.down_backoff_max,
+            flap_window=config.flap_window,
+            flap_threshold=config.flap_threshold,
+            flap_reset=config.flap_reset
+        )
+
+    def seed(self, key, status):
+        """Задает известный статус, чтобы после перезапуска не подтверждать его заново"""
+        if key not in self._states and status in ('up', 'down'):
+            self._states[key] = ProbeState(status)
+
+    def forget(self, key):
+        self._states.pop(key, None)
+
+    def observe(self, key, interval, result, now):
+        """Учитывает результат проверки и возвращает решение"""
+        state = self._states.get(key)
+        if state is None:
+            state = self._states[key] = ProbeState()
+        status = result['status']
+
+        if state.confirmed is None:
+            # Первый результат принимаем сразу
+            state.confirmed = status
+        elif status != state.confirmed:
+            if state.candidate != status:
+                state.candidate = status
+                state.confirmations = 0
+            state.confirmations += 1
+            if state.confirmations <= self.confirm_probes:
+                # Не верим одиночному сбою: перепроверяем вскоре
+                return ProbeDecision(state.confirmed, self.confirm_delay, not state.flapping)
+            state.confirmed = status
+            state.transitions.append(now)
+
+        state.candidate = None
+        state.confirmations = 0
+        event = self._update_flapping(state, now)
+
+        next_delay = None
+        if state.confirmed == 'down':
+            state.down_streak += 1
+            if state.down_streak > 1 and self.backoff_factor > 1:
+                next_delay = min(interval * self.backoff_factor ** (state.down_streak - 1), self.backoff_max)
+                next_delay = max(next_delay, interval)
+        else:
+            state.down_streak = 0
+
+        return ProbeDecision(state.confirmed, next_delay, not state.flapping, event)
+
+    def _update_flapping(self, state, now):
+        while state.transitions and state.transitions[0] < now - self.flap_window:
+            state.transitions.popleft()
+        count = len(state.transitions)
+        if not state.flapping and count >= self.flap_threshold:
+            state.flapping = True
+            return 'flapping_started'
+        if state.flapping and count <= self.flap_reset:
+            state.flapping = False
+            return 'flapping_stopped'
+        return None
@@ -0,0 +1,98 @@
+class WebsiteRegistry:
+    """Реестр активных сайтов в памяти.
+
+    Единственный источник правды о сайтах для обработчиков и планировщика:
+    сайты индексированы по id и по пользователю, здесь же хранятся последний
+    статус и время ответа. Добавление и удаление сразу записываются в базу
+    через асинхронный фасад, а статусы попадают туда пачками через ResultWriter.
+    """
+
+    def __init__(self, db=None):
+        self.db = db
+        self._by_id = {}
+        # user_id -> {website_id: None}: упорядоченное множество сайтов пользователя
+        self._by_user = {}
+
+    def __len__(self):
+        return len(self._by_id)
+
+    def __contains__(self, website_id):
+        return website_id in self._by_id
+
+    async def load(self, page_size=1000):
+        """Загружает активные сайты из базы страницами"""
+        async for website in self.db.iter_active_websites(page_size):
+            self.put(website)
+
+    def put(self, website):
+        """Кладет сайт в реестр и возвращает хранимый словарь"""
+        existing = self._by_id.get(website['id'])
+        if existing is not None:
+            return existing
+        website = dict(website)
+        website.setdefault('last_status', 'unknown')
+        website['last_status'] = website['last_status'] or 'unknown'
+        website.setdefault('last_response_time', None)
+        self._by_id[website['id']] = website
+        self._by_user.setdefault(website['user_id'], {})[website['id']] = None
+        return website
+
+    def discard(self, website_id):
+        """Убирает сайт из реестра без записи в базу"""
+        website = self._by_id.pop(website_id, None)
+        if website is not None:
+            user_sites = self._by_user.get(website['user_id'])
+            if user_sites is not None:
+                user_sites.pop(website_id, None)
+                if not user_sites:
+                    del self._by_user[website['user_id']]
+        return website
+
+    def get(self, website_id):
+        return self._by_id.get(website_id)
+
+    def websites(self):
+        """Все активные сайты"""
+        return list(self._by_id.values())
+
+    def get_user_websites(self, user_id):
+        """Активные сайты пользователя в порядке добавления"""
+        return [self._by_id[website_id] for website_id in self._by_user.get(user_id, ())]
+
+    def update_status(self, website_id, status, response_time):
+        website = self._by_id.get(website_id)
+        if website is not None:
+            website['last_status'] = status
+            website['last_response_time'] = response_time
+
+    async def add_website(self, user_id, url, interval, probe_mode='get', content_keyword=None):
+        """Добавляет сайт в базу и в реестр, возвращает словарь сайта или None"""
+        website_id = await self.db.add_website(user_id, url, interval, probe_mode, content_keyword)
+        if not website_id:
+            return None
+        return self.put({
+            'id': website_id,
+            'url': url,
+            'user_id': user_id,
+            'check_interval': interval,
+            'probe_mode': probe_mode,
+            'content_keyword': content_keyword,
+            'last_status': 'unknown'
+        })
+
+    async def add_websites(self, user_id, rows):
+        """Добавляет пачку сайтов в базу одной транзакцией и в реестр"""
+        websites = await self.db.add_websites(user_id, rows)
+        return [self.put(website) for website in websites]
+
+    async def delete_website(self, user_id, website_id):
+        """Удаляет сайт пользователя из реестра и из базы"""
+        website = self._by_id.get(website_id)
+        if website is None or website['user_id'] != user_id:
+            return False
+        # Из реестра убираем только после записи в базу: иначе при ошибке сайт
+        # пропал бы из реестра, но остался активным в базе и в расписании
+        if not await self.db.delete_website(user_id, website_id):
+            return False
+        self.discard(website_id)
+        return True
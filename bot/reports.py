@@ -0,0 +1,136 @@
+import asyncio
+import time
+from datetime import datetime, timedelta, timezone
+import numpy as np
+
+# Окна SLA-отчета
+REPORT_WINDOWS = (("24ч", timedelta(days=1)), ("7д", timedelta(days=7)), ("30д", timedelta(days=30)))
+
+# Последние сутки отчет строит по минутам, более старую историю - по часовым агрегатам
+DETAILED_WINDOW = timedelta(days=1)
+
+
+def compute_sla(series, since, now):
+    """Метрики SLA по всем сайтам ряда за окно [since, now].
+
+    series - массив SERIES_DTYPE, отсортированный по сайту и времени.
+    Точка считается упавшей, если успешных проверок в ней меньше половины;
+    инцидент - подряд идущие упавшие точки одного сайта, он длится до
+    первой успешной точки (или до now, если еще не закончился).
+    Возвращает словарь website_id -> метрики.
+    """
+    series = series[series['t'] >= since]
+    if not len(series):
+        return {}
+
+    website_ids, site = np.unique(series['website_id'], return_inverse=True)
+    sites = len(website_ids)
+    total = np.bincount(site, weights=series['total'], minlength=sites)
+    up = np.bincount(site, weights=series['up'], minlength=sites)
+
+    down = series['up'] * 2 < series['total']
+    times = series['t']
+    # Начало нового сайта в ряду и конец текущего
+    first = np.ones(len(series), dtype=bool)
+    first[1:] = site[1:] != site[:-1]
+    last = np.ones(len(series), dtype=bool)
+    last[:-1] = first[1:]
+
+    previous_down = np.zeros(len(series), dtype=bool)
+    previous_down[1:] = down[:-1]
+    next_down = np.zeros(len(series), dtype=bool)
+    next_down[:-1] = down[1:]
+    starts = np.flatnonzero(down & (first | ~previous_down))
+    ends = np.flatnonzero(down & (last | ~next_down))
+
+    # Инцидент заканчивается на следующей точке того же сайта, а если ее нет - сейчас
+    next_times = np.empty(len(series), dtype=np.int64)
+    next_times[:-1] = times[1:]
+    end_times = np.where(last[ends], now, next_times[ends])
+    durations = np.maximum(end_times - times[starts], 0)
+
+    incident_site = site[starts]
+    outages = np.bincount(incident_site, minlength=sites)
+    downtime = np.bincount(incident_site, weights=durations, minlength=sites)
+    longest = np.zeros(sites, dtype=np.int64)
+    np.maximum.at(longest, incident_site, durations)
+
+    return {
+        int(website_id): {
+            'uptime': float(up[index] / total[index] * 100) if total[index] else None,
+            'checks': int(total[index]),
+            'outages': int(outages[index]),
+            'downtime': int(downtime[index]),
+            'longest': int(longest[index])
+        }
+        for index, website_id in enumerate(website_ids)
+    }
+
+
+def format_duration(seconds):
+    """Длительность в виде '2д 3ч', '1ч 5м' или '40с'"""
+    seconds = int(seconds)
+    days, seconds = divmod(seconds, 86400)
+    hours, seconds = divmod(seconds, 3600)
+    minutes, seconds = divmod(seconds, 60)
+    if days:
+        return f"{days}д {hours}ч"
+    if hours:
+        return f"{hours}ч {minutes}м"
+    if minutes:
+        return f"{minutes}м {seconds}с"
+    return f"{seconds}с"
+
+
+class SlaReportEngine:
+    """SLA-отчеты по сайтам пользователя.
+
+    История за самое длинное из недостающих окон загружается в массивы
+    NumPy: последние сутки - поминутно, все, что старше, - из часовых
+    агрегатов, так что стоимость отчета зависит от числа бакетов, а не от
+    числа проверок. Метрики всех сайтов пользователя считаются векторно по
+    каждому окну, результат каждого окна кэшируется на cache_ttl секунд.
+    """
+
+    def __init__(self, db, cache_ttl=300, windows=REPORT_WINDOWS):
+        self.db = db
+        self.cache_ttl = cache_ttl
+        self.windows = windows
+        # (user_id, окно) -> (срок годности, метрики)
+        self._cache = {}
+
+    async def report(self, user_id):
+        """Словарь окно -> {website_id: метрики} по всем окнам отчета"""
+        loop = asyncio.get_running_loop()
+        reports = {}
+        missing = []
+        for name, window in self.windows:
+            cached = self._cache.get((user_id, name))
+            if cached is not None and cached[0] > loop.time():
+                reports[name] = cached[1]
+            else:
+                missing.append((name, window))
+
+        if missing:
+            now_ts = int(time.time())
+            series = await self.load_series(user_id, now_ts - int(max(window for _, window in missing).total_seconds()))
+            for name, window in missing:
+                reports[name] = compute_sla(series, now_ts - int(window.total_seconds()), now_ts)
+                self._cache[(user_id, name)] = (loop.time() + self.cache_ttl, reports[name])
+        return reports
+
+    async def load_series(self, user_id, since_ts):
+        """Ряд с момента since_ts: поминутно за последние сутки, раньше - по часам"""
+        # Граница выровнена по часу, чтобы часовые бакеты не пересекались с поминутными точками
+        detailed_ts = int(time.time() - DETAILED_WINDOW.total_seconds())
+        detailed_ts -= detailed_ts % 3600
+        if since_ts >= detailed_ts:
+            return await self.db.get_user_check_series(user_id, datetime.fromtimestamp(since_ts, timezone.utc))
+
+        detailed_since = datetime.fromtimestamp(detailed_ts, timezone.utc)
+        hourly, detailed = await asyncio.gather(
+            self.db.get_user_hourly_series(user_id, datetime.fromtimestamp(since_ts, timezone.utc), detailed_since),
+            self.db.get_user_check_series(user_id, detailed_since)
+        )
+        series = np.concatenate([hourly, detailed])
+        return series[np.lexsort((series['t'], series['website_id']))]
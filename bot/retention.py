@@ -0,0 +1,76 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+
+class RetentionCompactor:
+    """Фоновое прореживание истории проверок.
+
+    Сырые результаты хранятся raw_days дней и сворачиваются в минутные
+    агрегаты, минутные хранятся minute_days, часовые сворачиваются в дневные
+    через hourly_days, дневные удаляются через daily_days (0 - хранить всегда).
+    Работа идет пачками по batch_size строк с паузой между ними, чтобы
+    обычная запись результатов не ждала длинных транзакций.
+    """
+
+    def __init__(self, db, raw_days=7, minute_days=30, hourly_days=180, daily_days=0,
+                 interval=3600, batch_size=1000, pause=0.05):
+        self.db = db
+        self.raw_days = raw_days
+        self.minute_days = minute_days
+        self.hourly_days = hourly_days
+        self.daily_days = daily_days
+        self.interval = interval
+        self.batch_size = batch_size
+        self.pause = pause
+        self._task = None
+
+    async def start(self):
+        """Запускает периодическое сжатие"""
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Останавливает сжатие"""
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    async def _run(self):
+        while True:
+            try:
+                await self.run_once()
+            except Exception as e:
+                print(f"Ошибка при сжатии истории проверок: {e}")
+            await asyncio.sleep(self.interval)
+
+    async def _drain(self, step, *args):
+        """Повторяет шаг пачками, пока есть что обрабатывать"""
+        total = 0
+        while True:
+            processed = await step(*args, self.batch_size)
+            total += processed
+            if processed < self.batch_size:
+                return total
+            await asyncio.sleep(self.pause)
+
+    async def run_once(self):
+        """Выполняет один полный проход сжатия и возвращает число обработанных строк"""
+        now = datetime.now(timezone.utc)
+        processed = {
+            'raw': await self._drain(self.db.compact_raw_results, now - timedelta(days=self.raw_days)),
+            'minute': await self._drain(
+                self.db.prune_rollup, 'check_results_minute', now - timedelta(days=self.minute_days)
+            ),
+            'hourly': await self._drain(self.db.compact_hourly_stats, now - timedelta(days=self.hourly_days)),
+            'daily': 0
+        }
+        if self.daily_days:
+            processed['daily'] = await self._drain(
+                self.db.prune_rollup, 'check_results_daily', now - timedelta(days=self.daily_days)
+            )
+        return processed
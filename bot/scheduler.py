@@ -1,79 +1,185 @@
-from apscheduler.schedulers.asyncio import AsyncIOScheduler
-from apscheduler.triggers.interval import IntervalTrigger
+import asyncio
+import time
+import zlib
+from bot.checker import DEFAULT_PROBE_MODE, canonicalize_url
+from bot.engine import ProbeEngine
+from bot.policy import ProbeDecision, ProbePolicy
+from bot.registry import WebsiteRegistry
 
 class MonitoringScheduler:
-    def __init__(self, bot, db, checker):
-        self.bot = bot
-        self.db = db
+    """Планировщик мониторинга.
+
+    Сайты с одинаковым каноническим URL, интервалом и режимом проверяются одной
+    физической проверкой: ключ проверки (url, interval, mode, keyword) хранит множество
+    подписанных сайтов, а результат раздается каждому из них. Когда
+    принимать смену статуса, как часто проверять упавшие сайты и когда
+    молчать о "мигающих", решает ProbePolicy.
+
+    Словари сайтов берутся из WebsiteRegistry, поэтому последний статус,
+    с которым сравнивается новый результат, хранится в одном месте.
+
+    Первая проверка нового ключа попадает в его фазу: детерминированное
+    смещение внутри интервала по хэшу URL, отсчитанное от настенных часов.
+    После перезапуска проверки встают в те же слоты и равномерно
+    распределены по интервалу, а не стартуют все разом.
+    """
+
+    # Через сколько добавленных сайтов отдавать управление event loop при старте
+    START_BATCH = 1000
+
+    def __init__(self, notifier, registry, checker, writer, concurrency=100, jitter=0.1, policy=None,
+                 warmup=0, warmup_concurrency=None):
+        self.notifier = notifier
+        self.registry = registry if registry is not None else WebsiteRegistry()
         self.checker = checker
-        self.scheduler = AsyncIOScheduler()
+        self.writer = writer
+        self.policy = policy if policy is not None else ProbePolicy()
+        self.engine = ProbeEngine(
+            self.check_and_notify,
+            concurrency=concurrency,
+            jitter=jitter,
+            warmup=warmup,
+            warmup_concurrency=warmup_concurrency
+        )
         self.jobs = {}
+        # Ключ проверки -> id подписанных сайтов
+        self.probes = {}
 
     async def start(self):
-        """Запускает планировщик и загружает существующие задачи"""
-        self.scheduler.start()
+        """Запускает планировщик и ставит в мониторинг сайты из реестра"""
+        self.engine.start()
+        for index, website in enumerate(self.registry.websites(), 1):
+            try:
+                self.add_website_to_monitor(website)
+            except ValueError as e:
+                # Строка с некорректным адресом или интервалом не должна мешать запуску остальных проверок
+                print(f"Сайт {website['id']} ({website['url']!r}) пропущен: {e}")
+            if index % self.START_BATCH == 0:
+                await asyncio.sleep(0)
 
-        # Загружаем существующие сайты для мониторинга
-        with self.db.get_connection() as conn:
-            cursor = conn.cursor()
-            cursor.execute("SELECT * FROM websites WHERE is_active = TRUE")
-            websites = cursor.fetchall()
+    async def stop(self):
+        """Останавливает планировщик"""
+        await self.engine.stop()
 
-            for website in websites:
-                self.add_website_to_monitor(website)
+    @staticmethod
+    def probe_key(website):
+        """Ключ физической проверки сайта; ValueError, если адрес не разбирается или интервал не положителен"""
+        if website['check_interval'] <= 0:
+            raise ValueError(f"интервал проверки {website['check_interval']}")
+        mode = website.get('probe_mode') or DEFAULT_PROBE_MODE
+        # Ключевое слово различает проверки содержимого одного адреса
+        keyword = website.get('content_keyword') if mode == 'content' else None
+        return canonicalize_url(website['url']), website['check_interval'], mode, keyword
 
-    def add_website_to_monitor(self, website):
-        """Добавляет сайт в мониторинг"""
-        job_id = f"website_{website['id']}"
+    @staticmethod
+    def phase_delay(key, now=None):
+        """Сколько ждать до фазы ключа проверки: смещения crc32(url) внутри интервала"""
+        url, interval, mode, _ = key
+        phase = zlib.crc32(f"{mode} {url}".encode()) % max(1, int(interval * 1000)) / 1000
+        return (phase - (time.time() if now is None else now)) % interval
 
-        # Создаем задачу для периодической проверки
-        job = self.scheduler.add_job(
-            self.check_and_notify,
-            trigger=IntervalTrigger(seconds=website['check_interval']),
-            args=[website],
-            id=job_id
-        )
+    def add_website_to_monitor(self, website, delay=None):
+        """Добавляет сайт в мониторинг, первая проверка через delay секунд (по умолчанию в фазе ключа)"""
+        if website['id'] in self.jobs:
+            self.remove_website_from_monitor(website['id'])
+
+        # Ключ считается до регистрации: на некорректном адресе ValueError не оставит следов
+        key = self.probe_key(website)
+        website = self.registry.put(website)
+        self.jobs[website['id']] = website
 
-        self.jobs[website['id']] = job
-
-    async def check_and_notify(self, website):
-        """Проверяет сайт и отправляет уведомления при изменении статуса"""
-        result = await self.checker.check_website(website['url'])
-
-        # Сохраняем результат проверки
-        with self.db.get_connection() as conn:
-            cursor = conn.cursor()
-
-            # Получаем текущий статус сайта из базы
-            cursor.execute(
-                "SELECT last_status FROM websites WHERE id = ?",
-                (website['id'],)
-            )
-            current_status_row = cursor.fetchone()
-            current_status = current_status_row['last_status'] if current_status_row else 'unknown'
-
-            # Сохраняем результат проверки
-            cursor.execute(
-                "INSERT INTO check_results (website_id, status, status_code, response_time) VALUES (?, ?, ?, ?)",
-                (website['id'], result['status'], result['status_code'], result['response_time'])
-            )
-
-            # Обновляем статус сайта
-            cursor.execute(
-                "UPDATE websites SET last_status = ?, last_response_time = ? WHERE id = ?",
-                (result['status'], result['response_time'], website['id'])
-            )
-
-            # Проверяем, изменился ли статус
-            if current_status != result['status']:
-                # Отправляем уведомление
+        subscribers = self.probes.get(key)
+        if subscribers is None:
+            # Первый подписчик: ставим физическую проверку в расписание
+            subscribers = self.probes[key] = set()
+            self.policy.seed(key, website.get('last_status'))
+            self.engine.schedule(key, website['check_interval'], self.phase_delay(key) if delay is None else delay)
+        subscribers.add(website['id'])
+
+    def add_websites_to_monitor(self, websites):
+        """Добавляет пачку сайтов, разнося их первые проверки по интервалу.
+
+        Без разноса все импортированные сайты проверялись бы одновременно
+        через один интервал после импорта.
+        """
+        count = len(websites)
+        for index, website in enumerate(websites):
+            self.add_website_to_monitor(website, delay=website['check_interval'] * index / count)
+
+    def remove_website_from_monitor(self, website_id):
+        """Убирает сайт из мониторинга"""
+        website = self.jobs.pop(website_id, None)
+        self.registry.discard(website_id)
+        if website is None:
+            return
+
+        key = self.probe_key(website)
+        subscribers = self.probes.get(key)
+        if subscribers is None:
+            return
+        subscribers.discard(website_id)
+        if not subscribers:
+            # Последний подписчик ушел: проверка больше не нужна
+            del self.probes[key]
+            self.engine.cancel(key)
+            self.policy.forget(key)
+            if key[2] == 'content' and self.checker is not None:
+                # Иначе кэш проверок содержимого рос бы с каждым когда-либо добавленным сайтом
+                self.checker.forget(key)
+
+    async def check_and_notify(self, key):
+        """Проверяет URL один раз и раздает результат всем подписанным сайтам"""
+        url, interval, mode, keyword = key
+        result = await self.checker.check_website(url, mode, keyword, cache_key=key)
+        decision = self.policy.observe(key, interval, result, time.monotonic())
+
+        for website_id in list(self.probes.get(key, ())):
+            website = self.jobs.get(website_id)
+            if website is not None:
+                await self.process_result(website, result, decision)
+        return decision.next_delay
+
+    async def process_result(self, website, result, decision=None):
+        """Сохраняет результат и отправляет уведомление при изменении статуса"""
+        if decision is None:
+            decision = ProbeDecision(result['status'])
+
+        # Ставим результат в очередь на запись, база обновится пачкой;
+        # статусом сайта в базе считается подтвержденный статус
+        await self.writer.put(website['id'], {**result, 'confirmed_status': decision.status})
+
+        if decision.event == 'flapping_started':
+            self.notifier.notify(website['user_id'], self.format_flapping(website, True, decision.status))
+        elif decision.event == 'flapping_stopped':
+            self.notifier.notify(website['user_id'], self.format_flapping(website, False, decision.status))
+
+        if result.get('content', {}).get('changed'):
+            self.notifier.notify(website['user_id'], self.format_content_changed(website, result))
+
+        # Проверяем, изменился ли подтвержденный статус
+        current_status = website['last_status']
+        if current_status != decision.status and result['status'] == decision.status:
+            self.registry.update_status(website['id'], decision.status, result['response_time'])
+            if decision.notify:
+                # Ставим уведомление в очередь, отправкой займется диспетчер
                 message = self.format_notification(website, result, current_status)
-                try:
-                    await self.bot.send_message(website['user_id'], message)
-                except Exception as e:
-                    print(f"Ошибка при отправке уведомления: {e}")
+                self.notifier.notify(website['user_id'], message)
+
+    def format_flapping(self, website, started, status):
+        """Форматирует уведомление о нестабильном сайте"""
+        if started:
+            return (f"⚠️ Сайт {website['url']} работает нестабильно: статус часто меняется.\n"
+                    f"Уведомления о смене статуса приостановлены до стабилизации.")
+        status_text = "доступен" if status == 'up' else "недоступен"
+        return f"✅ Сайт {website['url']} стабилизировался, сейчас {status_text}."
 
-            conn.commit()
+    def format_content_changed(self, website, result):
+        """Форматирует уведомление об изменении содержимого страницы"""
+        content = result['content']
+        return (f"📝 Содержимое страницы {website['url']} изменилось\n"
+                f"🔑 Хэш: {content['digest'][:16]}"
+                + (f" (первые {content['bytes']} байт)" if content['truncated'] else "")
+                + f"\n⏰ Время: {result['timestamp'].strftime('%Y-%m-%d %H:%M:%S')}")
 
     def format_notification(self, website, result, previous_status):
         """Форматирует сообщение уведомления"""
@@ -86,5 +192,5 @@ class MonitoringScheduler:
             return (f"🟢 Сайт {website['url']} снова доступен!\n"
                     f"📊 Предыдущий статус: {previous_status}\n"
                     f"⚡ Время ответа: {result['response_time']:.2f}мс\n"
-                    f"✅ Код ответа: {result['status_code']}\n"
-                    f"⏰ Время: {result['timestamp'].strftime('%Y-%m-%d %H:%M:%S')}")
\ No newline at end of file
+                    + (f"✅ Код ответа: {result['status_code']}\n" if result['status_code'] is not None else "")
+                    + f"⏰ Время: {result['timestamp'].strftime('%Y-%m-%d %H:%M:%S')}")
\ No newline at end of file
@@ -0,0 +1,167 @@
+import math
+
+# Относительная погрешность квантилей: оценка отличается от истинного значения не больше чем на 1%
+RELATIVE_ACCURACY = 0.01
+
+# Значения меньше этого (мс) считаются нулевыми и хранятся отдельным счетчиком
+MIN_VALUE = 0.01
+
+SKETCH_VERSION = 1
+
+_GAMMA = (1 + RELATIVE_ACCURACY) / (1 - RELATIVE_ACCURACY)
+_LOG_GAMMA = math.log(_GAMMA)
+
+
+def _write_varint(out, value):
+    while value >= 0x80:
+        out.append((value & 0x7F) | 0x80)
+        value >>= 7
+    out.append(value)
+
+
+def _read_varint(data, position):
+    value = 0
+    shift = 0
+    while True:
+        byte = data[position]
+        position += 1
+        value |= (byte & 0x7F) << shift
+        if byte < 0x80:
+            return value, position
+        shift += 7
+
+
+class LatencySketch:
+    """Потоковый скетч квантилей времени ответа в духе DDSketch.
+
+    Значения раскладываются по логарифмическим корзинам, поэтому любой
+    квантиль оценивается с относительной погрешностью RELATIVE_ACCURACY,
+    а размер скетча зависит от разброса значений, а не от их количества.
+    Скетчи складываются поштучно по корзинам, так что скетч за день или
+    неделю получается слиянием часовых без обращения к сырым результатам.
+    """
+
+    __slots__ = ('bins', 'zero_count', 'count')
+
+    def __init__(self):
+        self.bins = {}
+        self.zero_count = 0
+        self.count = 0
+
+    def __len__(self):
+        return self.count
+
+    def add(self, value, count=1):
+        """Добавляет значение (мс)"""
+        if value is None:
+            return
+        if value < MIN_VALUE:
+            self.zero_count += count
+        else:
+            index = math.ceil(math.log(value) / _LOG_GAMMA)
+            self.bins[index] = self.bins.get(index, 0) + count
+        self.count += count
+
+    def merge(self, other):
+        """Добавляет к скетчу все значения другого скетча"""
+        for index, count in other.bins.items():
+            self.bins[index] = self.bins.get(index, 0) + count
+        self.zero_count += other.zero_count
+        self.count += other.count
+        return self
+
+    def quantile(self, q):
+        """Оценка квантиля q (0..1) или None для пустого скетча"""
+        if not self.count:
+            return None
+        rank = q * (self.count - 1)
+        seen = self.zero_count
+        if seen > rank:
+            return 0.0
+        for index in sorted(self.bins):
+            seen += self.bins[index]
+            if seen > rank:
+                # Середина корзины (gamma^(i-1), gamma^i] с точки зрения относительной ошибки
+                return 2 * _GAMMA ** index / (_GAMMA + 1)
+        return 2 * _GAMMA ** max(self.bins) / (_GAMMA + 1)
+
+    def to_bytes(self):
+        """Компактное представление: версия, нулевой счетчик и корзины в varint с дельтами индексов"""
+        out = bytearray([SKETCH_VERSION])
+        _write_varint(out, self.zero_count)
+        _write_varint(out, len(self.bins))
+        previous = None
+        for index in sorted(self.bins):
+            if previous is None:
+                # zigzag: индексы корзин для значений меньше 1 мс отрицательные
+                _write_varint(out, (index << 1) ^ (index >> 63))
+            else:
+                _write_varint(out, index - previous)
+            _write_varint(out, self.bins[index])
+            previous = index
+        return bytes(out)
+
+    @classmethod
+    def from_bytes(cls, data):
+        """Восстанавливает скетч из to_bytes"""
+        sketch = cls()
+        if not data:
+            return sketch
+        if data[0] != SKETCH_VERSION:
+            raise ValueError(f"Неизвестная версия скетча: {data[0]}")
+        sketch.zero_count, position = _read_varint(data, 1)
+        size, position = _read_varint(data, position)
+        index = None
+        for _ in range(size):
+            value, position = _read_varint(data, position)
+            if index is None:
+                index = (value >> 1) ^ -(value & 1)
+            else:
+                index += value
+            count, position = _read_varint(data, position)
+            sketch.bins[index] = count
+        sketch.count = sketch.zero_count + sum(sketch.bins.values())
+        return sketch
+
+
+def merge_sketch_blobs(first, second):
+    """Слияние двух сериализованных скетчей; None означает пустой скетч"""
+    if first is None:
+        return second
+    if second is None:
+        return first
+    return LatencySketch.from_bytes(first).merge(LatencySketch.from_bytes(second)).to_bytes()
+
+
+class SketchOfValues:
+    """Агрегатная функция SQLite: скетч из значений столбца (NULL пропускаются)"""
+
+    def __init__(self):
+        self.sketch = LatencySketch()
+
+    def step(self, value):
+        self.sketch.add(value)
+
+    def finalize(self):
+        return self.sketch.to_bytes() if self.sketch.count else None
+
+
+class SketchUnion:
+    """Агрегатная функция SQLite: слияние сериализованных скетчей"""
+
+    def __init__(self):
+        self.sketch = LatencySketch()
+
+    def step(self, blob):
+        if blob is not None:
+            self.sketch.merge(LatencySketch.from_bytes(blob))
+
+    def finalize(self):
+        return self.sketch.to_bytes() if self.sketch.count else None
+
+
+def register_sqlite_functions(conn):
+    """Регистрирует функции работы со скетчами в соединении SQLite"""
+    conn.create_function('sketch_merge', 2, merge_sketch_blobs, deterministic=True)
+    conn.create_aggregate('sketch_of', 1, SketchOfValues)
+    conn.create_aggregate('sketch_union', 1, SketchUnion)
@@ -0,0 +1,719 @@
+import calendar
+import os
+import time
+from datetime import timezone
+
+import numpy as np
+from sqlalchemy import (
+    BigInteger, Boolean, Column, DateTime, Float, ForeignKey, Index, Integer, LargeBinary,
+    MetaData, PrimaryKeyConstraint, Table, Text, bindparam, case, delete, event, func, select,
+    tuple_, update
+)
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import DATETIME as SQLITE_DATETIME, insert as sqlite_insert
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from bot.database import LATENCY_QUANTILES, ROLLUP_TABLES, SERIES_DTYPE, first_full_hour
+from bot.metrics import DB_OPERATIONS, DB_DURATION
+from bot.sketch import LatencySketch
+from bot.storage import StorageBackend, parse_db_url, sqlite_path
+
+# Сколько ключей бакетов подставлять в один запрос IN
+KEYS_PER_QUERY = 500
+
+metadata = MetaData()
+
+# Целочисленный первичный ключ: в SQLite только INTEGER дает автоинкремент
+IdType = BigInteger().with_variant(Integer, 'sqlite')
+
+# Время в SQLite хранится строкой 'YYYY-MM-DD HH:MM:SS', как его пишет Database:
+# с микросекундами строки не совпали бы с бакетами и сравнениями в том же файле
+TimestampType = DateTime().with_variant(SQLITE_DATETIME(
+    storage_format="%(year)04d-%(month)02d-%(day)02d %(hour)02d:%(minute)02d:%(second)02d"
+), 'sqlite')
+
+users = Table(
+    'users', metadata,
+    Column('id', BigInteger, primary_key=True, autoincrement=False),
+    Column('chat_id', BigInteger, unique=True, nullable=False),
+    Column('created_at', TimestampType, server_default=func.current_timestamp()),
+)
+
+websites = Table(
+    'websites', metadata,
+    Column('id', IdType, primary_key=True, autoincrement=True),
+    Column('url', Text, nullable=False),
+    Column('user_id', BigInteger, ForeignKey('users.id'), nullable=False),
+    Column('check_interval', Integer, server_default='300'),
+    Column('last_status', Text, server_default='unknown'),
+    Column('last_response_time', Float),
+    Column('is_active', Boolean, server_default='1', nullable=False),
+    Column('created_at', TimestampType, server_default=func.current_timestamp()),
+    Column('probe_mode', Text, server_default='get'),
+    Column('content_keyword', Text),
+    Index('idx_websites_user_active', 'user_id', 'is_active', 'id'),
+)
+
+check_results = Table(
+    'check_results', metadata,
+    Column('id', IdType, primary_key=True, autoincrement=True),
+    Column('website_id', IdType, ForeignKey('websites.id'), nullable=False),
+    Column('status', Text, nullable=False),
+    Column('status_code', Integer),
+    Column('response_time', Float),
+    Column('timestamp', TimestampType, server_default=func.current_timestamp()),
+    Column('dns_time', Float),
+    Column('connect_time', Float),
+    Column('tls_time', Float),
+    Column('ttfb_time', Float),
+    Index('idx_check_results_website_time_status', 'website_id', 'timestamp', 'status'),
+    Index('idx_check_results_timestamp', 'timestamp'),
+)
+
+website_stats = Table(
+    'website_stats', metadata,
+    Column('website_id', IdType, ForeignKey('websites.id'), primary_key=True),
+    Column('total_checks', Integer, nullable=False, server_default='0'),
+    Column('up_checks', Integer, nullable=False, server_default='0'),
+    Column('response_time_sum', Float, nullable=False, server_default='0'),
+)
+
+
+def _rollup_table(name):
+    return Table(
+        name, metadata,
+        Column('website_id', IdType, ForeignKey('websites.id'), nullable=False),
+        Column('bucket', TimestampType, nullable=False),
+        Column('total_checks', Integer, nullable=False, server_default='0'),
+        Column('up_checks', Integer, nullable=False, server_default='0'),
+        Column('response_time_sum', Float, nullable=False, server_default='0'),
+        Column('response_time_min', Float),
+        Column('response_time_max', Float),
+        Column('response_time_sketch', LargeBinary),
+        PrimaryKeyConstraint('website_id', 'bucket'),
+        Index(f'idx_{name}_bucket', 'bucket'),
+    )
+
+
+rollups = {name: _rollup_table(name) for name in ROLLUP_TABLES}
+minute_rollup, hourly_rollup, daily_rollup = (rollups[name] for name in ROLLUP_TABLES)
+
+
+def to_utc(moment):
+    """Момент в наивном UTC с точностью до секунды, как хранит база"""
+    return moment.astimezone(timezone.utc).replace(tzinfo=None, microsecond=0)
+
+
+def to_unix(moment):
+    return calendar.timegm(moment.timetuple())
+
+
+def _chunks(items, size=KEYS_PER_QUERY):
+    items = list(items)
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+class SqlAlchemyDatabase(StorageBackend):
+    """Хранилище на асинхронном движке SQLAlchemy с пулом соединений.
+
+    Реализует тот же контракт, что и AsyncDatabase, поэтому бот может
+    работать на SQLite локально и на PostgreSQL под нагрузкой. Запросы
+    собираются один раз при создании объекта и переиспользуют кэш
+    компиляции SQLAlchemy (а asyncpg - подготовленные выражения), записи
+    идут пачками через executemany. Схему создает start(); в отличие от
+    Database, миграции старых баз SQLite здесь не выполняются.
+
+    Скетчи квантилей сливаются в Python (см. _merge_buckets), счетчики
+    обновляются арифметикой в ON CONFLICT, как и в Database.
+    """
+
+    def __init__(self, db_url, pool_size=10, max_overflow=20, pool_timeout=30, pool_recycle=1800,
+                 stats_cache_ttl=30):
+        super().__init__(stats_cache_ttl)
+        dialect, _ = parse_db_url(db_url)
+        if dialect == 'sqlite':
+            # Каталог файла базы создаем заранее, как это делает Database
+            db_dir = os.path.dirname(sqlite_path(db_url))
+            if db_dir:
+                os.makedirs(db_dir, exist_ok=True)
+        self.engine = create_async_engine(
+            db_url,
+            pool_size=pool_size,
+            max_overflow=max_overflow,
+            pool_timeout=pool_timeout,
+            pool_recycle=pool_recycle,
+            pool_pre_ping=True
+        )
+        if self.engine.dialect.name == 'sqlite':
+            event.listen(self.engine.sync_engine, 'connect', self._configure_sqlite)
+        self._insert = postgresql_insert if self.engine.dialect.name == 'postgresql' else sqlite_insert
+        self._prepare_statements()
+
+    @classmethod
+    def from_config(cls, config):
+        return cls(
+            config.db_url,
+            pool_size=config.db_pool_size,
+            max_overflow=config.db_max_overflow,
+            pool_timeout=config.db_pool_timeout,
+            pool_recycle=config.db_pool_recycle,
+            stats_cache_ttl=config.stats_cache_ttl
+        )
+
+    @staticmethod
+    def _configure_sqlite(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.execute("PRAGMA synchronous=NORMAL")
+        cursor.execute("PRAGMA busy_timeout=5000")
+        cursor.close()
+
+    def _prepare_statements(self):
+        """Собирает запросы, которые выполняются на каждой записи и чтении"""
+        statement = self._insert(users).values(id=bindparam('user_id'), chat_id=bindparam('chat_id'))
+        self._add_user_sql = statement.on_conflict_do_nothing(index_elements=[users.c.id])
+
+        self._add_website_sql = websites.insert().returning(
+            websites.c.id, websites.c.url, websites.c.user_id, websites.c.check_interval,
+            websites.c.last_status, websites.c.probe_mode, websites.c.content_keyword,
+            sort_by_parameter_order=True
+        )
+
+        self._insert_results_sql = check_results.insert()
+        self._update_status_sql = (
+            update(websites)
+            .where(websites.c.id == bindparam('b_website_id'))
+            .values(last_status=bindparam('b_status'), last_response_time=bindparam('b_response_time'))
+        )
+
+        statement = self._insert(website_stats)
+        self._merge_totals_sql = statement.on_conflict_do_update(
+            index_elements=[website_stats.c.website_id],
+            set_={
+                'total_checks': website_stats.c.total_checks + statement.excluded.total_checks,
+                'up_checks': website_stats.c.up_checks + statement.excluded.up_checks,
+                'response_time_sum': website_stats.c.response_time_sum + statement.excluded.response_time_sum,
+            }
+        )
+
+        self._insert_bucket_sql = {}
+        self._merge_bucket_sql = {}
+        for name, table in rollups.items():
+            statement = self._insert(table)
+            self._insert_bucket_sql[name] = (
+                statement.on_conflict_do_nothing(index_elements=[table.c.website_id, table.c.bucket])
+                .returning(table.c.website_id, table.c.bucket)
+            )
+            self._merge_bucket_sql[name] = statement.on_conflict_do_update(
+                index_elements=[table.c.website_id, table.c.bucket],
+                set_={
+                    'total_checks': table.c.total_checks + statement.excluded.total_checks,
+                    'up_checks': table.c.up_checks + statement.excluded.up_checks,
+                    'response_time_sum': table.c.response_time_sum + statement.excluded.response_time_sum,
+                    'response_time_min': func.min(table.c.response_time_min, statement.excluded.response_time_min)
+                    if self.engine.dialect.name == 'sqlite'
+                    else func.least(table.c.response_time_min, statement.excluded.response_time_min),
+                    'response_time_max': func.max(table.c.response_time_max, statement.excluded.response_time_max)
+                    if self.engine.dialect.name == 'sqlite'
+                    else func.greatest(table.c.response_time_max, statement.excluded.response_time_max),
+                    # Скетч уже слит в Python со значением из базы
+                    'response_time_sketch': statement.excluded.response_time_sketch,
+                }
+            )
+
+        average = case(
+            (website_stats.c.total_checks > 0, website_stats.c.response_time_sum / website_stats.c.total_checks),
+            else_=0
+        ).label('avg_response_time')
+        stats_columns = (
+            func.coalesce(website_stats.c.total_checks, 0).label('total_checks'),
+            func.coalesce(website_stats.c.up_checks, 0).label('up_checks'),
+            average
+        )
+        stats_join = websites.outerjoin(website_stats, website_stats.c.website_id == websites.c.id)
+        self._website_stats_sql = (
+            select(*stats_columns).select_from(stats_join).where(websites.c.id == bindparam('website_id'))
+        )
+        self._user_stats_sql = (
+            select(websites.c.id, websites.c.url, websites.c.check_interval, websites.c.last_status, *stats_columns)
+            .select_from(stats_join)
+            .where(websites.c.user_id == bindparam('user_id'), websites.c.is_active.is_(True))
+            .order_by(websites.c.id)
+        )
+
+    async def start(self):
+        """Создает недостающие таблицы и индексы"""
+        async with self.engine.begin() as conn:
+            await conn.run_sync(metadata.create_all)
+
+    async def _run(self, func, *args, write=False):
+        operation = func.__name__.lstrip('_')
+        started = time.perf_counter()
+        result = 'ok'
+        try:
+            async with (self.engine.begin() if write else self.engine.connect()) as conn:
+                return await func(conn, *args)
+        except Exception:
+            result = 'error'
+            raise
+        finally:
+            DB_OPERATIONS.inc(operation=operation, result=result)
+            DB_DURATION.observe(time.perf_counter() - started, operation=operation)
+
+    async def _write(self, func, *args):
+        return await self._run(func, *args, write=True)
+
+    async def _read(self, func, *args):
+        return await self._run(func, *args)
+
+    # Пользователи и сайты
+
+    async def add_user(self, user_id, chat_id):
+        try:
+            await self._write(self._add_user, user_id, chat_id)
+            return True
+        except SQLAlchemyError as e:
+            print(f"Ошибка при добавлении пользователя: {e}")
+            return False
+
+    async def _add_user(self, conn, user_id, chat_id):
+        await conn.execute(self._add_user_sql, {'user_id': user_id, 'chat_id': chat_id})
+
+    async def add_website(self, user_id, url, interval, probe_mode='get', content_keyword=None):
+        self._invalidate_stats(user_id)
+        try:
+            websites_added = await self._write(
+                self._add_websites, user_id, [(url, interval, probe_mode, content_keyword)]
+            )
+            return websites_added[0]['id']
+        except SQLAlchemyError as e:
+            print(f"Ошибка при добавлении сайта: {e}")
+            return None
+
+    async def add_websites(self, user_id, rows):
+        self._invalidate_stats(user_id)
+        try:
+            return await self._write(self._add_websites, user_id, [(*row, None) for row in rows])
+        except SQLAlchemyError as e:
+            print(f"Ошибка при импорте сайтов: {e}")
+            return []
+
+    async def _add_websites(self, conn, user_id, rows):
+        result = await conn.execute(self._add_website_sql, [
+            {'url': url, 'user_id': user_id, 'check_interval': interval, 'last_status': 'unknown',
+             'probe_mode': probe_mode, 'content_keyword': content_keyword}
+            for url, interval, probe_mode, content_keyword in rows
+        ])
+        return [dict(row) for row in result.mappings()]
+
+    async def delete_website(self, user_id, website_id):
+        self._invalidate_stats(user_id)
+        try:
+            return await self._write(self._delete_website, user_id, website_id)
+        except SQLAlchemyError as e:
+            print(f"Ошибка при удалении сайта: {e}")
+            return False
+
+    async def _delete_website(self, conn, user_id, website_id):
+        result = await conn.execute(
+            update(websites)
+            .where(websites.c.id == website_id, websites.c.user_id == user_id)
+            .values(is_active=False)
+        )
+        return result.rowcount > 0
+
+    async def get_user_websites(self, user_id):
+        try:
+            return await self._read(self._get_user_websites, user_id)
+        except SQLAlchemyError as e:
+            print(f"Ошибка при получении сайтов: {e}")
+            return []
+
+    async def _get_user_websites(self, conn, user_id):
+        result = await conn.execute(
+            select(websites).where(websites.c.user_id == user_id, websites.c.is_active.is_(True))
+        )
+        return result.mappings().all()
+
+    async def get_user_websites_page(self, user_id, after_id=0, limit=20, before_id=None):
+        try:
+            return await self._read(self._get_user_websites_page, user_id, after_id, limit, before_id)
+        except SQLAlchemyError as e:
+            print(f"Ошибка при получении сайтов: {e}")
+            return []
+
+    async def _get_user_websites_page(self, conn, user_id, after_id, limit, before_id):
+        query = select(websites).where(websites.c.user_id == user_id, websites.c.is_active.is_(True))
+        if before_id is None:
+            result = await conn.execute(query.where(websites.c.id > after_id).order_by(websites.c.id).limit(limit))
+            return result.mappings().all()
+        result = await conn.execute(
+            query.where(websites.c.id < before_id).order_by(websites.c.id.desc()).limit(limit)
+        )
+        return result.mappings().all()[::-1]
+
+    async def get_active_websites(self):
+        try:
+            return await self._read(self._get_active_websites)
+        except SQLAlchemyError as e:
+            print(f"Ошибка при получении сайтов: {e}")
+            return []
+
+    async def _get_active_websites(self, conn):
+        result = await conn.execute(select(websites).where(websites.c.is_active.is_(True)))
+        return result.mappings().all()
+
+    async def get_active_websites_page(self, after_id, limit):
+        try:
+            return await self._read(self._get_active_websites_page, after_id, limit)
+        except SQLAlchemyError as e:
+            print(f"Ошибка при получении сайтов: {e}")
+            return []
+
+    async def _get_active_websites_page(self, conn, after_id, limit):
+        result = await conn.execute(
+            select(websites)
+            .where(websites.c.is_active.is_(True), websites.c.id > after_id)
+            .order_by(websites.c.id)
+            .limit(limit)
+        )
+        return result.mappings().all()
+
+    # Статистика
+
+    async def get_website_stats(self, website_id):
+        try:
+            return await self._read(self._get_website_stats, website_id)
+        except SQLAlchemyError as e:
+            print(f"Ошибка при получении статистики: {e}")
+            return None
+
+    async def _get_website_stats(self, conn, website_id):
+        result = await conn.execute(self._website_stats_sql, {'website_id': website_id})
+        return result.mappings().first()
+
+    async def get_user_websites_stats(self, user_id):
+        """Статистика по сайтам пользователя с коротким кэшем"""
+        return await self._cached_user_stats(user_id, self._load_user_websites_stats)
+
+    async def _load_user_websites_stats(self, user_id):
+        try:
+            return await self._read(self._get_user_websites_stats, user_id)
+        except SQLAlchemyError as e:
+            print(f"Ошибка при получении статистики: {e}")
+            return []
+
+    async def _get_user_websites_stats(self, conn, user_id):
+        result = await conn.execute(self._user_stats_sql, {'user_id': user_id})
+        return result.mappings().all()
+
+    async def get_hourly_stats(self, website_id, since):
+        try:
+            return await self._read(self._get_hourly_stats, website_id, since)
+        except SQLAlchemyError as e:
+            print(f"Ошибка при получении статистики: {e}")
+            return []
+
+    async def _get_hourly_stats(self, conn, website_id, since):
+        table = hourly_rollup
+        result = await conn.execute(
+            select(
+                table.c.bucket, table.c.total_checks, table.c.up_checks,
+                (table.c.response_time_sum / table.c.total_checks).label('avg_response_time'),
+                table.c.response_time_min, table.c.response_time_max
+            )
+            .where(table.c.website_id == website_id,
+                   table.c.bucket >= to_utc(since).replace(minute=0, second=0))
+            .order_by(table.c.bucket)
+        )
+        return result.mappings().all()
+
+    async def get_user_latency_percentiles(self, user_id, since):
+        try:
+            return await self._read(self._get_user_latency_percentiles, user_id, since)
+        except SQLAlchemyError as e:
+            print(f"Ошибка при получении статистики: {e}")
+            return {}
+
+    async def _get_user_latency_percentiles(self, conn, user_id, since):
+        # Полные часы - из часовых скетчей, неполный первый час - из минутных и сырых результатов
+        full_hour = to_utc(first_full_hour(since))
+        since = to_utc(since)
+        owned = (websites.c.user_id == user_id, websites.c.is_active.is_(True))
+        sketches = {}
+        for table, start in ((hourly_rollup, full_hour), (minute_rollup, since)):
+            query = (
+                select(table.c.website_id, table.c.response_time_sketch)
+                .join(websites, websites.c.id == table.c.website_id)
+                .where(*owned, table.c.bucket >= start, table.c.response_time_sketch.is_not(None))
+            )
+            if table is minute_rollup:
+                query = query.where(table.c.bucket < full_hour)
+            for website_id, blob in await conn.execute(query):
+                sketches.setdefault(website_id, LatencySketch()).merge(LatencySketch.from_bytes(blob))
+
+        raw = await conn.execute(
+            select(check_results.c.website_id, check_results.c.response_time)
+            .join(websites, websites.c.id == check_results.c.website_id)
+            .where(*owned, check_results.c.status == 'up',
+                   check_results.c.timestamp >= since, check_results.c.timestamp < full_hour)
+        )
+        for website_id, response_time in raw:
+            sketches.setdefault(website_id, LatencySketch()).add(response_time)
+        return {
+            website_id: {name: sketch.quantile(q) for name, q in LATENCY_QUANTILES.items()}
+            for website_id, sketch in sketches.items() if sketch.count
+        }
+
+    async def get_user_check_series(self, user_id, since):
+        try:
+            return await self._read(self._get_user_check_series, user_id, since)
+        except SQLAlchemyError as e:
+            print(f"Ошибка при получении истории проверок: {e}")
+            return np.empty(0, dtype=SERIES_DTYPE)
+
+    async def _get_user_check_series(self, conn, user_id, since):
+        since = to_utc(since)
+        owned = (websites.c.user_id == user_id, websites.c.is_active.is_(True))
+        # Сырые результаты сворачиваются по минутам в базе, до передачи в Python
+        minute_of = self._minute_of(check_results.c.timestamp).label('minute')
+        raw = await conn.execute(
+            select(check_results.c.website_id, minute_of, func.count(),
+                   func.sum(case((check_results.c.status == 'up', 1), else_=0)))
+            .join(websites, websites.c.id == check_results.c.website_id)
+            .where(*owned, check_results.c.timestamp >= since)
+            .group_by(check_results.c.website_id, minute_of)
+        )
+        minute = await conn.execute(
+            select(minute_rollup.c.website_id, minute_rollup.c.bucket,
+                   minute_rollup.c.total_checks, minute_rollup.c.up_checks)
+            .join(websites, websites.c.id == minute_rollup.c.website_id)
+            .where(*owned, minute_rollup.c.bucket >= since)
+        )
+        return self._to_series(list(raw) + list(minute))
+
+    def _minute_of(self, column):
+        if self.engine.dialect.name == 'sqlite':
+            return func.strftime('%Y-%m-%d %H:%M:00', column, type_=column.type)
+        return func.date_trunc('minute', column, type_=column.type)
+
+    async def get_user_hourly_series(self, user_id, since, until):
+        try:
+            return await self._read(self._get_user_hourly_series, user_id, since, until)
+        except SQLAlchemyError as e:
+            print(f"Ошибка при получении истории проверок: {e}")
+            return np.empty(0, dtype=SERIES_DTYPE)
+
+    async def _get_user_hourly_series(self, conn, user_id, since, until):
+        result = await conn.execute(
+            select(hourly_rollup.c.website_id, hourly_rollup.c.bucket,
+                   hourly_rollup.c.total_checks, hourly_rollup.c.up_checks)
+            .join(websites, websites.c.id == hourly_rollup.c.website_id)
+            .where(websites.c.user_id == user_id, websites.c.is_active.is_(True),
+                   hourly_rollup.c.bucket >= to_utc(since), hourly_rollup.c.bucket < to_utc(until))
+        )
+        return self._to_series(list(result))
+
+    @staticmethod
+    def _to_series(rows):
+        """Массив SERIES_DTYPE из строк (сайт, время, проверок, успешных), по сайту и времени"""
+        series = np.array(
+            [(website_id, to_unix(moment), total, up) for website_id, moment, total, up in rows],
+            dtype=SERIES_DTYPE
+        ) if rows else np.empty(0, dtype=SERIES_DTYPE)
+        return series[np.lexsort((series['t'], series['website_id']))]
+
+    # Запись результатов
+
+    async def save_check_results(self, results):
+        await self._write(self._save_check_results, results)
+        self._invalidate_stats_for_results(results)
+
+    async def _save_check_results(self, conn, results):
+        rows = []
+        statuses = []
+        totals = {}
+        hourly = {}
+        for website_id, result in results:
+            timings = result.get('timings') or {}
+            moment = to_utc(result['timestamp'])
+            rows.append({
+                'website_id': website_id,
+                'status': result['status'],
+                'status_code': result['status_code'],
+                'response_time': result['response_time'],
+                'timestamp': moment,
+                'dns_time': timings.get('dns'),
+                'connect_time': timings.get('connect'),
+                'tls_time': timings.get('tls'),
+                'ttfb_time': timings.get('ttfb'),
+            })
+            statuses.append({
+                'b_website_id': website_id,
+                'b_status': result.get('confirmed_status', result['status']),
+                'b_response_time': result['response_time'],
+            })
+
+            up = 1 if result['status'] == 'up' else 0
+            response_time = result['response_time'] or 0
+            total = totals.setdefault(website_id, [0, 0, 0.0])
+            total[0] += 1
+            total[1] += up
+            total[2] += response_time
+            bucket = self._bucket(hourly, (website_id, moment.replace(minute=0, second=0)))
+            self._add_to_bucket(bucket, 1, up, response_time, response_time, response_time)
+            if up:
+                bucket[5].add(response_time)
+
+        await conn.execute(self._insert_results_sql, rows)
+        await conn.execute(self._update_status_sql, statuses)
+        await conn.execute(self._merge_totals_sql, [
+            {'website_id': website_id, 'total_checks': total[0], 'up_checks': total[1], 'response_time_sum': total[2]}
+            for website_id, total in totals.items()
+        ])
+        await self._merge_buckets(conn, 'check_results_hourly', hourly)
+
+    @staticmethod
+    def _bucket(buckets, key):
+        bucket = buckets.get(key)
+        if bucket is None:
+            bucket = buckets[key] = [0, 0, 0.0, None, None, LatencySketch()]
+        return bucket
+
+    @staticmethod
+    def _add_to_bucket(bucket, total, up, response_time_sum, response_time_min, response_time_max):
+        bucket[0] += total
+        bucket[1] += up
+        bucket[2] += response_time_sum
+        if response_time_min is not None:
+            bucket[3] = response_time_min if bucket[3] is None else min(bucket[3], response_time_min)
+        if response_time_max is not None:
+            bucket[4] = response_time_max if bucket[4] is None else max(bucket[4], response_time_max)
+
+    async def _merge_buckets(self, conn, name, buckets):
+        """Добавляет пачку бакетов к агрегату, сливая скетчи с уже сохраненными.
+
+        Новые бакеты сначала вставляются целиком (ON CONFLICT DO NOTHING).
+        Остальные строки к этому моменту уже существуют, поэтому FOR UPDATE
+        на PostgreSQL действительно их блокирует: параллельный писатель того
+        же бакета дождется коммита и сольет свой скетч с нашим, а не
+        перезапишет его. На SQLite первая же вставка берет блокировку записи
+        всей базы до конца транзакции.
+        """
+        table = rollups[name]
+        inserted = set()
+        for chunk in _chunks(buckets.items()):
+            result = await conn.execute(self._insert_bucket_sql[name], [self._bucket_row(*item) for item in chunk])
+            inserted.update(tuple(row) for row in result)
+        existing = {key: bucket for key, bucket in buckets.items() if key not in inserted}
+        if not existing:
+            return
+
+        for keys in _chunks(existing):
+            stored = await conn.execute(
+                select(table.c.website_id, table.c.bucket, table.c.response_time_sketch)
+                .where(tuple_(table.c.website_id, table.c.bucket).in_(keys))
+                .with_for_update()
+            )
+            for website_id, bucket, blob in stored:
+                if blob is not None:
+                    existing[(website_id, bucket)][5].merge(LatencySketch.from_bytes(blob))
+
+        await conn.execute(self._merge_bucket_sql[name], [self._bucket_row(*item) for item in existing.items()])
+
+    @staticmethod
+    def _bucket_row(key, bucket):
+        website_id, moment = key
+        total, up, response_time_sum, response_time_min, response_time_max, sketch = bucket
+        return {'website_id': website_id, 'bucket': moment, 'total_checks': total, 'up_checks': up,
+                'response_time_sum': response_time_sum, 'response_time_min': response_time_min,
+                'response_time_max': response_time_max,
+                'response_time_sketch': sketch.to_bytes() if sketch.count else None}
+
+    # Прореживание истории
+
+    async def compact_raw_results(self, cutoff, batch_size):
+        return await self._write(self._compact_raw_results, cutoff, batch_size)
+
+    async def _compact_raw_results(self, conn, cutoff, batch_size):
+        result = await conn.execute(
+            select(check_results.c.id, check_results.c.website_id, check_results.c.timestamp,
+                   check_results.c.status, check_results.c.response_time)
+            .where(check_results.c.timestamp < to_utc(cutoff))
+            .order_by(check_results.c.timestamp, check_results.c.id)
+            .limit(batch_size)
+            .with_for_update()
+        )
+        ids = []
+        minute = {}
+        for result_id, website_id, moment, status, response_time in result:
+            ids.append(result_id)
+            up = 1 if status == 'up' else 0
+            bucket = self._bucket(minute, (website_id, moment.replace(second=0)))
+            self._add_to_bucket(bucket, 1, up, response_time or 0, response_time, response_time)
+            if up:
+                bucket[5].add(response_time)
+        if not ids:
+            return 0
+
+        await self._merge_buckets(conn, 'check_results_minute', minute)
+        deleted = 0
+        for chunk in _chunks(ids):
+            deleted += (await conn.execute(delete(check_results).where(check_results.c.id.in_(chunk)))).rowcount
+        return deleted
+
+    async def compact_hourly_stats(self, cutoff, batch_size):
+        return await self._write(self._compact_hourly_stats, cutoff, batch_size)
+
+    async def _compact_hourly_stats(self, conn, cutoff, batch_size):
+        table = hourly_rollup
+        result = await conn.execute(
+            select(table)
+            .where(table.c.bucket < to_utc(cutoff))
+            .order_by(table.c.bucket, table.c.website_id)
+            .limit(batch_size)
+            .with_for_update()
+        )
+        keys = []
+        daily = {}
+        for row in result.mappings():
+            keys.append((row['website_id'], row['bucket']))
+            bucket = self._bucket(daily, (row['website_id'], row['bucket'].replace(hour=0, minute=0, second=0)))
+            self._add_to_bucket(bucket, row['total_checks'], row['up_checks'], row['response_time_sum'],
+                                row['response_time_min'], row['response_time_max'])
+            if row['response_time_sketch'] is not None:
+                bucket[5].merge(LatencySketch.from_bytes(row['response_time_sketch']))
+        if not keys:
+            return 0
+
+        await self._merge_buckets(conn, 'check_results_daily', daily)
+        return await self._delete_buckets(conn, table, keys)
+
+    async def prune_rollup(self, table, cutoff, batch_size):
+        if table not in ROLLUP_TABLES:
+            raise ValueError(f"Неизвестная таблица агрегатов: {table}")
+        return await self._write(self._prune_rollup, rollups[table], cutoff, batch_size)
+
+    async def _prune_rollup(self, conn, table, cutoff, batch_size):
+        result = await conn.execute(
+            select(table.c.website_id, table.c.bucket)
+            .where(table.c.bucket < to_utc(cutoff))
+            .order_by(table.c.bucket, table.c.website_id)
+            .limit(batch_size)
+        )
+        return await self._delete_buckets(conn, table, [tuple(row) for row in result])
+
+    @staticmethod
+    async def _delete_buckets(conn, table, keys):
+        deleted = 0
+        for chunk in _chunks(keys):
+            deleted += (await conn.execute(
+                delete(table).where(tuple_(table.c.website_id, table.c.bucket).in_(chunk))
+            )).rowcount
+        return deleted
+
+    async def close(self):
+        """Закрывает все соединения пула"""
+        await self.engine.dispose()
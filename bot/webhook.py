@@ -0,0 +1,101 @@
+import asyncio
+import hmac
+from aiohttp import web
+from aiogram.types import Update
+from pydantic import ValidationError
+from bot.metrics import WEBHOOK_UPDATES
+
+SECRET_HEADER = 'X-Telegram-Bot-Api-Secret-Token'
+
+
+class WebhookServer:
+    """Прием обновлений Telegram через webhook на встроенном aiohttp сервере.
+
+    Запрос с обновлением подтверждается сразу, а само обновление обрабатывается
+    в фоне. Одновременно обрабатывается не больше max_concurrent_updates
+    обновлений: когда все места заняты, ответ Telegram задерживается и новые
+    обновления не накапливаются в памяти.
+    """
+
+    def __init__(self, dispatcher, bot, url, host='0.0.0.0', port=8080, path='/webhook',
+                 secret_token='', max_concurrent_updates=100):
+        self.dispatcher = dispatcher
+        self.bot = bot
+        self.url = url
+        self.host = host
+        self.port = port
+        self.path = path
+        self.secret_token = secret_token
+        self.max_concurrent_updates = max_concurrent_updates
+        self._slots = asyncio.Semaphore(max_concurrent_updates)
+        self._tasks = set()
+        self._runner = None
+
+    @classmethod
+    def from_config(cls, dispatcher, bot, config):
+        """Создает сервер с настройками webhook из конфигурации"""
+        return cls(
+            dispatcher,
+            bot,
+            config.webhook_url,
+            host=config.webhook_host,
+            port=config.webhook_port,
+            path=config.webhook_path,
+            secret_token=config.webhook_secret,
+            max_concurrent_updates=config.webhook_max_updates
+        )
+
+    async def handle_update(self, request):
+        """Принимает обновление и ставит его в обработку"""
+        if self.secret_token and not hmac.compare_digest(
+                request.headers.get(SECRET_HEADER, ''), self.secret_token):
+            WEBHOOK_UPDATES.inc(result='unauthorized')
+            return web.Response(status=401)
+
+        try:
+            update = Update.model_validate(await request.json(), context={'bot': self.bot})
+        except (ValueError, ValidationError):
+            WEBHOOK_UPDATES.inc(result='invalid')
+            return web.Response(status=400)
+
+        await self._slots.acquire()
+        task = asyncio.create_task(self._process(update))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        WEBHOOK_UPDATES.inc(result='accepted')
+        return web.Response()
+
+    async def _process(self, update):
+        try:
+            await self.dispatcher.feed_update(self.bot, update)
+        except Exception as e:
+            print(f"Ошибка обработки обновления {update.update_id}: {e}")
+        finally:
+            self._slots.release()
+
+    async def start(self):
+        """Запускает сервер и регистрирует webhook в Telegram"""
+        app = web.Application()
+        app.router.add_post(self.path, self.handle_update)
+        self._runner = web.AppRunner(app)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, self.host, self.port).start()
+
+        await self.bot.set_webhook(
+            self.url,
+            secret_token=self.secret_token or None,
+            max_connections=min(self.max_concurrent_updates, 100),
+            allowed_updates=self.dispatcher.resolve_used_update_types()
+        )
+
+    async def stop(self):
+        """Перестает принимать обновления и дожидается уже принятых.
+
+        Webhook в Telegram не удаляется: пока бот выключен, обновления
+        копятся на стороне Telegram и придут после перезапуска.
+        """
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+        if self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
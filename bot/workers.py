@@ -0,0 +1,272 @@
+import asyncio
+import hmac
+import json
+import multiprocessing
+import secrets
+import zlib
+from dataclasses import asdict
+from datetime import datetime
+
+from bot.checker import WebsiteChecker
+from bot.metrics import REGISTRY, WORKER_METRICS, SCHEDULED_PROBES, OVERDUE_PROBES
+from bot.policy import ProbeDecision, ProbePolicy
+from bot.scheduler import MonitoringScheduler
+
+IPC_HOST = '127.0.0.1'
+
+
+def _json_default(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError(f"Не удается сериализовать {type(value).__name__}")
+
+
+def encode_message(message):
+    """Кодирует сообщение IPC в одну строку JSON"""
+    return (json.dumps(message, default=_json_default) + "\n").encode()
+
+
+def decode_result(result):
+    """Восстанавливает результат проверки, полученный от воркера"""
+    result = dict(result)
+    result['timestamp'] = datetime.fromisoformat(result['timestamp'])
+    return result
+
+
+class ShardWorkerScheduler(MonitoringScheduler):
+    """Планировщик внутри процесса-воркера.
+
+    Проверяет только сайты своего шарда, а результаты не пишет в базу,
+    а отправляет в основной процесс.
+    """
+
+    def __init__(self, checker, stream, concurrency=100, jitter=0.1, policy=None, warmup=0, warmup_concurrency=None):
+        super().__init__(
+            None, None, checker, None,
+            concurrency=concurrency,
+            jitter=jitter,
+            policy=policy,
+            warmup=warmup,
+            warmup_concurrency=warmup_concurrency
+        )
+        self.stream = stream
+
+    async def start(self):
+        """Запускает проверки; сайты присылает основной процесс"""
+        self.engine.start()
+
+    async def report_metrics(self, interval):
+        """Периодически отправляет метрики проверок основному процессу"""
+        SCHEDULED_PROBES.set_function(lambda: len(self.engine))
+        OVERDUE_PROBES.set_function(self.engine.overdue)
+        while True:
+            self.stream.write(encode_message({'op': 'metrics', 'metrics': REGISTRY.snapshot(WORKER_METRICS)}))
+            await asyncio.sleep(interval)
+
+    async def process_result(self, website, result, decision=None):
+        self.stream.write(encode_message({
+            'op': 'result',
+            'website_id': website['id'],
+            'result': result,
+            'decision': asdict(decision) if decision is not None else None
+        }))
+        await self.stream.drain()
+
+
+async def _worker_main(shard, port, secret, config):
+    checker = WebsiteChecker.from_config(config)
+    await checker.start()
+    reader, stream = await asyncio.open_connection(IPC_HOST, port)
+    scheduler = ShardWorkerScheduler(
+        checker, stream,
+        concurrency=config.probe_concurrency,
+        jitter=config.probe_jitter,
+        policy=ProbePolicy.from_config(config),
+        warmup=config.warmup_period,
+        warmup_concurrency=config.warmup_concurrency
+    )
+    await scheduler.start()
+
+    stream.write(encode_message({'op': 'hello', 'shard': shard, 'secret': secret}))
+    await stream.drain()
+    metrics_task = asyncio.create_task(scheduler.report_metrics(config.worker_metrics_interval))
+    try:
+        while True:
+            line = await reader.readline()
+            if not line:
+                break
+            message = json.loads(line)
+            if message['op'] == 'add':
+                scheduler.add_website_to_monitor(message['website'], message.get('delay'))
+            elif message['op'] == 'remove':
+                scheduler.remove_website_from_monitor(message['website_id'])
+            elif message['op'] == 'stop':
+                break
+    finally:
+        metrics_task.cancel()
+        await scheduler.stop()
+        await checker.close()
+        stream.close()
+
+
+def run_worker(shard, port, secret, config):
+    """Точка входа процесса-воркера"""
+    asyncio.run(_worker_main(shard, port, secret, config))
+
+
+class ShardedScheduler(MonitoringScheduler):
+    """Планировщик, раздающий проверки по процессам-воркерам.
+
+    Каждый воркер владеет своим хэш-разделом сайтов, сам проверяет их и
+    присылает результаты по локальному TCP-каналу (строки JSON). Основной
+    процесс, как и раньше, определяет смену статуса, пишет результаты через
+    буфер и ставит уведомления в очередь. Метрики проверок воркеры
+    периодически присылают по тому же каналу. Раздел выбирается по хэшу
+    канонического URL, чтобы подписчики одного адреса попадали в один
+    воркер и проверка по-прежнему выполнялась один раз.
+
+    Порт канала слушает любой локальный процесс, поэтому воркер
+    представляется секретом, который основной процесс генерирует при каждом
+    запуске и передает воркерам при создании. Подключения без верного
+    секрета или с чужим номером шарда закрываются сразу.
+    """
+
+    def __init__(self, notifier, registry, writer, config, processes):
+        super().__init__(notifier, registry, None, writer)
+        self.config = config
+        self.processes = processes
+        self._server = None
+        self._port = None
+        self._secret = secrets.token_hex(32)
+        self._streams = {}
+        self._workers = {}
+        self._stopping = False
+
+    def shard_for(self, website):
+        """Номер воркера, которому принадлежит сайт"""
+        url = self.probe_key(website)[0]
+        return zlib.crc32(url.encode()) % self.processes
+
+    async def start(self):
+        """Запускает воркеры и раздает им сайты"""
+        self._server = await asyncio.start_server(self._handle_worker, IPC_HOST, 0)
+        self._port = self._server.sockets[0].getsockname()[1]
+        for shard in range(self.processes):
+            self._spawn(shard)
+
+        for website in self.registry.websites():
+            try:
+                self.add_website_to_monitor(website)
+            except ValueError as e:
+                print(f"Сайт {website['id']} ({website['url']!r}) пропущен: {e}")
+
+    def _spawn(self, shard):
+        previous = self._workers.get(shard)
+        if previous is not None and previous.is_alive():
+            previous.terminate()
+
+        context = multiprocessing.get_context('spawn')
+        process = context.Process(
+            target=run_worker,
+            args=(shard, self._port, self._secret, self.config),
+            name=f"checker-shard-{shard}",
+            daemon=True
+        )
+        process.start()
+        self._workers[shard] = process
+
+    async def stop(self):
+        """Останавливает воркеры"""
+        self._stopping = True
+        for stream in list(self._streams.values()):
+            stream.write(encode_message({'op': 'stop'}))
+        loop = asyncio.get_running_loop()
+        for process in self._workers.values():
+            await loop.run_in_executor(None, process.join, 5)
+            if process.is_alive():
+                process.terminate()
+        self._workers.clear()
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+
+    def add_website_to_monitor(self, website, delay=None):
+        """Добавляет сайт в мониторинг воркера его шарда"""
+        shard = self.shard_for(website)
+        website = self.registry.put(website)
+        self.jobs[website['id']] = website
+        self._send(shard, {'op': 'add', 'website': website, 'delay': delay})
+
+    def remove_website_from_monitor(self, website_id):
+        """Убирает сайт из мониторинга воркера"""
+        website = self.jobs.pop(website_id, None)
+        self.registry.discard(website_id)
+        if website is not None:
+            self._send(self.shard_for(website), {'op': 'remove', 'website_id': website_id})
+
+    def _send(self, shard, message):
+        # Если воркер еще не подключился, сайты уйдут ему при подключении
+        stream = self._streams.get(shard)
+        if stream is not None:
+            stream.write(encode_message(message))
+
+    def _authenticate(self, line):
+        """Номер шарда из приветствия воркера или None, если приветствие чужое"""
+        try:
+            hello = json.loads(line)
+            shard, secret = hello['shard'], hello['secret']
+        except (ValueError, TypeError, KeyError):
+            return None
+        if hello.get('op') != 'hello' or not isinstance(secret, str) \
+                or not hmac.compare_digest(secret, self._secret):
+            return None
+        if not isinstance(shard, int) or not 0 <= shard < self.processes or shard in self._streams:
+            return None
+        return shard
+
+    async def _handle_worker(self, reader, stream):
+        try:
+            shard = self._authenticate(await reader.readline())
+        except (ConnectionError, ValueError):
+            shard = None
+        if shard is None:
+            # Не воркер этого запуска: ничего не отдаем и воркеры не перезапускаем
+            print("Отклонено подключение к каналу воркеров без верного приветствия")
+            stream.close()
+            return
+        self._streams[shard] = stream
+
+        # Отдаем подключившемуся воркеру все сайты его шарда
+        for website in self.jobs.values():
+            if self.shard_for(website) == shard:
+                stream.write(encode_message({'op': 'add', 'website': website}))
+        await stream.drain()
+
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                message = json.loads(line)
+                if message['op'] == 'result':
+                    website = self.jobs.get(message['website_id'])
+                    if website is not None:
+                        decision = message.get('decision')
+                        await self.process_result(
+                            website,
+                            decode_result(message['result']),
+                            ProbeDecision(**decision) if decision else None
+                        )
+                elif message['op'] == 'metrics':
+                    REGISTRY.set_remote(f"shard-{shard}", message['metrics'])
+        except Exception as e:
+            print(f"Ошибка в канале воркера {shard}: {e}")
+        finally:
+            self._streams.pop(shard, None)
+            # Счетчики перезапущенного воркера начнутся с нуля, а его очередь уже не актуальна
+            REGISTRY.drop_remote(f"shard-{shard}")
+            stream.close()
+            if not self._stopping:
+                print(f"Воркер {shard} отключился, перезапускаем")
+                self._spawn(shard)
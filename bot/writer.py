@@ -0,0 +1,80 @@
+import asyncio
+
+
+class ResultWriter:
+    """Буфер отложенной записи результатов проверок.
+
+    Результаты копятся в ограниченной очереди и записываются одной транзакцией,
+    когда набирается batch_size записей или проходит flush_interval секунд.
+    Если очередь заполнена, put() ждет - так проверки притормаживают,
+    а не раздувают память.
+    """
+
+    def __init__(self, db, batch_size=500, flush_interval=1.0, max_pending=10000):
+        self.db = db
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.queue = asyncio.Queue(maxsize=max_pending)
+        self._task = None
+
+    async def start(self):
+        """Запускает фоновую задачу записи"""
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def put(self, website_id, result):
+        """Ставит результат проверки в очередь на запись"""
+        await self.queue.put((website_id, result))
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        batch = []
+        try:
+            while True:
+                batch.append(await self.queue.get())
+                deadline = loop.time() + self.flush_interval
+
+                # Добираем пачку до batch_size или до истечения интервала
+                while len(batch) < self.batch_size:
+                    timeout = deadline - loop.time()
+                    if timeout <= 0:
+                        break
+                    try:
+                        batch.append(await asyncio.wait_for(self.queue.get(), timeout))
+                    except asyncio.TimeoutError:
+                        break
+
+                flushing, batch = batch, []
+                await asyncio.shield(self._flush(flushing))
+        except asyncio.CancelledError:
+            # При остановке дописываем уже набранную пачку
+            if batch:
+                await self._flush(batch)
+            raise
+
+    async def _flush(self, batch):
+        try:
+            await self.db.save_check_results(batch)
+        except Exception as e:
+            print(f"Ошибка при записи результатов проверок: {e}")
+        finally:
+            for _ in batch:
+                self.queue.task_done()
+
+    async def stop(self):
+        """Дописывает все накопленные результаты и останавливает запись"""
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+        # Остаток очереди записываем одной пачкой
+        batch = []
+        while not self.queue.empty():
+            batch.append(self.queue.get_nowait())
+        if batch:
+            await self._flush(batch)
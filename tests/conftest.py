@@ -0,0 +1,22 @@
+import pytest
+import pytest_asyncio
+from aiohttp import web
+
+
+@pytest_asyncio.fixture
+async def local_server():
+    """Запускает локальные aiohttp приложения и возвращает их базовый URL"""
+    runners = []
+
+    async def start(app):
+        runner = web.AppRunner(app)
+        await runner.setup()
+        site = web.TCPSite(runner, '127.0.0.1', 0)
+        await site.start()
+        runners.append(runner)
+        port = site._server.sockets[0].getsockname()[1]
+        return f"http://127.0.0.1:{port}"
+
+    yield start
+    for runner in runners:
+        await runner.cleanup()
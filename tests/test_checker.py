@@ -1,4 +1,5 @@
 import pytest
+from aiohttp import web
 from bot.checker import WebsiteChecker
 
 
@@ -7,6 +8,7 @@ async def test_check_website_success():
     """Тестирование успешной проверки сайта"""
     checker = WebsiteChecker()
     result = await checker.check_website("https://httpbin.org/status/200")
+    await checker.close()
 
     assert result['status'] == 'up'
     assert result['status_code'] == 200
@@ -18,6 +20,7 @@ async def test_check_website_failure():
     """Тестирование проверки недоступного сайта"""
     checker = WebsiteChecker()
     result = await checker.check_website("https://httpbin.org/status/404")
+    await checker.close()
 
     assert result['status'] == 'down'
     assert result['status_code'] == 404
@@ -29,5 +32,143 @@ async def test_check_website_timeout():
     checker = WebsiteChecker()
     # Сайт, который не ответит за 10 секунд
     result = await checker.check_website("https://httpstat.us/200?sleep=11000")
+    await checker.close()
 
-    assert result['status'] == 'down'
\ No newline at end of file
+    assert result['status'] == 'down'
+
+
+@pytest.mark.asyncio
+async def test_check_website_reuses_connections(local_server):
+    """Повторные проверки идут через одно соединение из пула"""
+    peers = set()
+
+    async def handler(request):
+        peers.add(request.transport.get_extra_info('peername'))
+        return web.Response(text="ok" * 1000)
+
+    app = web.Application()
+    app.router.add_get('/', handler)
+    base_url = await local_server(app)
+
+    checker = WebsiteChecker()
+    try:
+        for _ in range(5):
+            result = await checker.check_website(base_url + "/")
+            assert result['status'] == 'up'
+    finally:
+        await checker.close()
+
+    assert len(peers) == 1
+
+
+@pytest.mark.asyncio
+async def test_probe_modes_report_phase_timings(local_server):
+    """HEAD, GET и TCP проверки возвращают время по фазам"""
+    methods = []
+
+    async def handler(request):
+        methods.append(request.method)
+        return web.Response(text="ok")
+
+    app = web.Application()
+    app.router.add_route('*', '/', handler)
+    base_url = await local_server(app)
+
+    checker = WebsiteChecker()
+    try:
+        head = await checker.check_website(base_url + "/", 'head')
+        get = await checker.check_website(base_url + "/", 'get')
+        tcp = await checker.check_website(base_url + "/", 'tcp')
+    finally:
+        await checker.close()
+
+    assert methods == ['HEAD', 'GET']
+    assert head['status'] == get['status'] == tcp['status'] == 'up'
+    assert head['timings']['connect'] is not None
+    assert get['timings']['connect'] is None  # соединение взято из пула
+    assert get['timings']['ttfb'] > 0
+    assert tcp['timings']['connect'] > 0
+    assert tcp['status_code'] is None
+    # TLS-рукопожатие aiohttp входит в connect, отдельно его замеряет только tcp
+    assert head['timings']['tls'] is None
+
+
+@pytest.mark.asyncio
+async def test_tcp_probe_without_host_is_down():
+    """Адрес без хоста дает результат down с ошибкой, а не исключение"""
+    checker = WebsiteChecker()
+    try:
+        for url in ("https:///path", "http://example.com:99999/"):
+            result = await checker.check_website(url, 'tcp')
+            assert result['status'] == 'down'
+            assert "хост" in result['error']
+    finally:
+        await checker.close()
+
+
+@pytest.mark.asyncio
+async def test_content_probe_matches_keyword_across_chunks():
+    """Ключевое слово находится, даже если оно разрезано между частями тела"""
+
+    class FakeContent:
+        def __init__(self, chunks):
+            self.chunks = chunks
+
+        async def iter_chunked(self, size):
+            for chunk in self.chunks:
+                yield chunk
+
+    class FakeResponse:
+        def __init__(self, chunks):
+            self.content = FakeContent(chunks)
+            self.closed = False
+
+        def close(self):
+            self.closed = True
+
+    checker = WebsiteChecker(content_limit=100)
+    found, _, size, truncated = await checker._inspect_body(FakeResponse([b"abc sta", b"tus: o", b"k"]), "status: ok")
+    assert (found, size, truncated) == (True, 14, False)
+
+    response = FakeResponse([b"x" * 10, b"keyword", b"y" * 10])
+    found, _, size, truncated = await WebsiteChecker(content_limit=12)._inspect_body(response, "keyword")
+    assert (found, size, truncated, response.closed) == (False, 12, True, True)
+
+
+@pytest.mark.asyncio
+async def test_content_probe_uses_conditional_requests(local_server):
+    """Неизменное тело не скачивается повторно, изменение тела замечается"""
+    page = {'body': "<h1>Hello, status: ok</h1>", 'version': 1}
+    conditional = []
+
+    async def handler(request):
+        etag = f'"v{page["version"]}"'
+        conditional.append(request.headers.get('If-None-Match'))
+        if request.headers.get('If-None-Match') == etag:
+            return web.Response(status=304, headers={'ETag': etag})
+        return web.Response(text=page['body'], headers={'ETag': etag})
+
+    app = web.Application()
+    app.router.add_get('/', handler)
+    base_url = await local_server(app)
+
+    checker = WebsiteChecker()
+    slow_key = (base_url + "/", 300, 'content', "status: ok")
+    try:
+        first = await checker.check_website(base_url + "/", 'content', "status: ok")
+        await checker.check_website(base_url + "/", 'content', "status: ok", cache_key=slow_key)
+        second = await checker.check_website(base_url + "/", 'content', "status: ok")
+        page.update(body="<h1>Maintenance</h1>", version=2)
+        third = await checker.check_website(base_url + "/", 'content', "status: ok")
+        # Проверка с другим ключом (другим интервалом) видит изменение сама, а не теряет его
+        slow = await checker.check_website(base_url + "/", 'content', "status: ok", cache_key=slow_key)
+    finally:
+        await checker.close()
+
+    assert conditional == [None, None, '"v1"', '"v1"', '"v1"']
+    assert slow['content']['changed']
+    assert first['status'] == 'up' and not first['content']['changed']
+    assert second['status'] == 'up' and second['content']['not_modified']
+    assert second['content']['digest'] == first['content']['digest']
+    assert third['status'] == 'down' and third['content']['changed']
+    assert "status: ok" in third['error']
@@ -0,0 +1,284 @@
+import pytest
+from datetime import datetime, timedelta
+from bot.database import Database, AsyncDatabase
+from bot.writer import ResultWriter
+from bot.retention import RetentionCompactor
+from bot.sketch import LatencySketch
+
+
+@pytest.fixture
+def db(tmp_path):
+    database = Database(f"sqlite:///{tmp_path / 'monitor.db'}")
+    yield database
+    database.close()
+
+
+def make_result(status='up', response_time=120.0):
+    return {
+        'status': status,
+        'status_code': 200 if status == 'up' else 0,
+        'response_time': response_time,
+        'timestamp': datetime.now()
+    }
+
+
+def test_wal_mode_enabled(db):
+    """База работает в режиме WAL"""
+    with db.get_connection() as conn:
+        mode = conn.execute("PRAGMA journal_mode").fetchone()[0]
+    assert mode == 'wal'
+
+
+def test_bulk_add_websites(db):
+    """Пачка сайтов добавляется одной транзакцией и возвращается с id"""
+    db.add_website(2, "https://other.example.com", 60)
+    websites = db.add_websites(1, [
+        ("https://a.example.com/", 60, 'get'),
+        ("https://b.example.com/", 300, 'head')
+    ])
+
+    assert [site['url'] for site in websites] == ["https://a.example.com/", "https://b.example.com/"]
+    assert websites[1]['probe_mode'] == 'head'
+    assert all(site['user_id'] == 1 and site['last_status'] == 'unknown' for site in websites)
+    assert {site['id'] for site in db.get_user_websites(1)} == {site['id'] for site in websites}
+    with db.get_connection() as conn:
+        stored = conn.execute(
+            "SELECT id, url, user_id, check_interval, last_status, probe_mode, content_keyword "
+            "FROM websites WHERE user_id = 1 ORDER BY id"
+        ).fetchall()
+    assert websites == [dict(row) for row in stored]
+
+
+@pytest.mark.asyncio
+async def test_async_database_roundtrip(db):
+    """Асинхронный фасад выполняет те же операции, что и Database"""
+    adb = AsyncDatabase(db)
+    try:
+        assert await adb.add_user(1, 1)
+        website_id = await adb.add_website(1, "https://example.com", 60)
+        assert website_id
+
+        await adb.save_check_results([
+            (website_id, make_result('down')),
+            (website_id, make_result('up'))
+        ])
+
+        websites = await adb.get_user_websites(1)
+        assert [w['id'] for w in websites] == [website_id]
+        assert websites[0]['last_status'] == 'up'
+
+        stats = await adb.get_website_stats(website_id)
+        assert stats['total_checks'] == 2
+        assert stats['up_checks'] == 1
+
+        assert await adb.delete_website(1, website_id)
+        assert await adb.get_active_websites() == []
+    finally:
+        await adb.close()
+
+
+@pytest.mark.asyncio
+async def test_result_writer_flushes_on_stop(db):
+    """Буфер записывает все накопленные результаты при остановке"""
+    adb = AsyncDatabase(db)
+    writer = ResultWriter(adb, batch_size=3, flush_interval=60)
+    try:
+        db.add_user(1, 1)
+        website_id = db.add_website(1, "https://example.com", 60)
+        await writer.start()
+        for _ in range(7):
+            await writer.put(website_id, make_result())
+        await writer.stop()
+
+        stats = await adb.get_website_stats(website_id)
+        assert stats['total_checks'] == 7
+    finally:
+        await adb.close()
+
+
+def test_rollups_follow_writes(db):
+    """Счетчики и часовые агрегаты обновляются вместе с записью результатов"""
+    db.add_user(1, 1)
+    website_id = db.add_website(1, "https://example.com", 60)
+    db.save_check_results([
+        (website_id, make_result('up', 100.0)),
+        (website_id, make_result('up', 300.0)),
+        (website_id, make_result('down', 0))
+    ])
+
+    stats = db.get_website_stats(website_id)
+    assert stats['total_checks'] == 3
+    assert stats['up_checks'] == 2
+    assert stats['avg_response_time'] == pytest.approx(400.0 / 3)
+
+    hourly = db.get_hourly_stats(website_id, datetime.now() - timedelta(hours=1))
+    assert sum(row['total_checks'] for row in hourly) == 3
+    assert min(row['response_time_min'] for row in hourly) == 0
+    assert max(row['response_time_max'] for row in hourly) == 300.0
+
+
+def test_rollup_migration_backfills_history(db):
+    """Миграция заполняет агрегаты по уже накопленным результатам"""
+    db.add_user(1, 1)
+    website_id = db.add_website(1, "https://example.com", 60)
+    with db.get_connection() as conn:
+        conn.execute("DROP TABLE website_stats")
+        conn.execute("DROP TABLE check_results_hourly")
+        conn.executemany(
+            "INSERT INTO check_results (website_id, status, status_code, response_time) VALUES (?, ?, ?, ?)",
+            [(website_id, 'up', 200, 50.0), (website_id, 'down', 500, 150.0)]
+        )
+        conn.execute("PRAGMA user_version = 0")
+        db.migrate(conn)
+        conn.commit()
+
+    stats = db.get_website_stats(website_id)
+    assert stats['total_checks'] == 2
+    assert stats['up_checks'] == 1
+    assert stats['avg_response_time'] == pytest.approx(100.0)
+
+
+@pytest.mark.asyncio
+async def test_active_websites_streamed_in_pages(db):
+    """Активные сайты читаются страницами по ключу, удаленные пропускаются"""
+    db.add_user(1, 1)
+    ids = [db.add_website(1, f"https://site{number}.example.com", 60) for number in range(7)]
+    db.delete_website(1, ids[3])
+
+    adb = AsyncDatabase(db)
+    try:
+        websites = [website async for website in adb.iter_active_websites(page_size=2)]
+    finally:
+        await adb.close()
+
+    assert [website['id'] for website in websites] == ids[:3] + ids[4:]
+
+
+def test_user_websites_keyset_pages(db):
+    """Страницы сайтов пользователя идут по ключу id в обе стороны и читаются по индексу"""
+    ids = [db.add_website(1, f"https://site{number}.example.com", 60) for number in range(5)]
+    db.add_website(2, "https://other.example.com", 60)
+    db.delete_website(1, ids[1])
+
+    assert [site['id'] for site in db.get_user_websites_page(1, limit=2)] == [ids[0], ids[2]]
+    assert [site['id'] for site in db.get_user_websites_page(1, after_id=ids[2], limit=2)] == ids[3:]
+    assert [site['id'] for site in db.get_user_websites_page(1, before_id=ids[4], limit=2)] == [ids[2], ids[3]]
+    assert db.get_user_websites_page(1, after_id=ids[4]) == []
+
+    with db.get_connection() as conn:
+        plan = " ".join(row['detail'] for row in conn.execute(
+            "EXPLAIN QUERY PLAN SELECT * FROM websites WHERE user_id = ? AND is_active = TRUE AND id > ? "
+            "ORDER BY id LIMIT ?", (1, 0, 20)
+        ))
+    assert "idx_websites_user_active" in plan
+    assert "TEMP B-TREE" not in plan
+
+
+def test_latency_percentiles_merge_hourly_sketches(db):
+    """Квантили за окно считаются слиянием часовых скетчей, упавшие проверки не учитываются"""
+    db.add_user(1, 1)
+    website_id = db.add_website(1, "https://example.com", 60)
+    now = datetime.now()
+    db.save_check_results(
+        [(website_id, {**make_result('up', float(ms)), 'timestamp': now - timedelta(hours=3)}) for ms in range(1, 51)]
+        + [(website_id, make_result('up', float(ms))) for ms in range(51, 101)]
+        + [(website_id, make_result('down', 0))]
+    )
+
+    day = db.get_user_latency_percentiles(1, now - timedelta(days=1))[website_id]
+    assert day['p50'] == pytest.approx(50, rel=0.03)
+    assert day['p99'] == pytest.approx(99, rel=0.02)
+
+    hour = db.get_user_latency_percentiles(1, now - timedelta(hours=1))[website_id]
+    assert hour['p50'] == pytest.approx(75, rel=0.03)
+    assert db.get_user_latency_percentiles(2, now - timedelta(days=1)) == {}
+
+
+def test_latency_window_starts_exactly_at_since(db):
+    """Неполный первый час окна берется из сырых результатов, а не из всего часового бакета"""
+    db.add_user(1, 1)
+    website_id = db.add_website(1, "https://example.com", 60)
+    now = datetime.now()
+    db.save_check_results(
+        [(website_id, {**make_result('up', 1000.0), 'timestamp': now - timedelta(minutes=61)})] * 3
+        + [(website_id, {**make_result('up', 100.0), 'timestamp': now - timedelta(minutes=59)})]
+    )
+
+    hour = db.get_user_latency_percentiles(1, now - timedelta(hours=1))[website_id]
+    assert hour['p99'] == pytest.approx(100, rel=0.02)
+    two_hours = db.get_user_latency_percentiles(1, now - timedelta(hours=2))[website_id]
+    assert two_hours['p50'] == pytest.approx(1000, rel=0.02)
+
+
+@pytest.mark.asyncio
+async def test_user_stats_cache_invalidated_by_new_results(db):
+    """Кэш статистики пользователя сбрасывается новыми результатами"""
+    adb = AsyncDatabase(db, stats_cache_ttl=3600)
+    try:
+        db.add_user(1, 1)
+        first = db.add_website(1, "https://example.com", 60)
+        second = db.add_website(1, "https://example.org", 60)
+
+        rows = await adb.get_user_websites_stats(1)
+        assert [(row['id'], row['total_checks']) for row in rows] == [(first, 0), (second, 0)]
+
+        await adb.save_check_results([(second, make_result('up'))])
+        rows = await adb.get_user_websites_stats(1)
+        assert [(row['id'], row['total_checks']) for row in rows] == [(first, 0), (second, 1)]
+    finally:
+        await adb.close()
+
+
+@pytest.mark.asyncio
+async def test_retention_downsamples_old_results(db):
+    """Старые результаты сворачиваются в агрегаты и удаляются пачками"""
+    db.add_user(1, 1)
+    website_id = db.add_website(1, "https://example.com", 60)
+    old = datetime.now() - timedelta(days=10)
+    db.save_check_results(
+        [(website_id, {**make_result('up', 100.0 + i), 'timestamp': old}) for i in range(5)]
+        + [(website_id, make_result('down', 0))]
+    )
+
+    adb = AsyncDatabase(db)
+    compactor = RetentionCompactor(adb, raw_days=7, minute_days=30, hourly_days=5, batch_size=2, pause=0)
+    try:
+        processed = await compactor.run_once()
+    finally:
+        await adb.close()
+
+    assert processed['raw'] == 5
+    assert processed['hourly'] == 1
+    with db.get_connection() as conn:
+        assert conn.execute("SELECT COUNT(*) FROM check_results").fetchone()[0] == 1
+        minute = conn.execute(
+            "SELECT SUM(total_checks), MIN(response_time_min), MAX(response_time_max) FROM check_results_minute"
+        ).fetchone()
+        daily = conn.execute(
+            "SELECT total_checks, up_checks, response_time_sketch FROM check_results_daily"
+        ).fetchone()
+        minute_sketch = conn.execute("SELECT sketch_union(response_time_sketch) FROM check_results_minute").fetchone()[0]
+    assert tuple(minute) == (5, 100.0, 104.0)
+    assert tuple(daily)[:2] == (5, 5)
+    # Скетчи квантилей переживают прореживание вместе со счетчиками
+    assert LatencySketch.from_bytes(daily['response_time_sketch']).count == 5
+    assert LatencySketch.from_bytes(minute_sketch).quantile(1.0) == pytest.approx(104.0, rel=0.01)
+    # Общие счетчики сайта не зависят от прореживания
+    assert db.get_website_stats(website_id)['total_checks'] == 6
+
+
+def test_compaction_batches_with_equal_timestamps(db):
+    """Свертка и удаление пачки берут одни и те же строки, даже если у всех одно время"""
+    db.add_user(1, 1)
+    website_id = db.add_website(1, "https://example.com", 60)
+    old = datetime.now() - timedelta(days=10)
+    db.save_check_results([(website_id, {**make_result('up'), 'timestamp': old}) for _ in range(10)])
+
+    cutoff = datetime.now() - timedelta(days=7)
+    deleted = [db.compact_raw_results(cutoff, 3) for _ in range(5)]
+
+    assert deleted == [3, 3, 3, 1, 0]
+    with db.get_connection() as conn:
+        assert conn.execute("SELECT SUM(total_checks) FROM check_results_minute").fetchone()[0] == 10
+    assert db.compact_hourly_stats(cutoff, 1) == 1
+    assert db.compact_hourly_stats(cutoff, 1) == 0
@@ -0,0 +1,97 @@
+import asyncio
+import pytest
+from bot.engine import ProbeEngine
+
+
+@pytest.mark.asyncio
+async def test_engine_respects_concurrency_limit():
+    """Одновременно выполняется не больше concurrency проверок"""
+    running = 0
+    peak = 0
+    calls = []
+
+    async def probe(key):
+        nonlocal running, peak
+        running += 1
+        peak = max(peak, running)
+        calls.append(key)
+        await asyncio.sleep(0.02)
+        running -= 1
+
+    engine = ProbeEngine(probe, concurrency=3, jitter=0)
+    engine.start()
+    for key in range(10):
+        engine.schedule(key, 0.05, delay=0)
+    await asyncio.sleep(0.15)
+    await engine.stop()
+
+    assert peak == 3
+    assert set(calls) == set(range(10))
+
+
+@pytest.mark.asyncio
+async def test_engine_cancel_stops_probes():
+    """Снятая с расписания задача больше не запускается"""
+    calls = []
+
+    async def probe(key):
+        calls.append(key)
+
+    engine = ProbeEngine(probe, concurrency=2, jitter=0)
+    engine.start()
+    engine.schedule('a', 0.02, delay=0)
+    engine.schedule('b', 0.02, delay=0)
+    await asyncio.sleep(0.01)
+    engine.cancel('b')
+    calls.clear()
+    await asyncio.sleep(0.1)
+    await engine.stop()
+
+    assert 'a' in calls
+    assert 'b' not in calls
+    assert len(engine) == 1
+
+
+@pytest.mark.asyncio
+async def test_engine_warmup_ramps_concurrency():
+    """Во время прогрева одновременных проверок меньше, чем concurrency"""
+    running = 0
+    peak = 0
+
+    async def probe(key):
+        nonlocal running, peak
+        running += 1
+        peak = max(peak, running)
+        await asyncio.sleep(0.02)
+        running -= 1
+
+    engine = ProbeEngine(probe, concurrency=10, jitter=0, warmup=60, warmup_concurrency=2)
+    engine.start()
+    for key in range(20):
+        engine.schedule(key, 1, delay=0)
+    await asyncio.sleep(0.1)
+    loop = asyncio.get_running_loop()
+    assert engine.current_limit(loop.time()) == 2
+    assert engine.current_limit(loop.time() + 30) == 6
+    assert engine.current_limit(loop.time() + 60) == 10
+    await engine.stop()
+
+    assert peak == 2
+
+
+@pytest.mark.asyncio
+async def test_engine_overdue_counts_only_due_current_entries():
+    """Просроченными считаются только наступившие и не отмененные проверки"""
+    engine = ProbeEngine(lambda key: None, concurrency=1, jitter=0)
+    for key in range(50):
+        engine.schedule(key, 60, delay=-1 if key % 2 else 100)
+    engine.cancel(1)
+    engine.schedule(3, 60, delay=100)
+
+    assert engine.overdue() == 23
+
+    # Интервал не положителен: такая задача делила бы на ноль или перепланировалась бы без пауз
+    for interval in (0, -5):
+        with pytest.raises(ValueError):
+            engine.schedule('bad', interval)
+    assert 'bad' not in engine
@@ -0,0 +1,107 @@
+import pytest
+from bot.database import Database, AsyncDatabase
+from bot.registry import WebsiteRegistry
+from bot.handlers import (
+    load_sites_page, render_sites_page, sites_page_keyboard, parse_page_callback,
+    SITES_PAGE_SIZE, LIST_PAGE_PREFIX, DELETE_PAGE_PREFIX, PAGE_FORWARD, PAGE_BACK
+)
+
+
+@pytest.mark.asyncio
+async def test_sites_pages_follow_cursor_from_callbacks(tmp_path):
+    """Курсор из кнопок перехода ведет на соседние страницы без пропусков и повторов"""
+    db = AsyncDatabase(Database(f"sqlite:///{tmp_path / 'monitor.db'}"))
+    try:
+        await db.add_user(1, 1)
+        websites = await db.add_websites(1, [
+            (f"https://site{number}.example.com/", 60, 'get') for number in range(SITES_PAGE_SIZE * 2 + 5)
+        ])
+        ids = [site['id'] for site in websites]
+
+        page, has_prev, has_next = await load_sites_page(db, 1, PAGE_FORWARD, 0)
+        assert [site['id'] for site in page] == ids[:SITES_PAGE_SIZE]
+        assert (has_prev, has_next) == (False, True)
+
+        keyboard = sites_page_keyboard(LIST_PAGE_PREFIX, page, has_prev, has_next)
+        forward = keyboard.inline_keyboard[-1][-1].callback_data
+        assert forward.startswith(LIST_PAGE_PREFIX)
+        page, has_prev, has_next = await load_sites_page(db, 1, *parse_page_callback(forward))
+        assert [site['id'] for site in page] == ids[SITES_PAGE_SIZE:SITES_PAGE_SIZE * 2]
+        assert (has_prev, has_next) == (True, True)
+
+        keyboard = sites_page_keyboard(LIST_PAGE_PREFIX, page, has_prev, has_next)
+        back = keyboard.inline_keyboard[-1][0].callback_data
+        assert parse_page_callback(back) == (PAGE_BACK, ids[SITES_PAGE_SIZE])
+        page, has_prev, has_next = await load_sites_page(db, 1, *parse_page_callback(back))
+        assert [site['id'] for site in page] == ids[:SITES_PAGE_SIZE]
+        assert (has_prev, has_next) == (False, True)
+
+        page, has_prev, has_next = await load_sites_page(db, 1, PAGE_FORWARD, ids[SITES_PAGE_SIZE * 2 - 1])
+        assert [site['id'] for site in page] == ids[SITES_PAGE_SIZE * 2:]
+        assert (has_prev, has_next) == (True, False)
+
+        # Если страницу после курсора удалили целиком, показывается первая
+        page, has_prev, _ = await load_sites_page(db, 1, PAGE_FORWARD, ids[-1])
+        assert page[0]['id'] == ids[0]
+        assert not has_prev
+    finally:
+        await db.close()
+
+
+@pytest.mark.asyncio
+async def test_delete_keyboard_carries_page_cursor(tmp_path):
+    """Кнопки удаления помнят страницу, а список показывает статусы из реестра"""
+    db = AsyncDatabase(Database(f"sqlite:///{tmp_path / 'monitor.db'}"))
+    try:
+        await db.add_user(1, 1)
+        registry = WebsiteRegistry(db)
+        websites = await registry.add_websites(1, [
+            (f"https://site{number}.example.com/", 60, 'get') for number in range(SITES_PAGE_SIZE + 3)
+        ])
+        registry.update_status(websites[-1]['id'], 'up', 100.0)
+
+        page, has_prev, has_next = await load_sites_page(db, 1, PAGE_FORWARD, websites[SITES_PAGE_SIZE - 1]['id'])
+        keyboard = sites_page_keyboard(DELETE_PAGE_PREFIX, page, has_prev, has_next, delete=True)
+        cursor = websites[SITES_PAGE_SIZE]['id'] - 1
+        assert keyboard.inline_keyboard[0][0].callback_data == f"delete_{websites[SITES_PAGE_SIZE]['id']}_{cursor}"
+        assert keyboard.inline_keyboard[-1][0].callback_data.startswith(DELETE_PAGE_PREFIX + PAGE_BACK)
+        assert all(len(button.callback_data) <= 64 for row in keyboard.inline_keyboard for button in row)
+
+        text = render_sites_page(page, registry)
+        assert text.count("🟢") == 1
+    finally:
+        await db.close()
+
+
+class CountingDatabase:
+    """Обертка над базой, считающая запросы страниц"""
+
+    def __init__(self, db):
+        self.db = db
+        self.queries = 0
+
+    async def get_user_websites_page(self, *args, **kwargs):
+        self.queries += 1
+        return await self.db.get_user_websites_page(*args, **kwargs)
+
+
+@pytest.mark.asyncio
+async def test_sites_page_costs_at_most_two_queries(tmp_path):
+    """Первая страница - один запрос, остальные - не больше двух"""
+    db = AsyncDatabase(Database(f"sqlite:///{tmp_path / 'monitor.db'}"))
+    try:
+        await db.add_user(1, 1)
+        websites = await db.add_websites(1, [
+            (f"https://site{number}.example.com/", 60, 'get') for number in range(SITES_PAGE_SIZE * 2)
+        ])
+        counting = CountingDatabase(db)
+
+        assert (await load_sites_page(counting, 1, PAGE_FORWARD, 0))[1:] == (False, True)
+        assert counting.queries == 1
+
+        counting.queries = 0
+        cursor = websites[SITES_PAGE_SIZE]['id']
+        assert (await load_sites_page(counting, 1, PAGE_BACK, cursor))[1:] == (False, True)
+        assert counting.queries == 2
+    finally:
+        await db.close()
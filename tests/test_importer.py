@@ -0,0 +1,45 @@
+import io
+import pytest
+from bot.importer import SiteImport, normalize_site_url
+
+
+def test_import_parses_normalizes_and_dedupes():
+    """Строки разбираются по одной, URL нормализуются, повторы и ошибки считаются"""
+    document = io.StringIO(
+        "url,interval,mode\n"
+        "example.com, 60, head\n"
+        "HTTPS://Example.com/\n"
+        "# комментарий\n"
+        "\n"
+        "known.example.com\n"
+        "ftp://example.org\n"
+        "example.net;0\n"
+        "example.org\t120\n"
+        "example.info,,tcp\n"
+    )
+    site_import = SiteImport(known_urls=["https://known.example.com"])
+
+    rows = list(site_import.parse(document))
+
+    assert rows == [
+        ("https://example.com/", 60, 'head'),
+        ("https://example.org/", 120, 'get'),
+        ("https://example.info/", 300, 'tcp')
+    ]
+    assert site_import.duplicates == 2
+    assert site_import.invalid == 2
+    assert site_import.errors[0].startswith("строка 7")
+    assert "Добавлено: 3" in site_import.summary(3)
+
+
+def test_normalize_site_url_rejects_unparsable_addresses():
+    """Адрес без хоста, с портом вне диапазона или битым IPv6 отклоняется ValueError"""
+    assert normalize_site_url(" Example.com:8080/a ") == "https://example.com:8080/a"
+    for text in ("example.com:99999", "https://[::1", "ftp://example.com", "https://", ""):
+        with pytest.raises(ValueError):
+            normalize_site_url(text)
+
+    # Некорректный адрес, уже сохраненный у пользователя, не ломает импорт
+    site_import = SiteImport(known_urls=["example.com:99999", "https://example.com"])
+    assert list(site_import.parse(["example.com", "example.org:99999"])) == []
+    assert (site_import.duplicates, site_import.invalid) == (1, 1)
@@ -0,0 +1,72 @@
+import pytest
+import aiohttp
+from bot.metrics import Counter, Histogram, Gauge, MetricsRegistry, MetricsServer
+
+
+def test_registry_renders_prometheus_text():
+    """Метрики выводятся в текстовом формате Prometheus"""
+    registry = MetricsRegistry()
+    probes = Counter('probes_total', "Проверки", ('status',), registry=registry)
+    duration = Histogram('probe_seconds', "Длительность", buckets=(0.1, 1.0), registry=registry)
+    backlog = Gauge('backlog', "Очередь", registry=registry)
+
+    probes.inc(status='up')
+    probes.inc(2, status='down')
+    duration.observe(0.05)
+    duration.observe(0.5)
+    backlog.set_function(lambda: 7)
+
+    text = registry.render()
+    assert '# TYPE probes_total counter' in text
+    assert 'probes_total{status="down"} 2' in text
+    assert 'probe_seconds_bucket{le="0.1"} 1' in text
+    assert 'probe_seconds_bucket{le="1.0"} 2' in text
+    assert 'probe_seconds_bucket{le="+Inf"} 2' in text
+    assert 'probe_seconds_count 2' in text
+    assert 'backlog 7' in text
+
+
+@pytest.mark.asyncio
+async def test_metrics_server_exposes_registry():
+    """Сервер метрик отдает содержимое реестра по /metrics"""
+    registry = MetricsRegistry()
+    Counter('requests_total', "Запросы", registry=registry).inc()
+    server = MetricsServer('127.0.0.1', 0, registry)
+    await server.start()
+    try:
+        port = server._runner.addresses[0][1]
+        async with aiohttp.ClientSession() as session:
+            async with session.get(f"http://127.0.0.1:{port}/metrics") as response:
+                text = await response.text()
+    finally:
+        await server.stop()
+
+    assert 'requests_total 1' in text
+
+
+def test_registry_sums_worker_snapshots():
+    """Значения, присланные воркерами, складываются с локальными и забываются при отключении"""
+    worker = MetricsRegistry()
+    worker_probes = Counter('probes_total', "Проверки", ('status',), registry=worker)
+    worker_duration = Histogram('probe_seconds', "Длительность", buckets=(0.1, 1.0), registry=worker)
+    worker_backlog = Gauge('backlog', "Очередь", registry=worker)
+    worker_probes.inc(3, status='up')
+    worker_duration.observe(0.5)
+    worker_backlog.set_function(lambda: 4)
+    snapshot = worker.snapshot(('probes_total', 'probe_seconds', 'backlog'))
+
+    main = MetricsRegistry()
+    probes = Counter('probes_total', "Проверки", ('status',), registry=main)
+    Histogram('probe_seconds', "Длительность", buckets=(0.1, 1.0), registry=main)
+    Gauge('backlog', "Очередь", registry=main)
+    probes.inc(status='up')
+    main.set_remote('shard-0', snapshot)
+    main.set_remote('shard-1', snapshot)
+
+    text = main.render()
+    assert 'probes_total{status="up"} 7' in text
+    assert 'probe_seconds_bucket{le="1.0"} 2' in text
+    assert 'backlog 8' in text
+
+    main.drop_remote('shard-1')
+    assert 'backlog 4' in main.render()
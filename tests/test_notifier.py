@@ -0,0 +1,76 @@
+import asyncio
+import pytest
+from aiogram.exceptions import TelegramRetryAfter
+from aiogram.methods import SendMessage
+from bot.notifier import NotificationDispatcher
+
+
+class FakeBot:
+    def __init__(self, flood_waits=0):
+        self.sent = []
+        self.flood_waits = flood_waits
+
+    async def send_message(self, chat_id, text):
+        if self.flood_waits:
+            self.flood_waits -= 1
+            raise TelegramRetryAfter(
+                method=SendMessage(chat_id=chat_id, text=text),
+                message="Flood control exceeded",
+                retry_after=0
+            )
+        self.sent.append((chat_id, text))
+
+
+@pytest.mark.asyncio
+async def test_notifications_coalesced_per_chat():
+    """Уведомления, накопившиеся за интервал чата, уходят одним сообщением"""
+    bot = FakeBot()
+    notifier = NotificationDispatcher(bot, chat_interval=0.1)
+    await notifier.start()
+    notifier.notify(1, "первое")
+    await asyncio.sleep(0.02)
+    notifier.notify(1, "второе")
+    notifier.notify(1, "третье")
+    notifier.notify(2, "другой чат")
+    await asyncio.sleep(0.2)
+    await notifier.stop()
+
+    assert [text for chat_id, text in bot.sent if chat_id == 1][0] == "первое"
+    digest = [text for chat_id, text in bot.sent if chat_id == 1][1]
+    assert "(2)" in digest and "второе" in digest and "третье" in digest
+    assert (2, "другой чат") in bot.sent
+
+
+@pytest.mark.asyncio
+async def test_notification_retried_after_flood_wait():
+    """После flood-wait сообщение отправляется повторно"""
+    bot = FakeBot(flood_waits=1)
+    notifier = NotificationDispatcher(bot, chat_interval=0)
+    await notifier.start()
+    notifier.notify(1, "сайт упал")
+    await asyncio.sleep(0.05)
+    await notifier.stop()
+
+    assert bot.sent == [(1, "сайт упал")]
+
+
+@pytest.mark.asyncio
+async def test_chat_scheduled_earlier_while_waiting_for_token():
+    """Чат, вставший в очередь раньше ожидающего токен, не теряется и не шлет пустых сводок"""
+    bot = FakeBot()
+    notifier = NotificationDispatcher(bot, rate=1, chat_interval=0)
+    await notifier.start()
+    notifier.notify(1, "A упал")
+    await asyncio.sleep(0.02)
+    # Токен израсходован: B ждет его, а A снова встает в очередь раньше B
+    notifier.notify(2, "B упал")
+    await asyncio.sleep(0.02)
+    notifier.notify(1, "A поднялся")
+    await asyncio.sleep(2.2)
+    notifier.notify(1, "A снова упал")
+    await asyncio.sleep(1.1)
+    await notifier.stop()
+
+    assert sorted(bot.sent) == sorted([
+        (1, "A упал"), (1, "A поднялся"), (2, "B упал"), (1, "A снова упал")
+    ])
@@ -0,0 +1,49 @@
+from bot.policy import ProbePolicy
+
+
+def up():
+    return {'status': 'up'}
+
+
+def down():
+    return {'status': 'down'}
+
+
+def test_status_change_needs_confirmation():
+    """Одиночный сбой не меняет статус, подтвержденный - меняет"""
+    policy = ProbePolicy(confirm_probes=2, confirm_delay=5)
+    assert policy.observe('k', 60, up(), 0).status == 'up'
+
+    decision = policy.observe('k', 60, down(), 60)
+    assert decision.status == 'up'
+    assert decision.next_delay == 5
+
+    # Сбой не подтвердился
+    assert policy.observe('k', 60, up(), 65).status == 'up'
+
+    policy.observe('k', 60, down(), 120)
+    policy.observe('k', 60, down(), 125)
+    assert policy.observe('k', 60, down(), 130).status == 'down'
+
+
+def test_down_site_backs_off():
+    """Недоступный сайт проверяется все реже, но не реже backoff_max"""
+    policy = ProbePolicy(confirm_probes=0, backoff_factor=2, backoff_max=300)
+    delays = [policy.observe('k', 60, down(), t).next_delay for t in range(5)]
+    assert delays == [None, 120, 240, 300, 300]
+    assert policy.observe('k', 60, up(), 10).next_delay is None
+
+
+def test_flapping_suppresses_notifications_with_hysteresis():
+    """Частые смены статуса приостанавливают уведомления до стабилизации"""
+    policy = ProbePolicy(confirm_probes=0, backoff_factor=1, flap_window=100, flap_threshold=4, flap_reset=1)
+    policy.observe('k', 10, up(), 0)
+    decisions = [policy.observe('k', 10, down() if i % 2 == 0 else up(), i + 1) for i in range(4)]
+    assert decisions[-1].event == 'flapping_started'
+    assert decisions[-1].notify is False
+
+    # Пока в окне много смен, сайт остается "мигающим"
+    assert policy.observe('k', 10, up(), 50).notify is False
+    decision = policy.observe('k', 10, up(), 104)
+    assert decision.event == 'flapping_stopped'
+    assert decision.notify is True
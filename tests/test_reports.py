@@ -0,0 +1,87 @@
+import numpy as np
+import pytest
+from datetime import datetime, timedelta
+from bot.database import Database, AsyncDatabase, SERIES_DTYPE, to_hour_bucket
+from bot.reports import SlaReportEngine, compute_sla, format_duration
+
+
+def make_series(points):
+    return np.array(points, dtype=SERIES_DTYPE)
+
+
+def test_compute_sla_finds_incidents_per_site():
+    """Инциденты считаются по каждому сайту отдельно и не переходят между сайтами"""
+    series = make_series([
+        # сайт 1: сбой 120-240 (две упавшие точки), затем сбой с 360 до конца окна
+        (1, 0, 1, 1), (1, 120, 1, 0), (1, 180, 1, 0), (1, 240, 1, 1), (1, 300, 1, 1), (1, 360, 1, 0),
+        # сайт 2: минутный агрегат с большинством успешных проверок и один упавший
+        (2, 0, 4, 3), (2, 60, 4, 1), (2, 120, 4, 4)
+    ])
+
+    report = compute_sla(series, since=0, now=400)
+
+    assert report[1]['checks'] == 6
+    assert report[1]['uptime'] == pytest.approx(50.0)
+    assert report[1]['outages'] == 2
+    assert report[1]['longest'] == 120
+    assert report[1]['downtime'] == 120 + 40
+    assert report[2]['uptime'] == pytest.approx(8 / 12 * 100)
+    assert (report[2]['outages'], report[2]['downtime']) == (1, 60)
+    assert compute_sla(series, since=500, now=600) == {}
+    assert format_duration(3900) == "1ч 5м"
+
+
+@pytest.mark.asyncio
+async def test_report_engine_merges_recent_minutes_and_hourly_history(tmp_path):
+    """Последние сутки отчет берет поминутно из сырых результатов, старше - из часовых агрегатов"""
+    db = Database(f"sqlite:///{tmp_path / 'monitor.db'}")
+    db.add_user(1, 1)
+    website_id = db.add_website(1, "https://example.com", 60)
+    now = datetime.now()
+    db.save_check_results([
+        (website_id, {'status': status, 'status_code': 200, 'response_time': 10.0,
+                      'timestamp': now - timedelta(minutes=minutes)})
+        for minutes, status in ((30, 'up'), (20, 'down'), (10, 'up'))
+    ])
+    with db.get_connection() as conn:
+        conn.execute(
+            "INSERT INTO check_results_hourly (website_id, bucket, total_checks, up_checks) VALUES (?, ?, 10, 0)",
+            (website_id, to_hour_bucket(now - timedelta(days=10)))
+        )
+        conn.commit()
+
+    adb = AsyncDatabase(db)
+    engine = SlaReportEngine(adb, cache_ttl=3600)
+    try:
+        report = await engine.report(1)
+        db.save_check_results([(website_id, {'status': 'down', 'status_code': 0, 'response_time': 0,
+                                             'timestamp': now})])
+        cached = await engine.report(1)
+    finally:
+        await adb.close()
+
+    assert report["24ч"][website_id]['checks'] == 3
+    assert report["24ч"][website_id]['outages'] == 1
+    assert report["24ч"][website_id]['downtime'] == pytest.approx(600, abs=2)
+    assert report["30д"][website_id]['checks'] == 13
+    assert report["30д"][website_id]['outages'] == 2
+    assert cached == report
+
+
+def test_check_series_is_aggregated_per_minute(tmp_path):
+    """Сырые результаты сворачиваются по минутам еще в базе"""
+    db = Database(f"sqlite:///{tmp_path / 'monitor.db'}")
+    db.add_user(1, 1)
+    website_id = db.add_website(1, "https://example.com", 60)
+    minute = datetime.now().replace(second=0, microsecond=0) - timedelta(minutes=5)
+    db.save_check_results([
+        (website_id, {'status': status, 'status_code': 200, 'response_time': 10.0,
+                      'timestamp': minute + timedelta(seconds=seconds)})
+        for seconds, status in ((1, 'up'), (20, 'down'), (40, 'up'), (61, 'up'))
+    ])
+
+    series = db.get_user_check_series(1, minute - timedelta(hours=1))
+    db.close()
+
+    assert series[['total', 'up']].tolist() == [(3, 2), (1, 1)]
+    assert series['t'][1] - series['t'][0] == 60
@@ -0,0 +1,159 @@
+import pytest
+from bot.checker import canonicalize_url
+from bot.registry import WebsiteRegistry
+from bot.scheduler import MonitoringScheduler
+
+
+class FakeEngine:
+    def __init__(self):
+        self.scheduled = {}
+        self.delays = {}
+
+    def schedule(self, key, interval, delay=None):
+        self.scheduled[key] = interval
+        self.delays[key] = delay
+
+    def cancel(self, key):
+        self.scheduled.pop(key, None)
+
+    def start(self):
+        pass
+
+
+def make_scheduler():
+    scheduler = MonitoringScheduler(notifier=None, registry=None, checker=None, writer=None)
+    scheduler.engine = FakeEngine()
+    return scheduler
+
+
+def test_canonicalize_url():
+    """Разные записи одного адреса приводятся к одному виду"""
+    assert canonicalize_url("HTTPS://Example.COM") == "https://example.com/"
+    assert canonicalize_url("https://example.com:443/#top") == "https://example.com/"
+    assert canonicalize_url("http://example.com:8080/a?b=1") == "http://example.com:8080/a?b=1"
+
+
+def test_same_url_shares_one_probe():
+    """Одинаковые URL с одним интервалом проверяются одной задачей"""
+    scheduler = make_scheduler()
+    scheduler.add_website_to_monitor({'id': 1, 'url': "https://example.com", 'user_id': 1, 'check_interval': 60})
+    scheduler.add_website_to_monitor({'id': 2, 'url': "https://EXAMPLE.com/", 'user_id': 2, 'check_interval': 60})
+    scheduler.add_website_to_monitor({'id': 3, 'url': "https://example.com", 'user_id': 3, 'check_interval': 120})
+
+    assert len(scheduler.engine.scheduled) == 2
+    assert scheduler.probes[("https://example.com/", 60, "get", None)] == {1, 2}
+
+    scheduler.remove_website_from_monitor(1)
+    assert ("https://example.com/", 60, "get", None) in scheduler.engine.scheduled
+    scheduler.remove_website_from_monitor(2)
+    assert ("https://example.com/", 60, "get", None) not in scheduler.engine.scheduled
+    assert list(scheduler.probes) == [("https://example.com/", 120, "get", None)]
+
+
+def test_scheduler_shares_website_dicts_with_registry():
+    """Планировщик и реестр работают с одними и теми же словарями сайтов"""
+    scheduler = make_scheduler()
+    scheduler.add_website_to_monitor({'id': 1, 'url': "https://example.com", 'user_id': 7, 'check_interval': 60})
+
+    website = scheduler.registry.get(1)
+    assert scheduler.jobs[1] is website
+    assert scheduler.registry.get_user_websites(7) == [website]
+
+    scheduler.registry.update_status(1, 'down', 0)
+    assert scheduler.jobs[1]['last_status'] == 'down'
+
+    scheduler.remove_website_from_monitor(1)
+    assert scheduler.registry.get_user_websites(7) == []
+
+
+def test_bulk_add_staggers_first_runs():
+    """Импортированные сайты начинают проверяться не одновременно, а вразнос по интервалу"""
+    scheduler = make_scheduler()
+    scheduler.add_websites_to_monitor([
+        {'id': number, 'url': f"https://site{number}.example.com", 'user_id': 1, 'check_interval': 100}
+        for number in range(4)
+    ])
+
+    delays = sorted(scheduler.engine.delays.values())
+    assert delays == [0, 25, 50, 75]
+    assert len(scheduler.registry.get_user_websites(1)) == 4
+
+
+def test_phase_delay_is_deterministic_and_spread():
+    """Фаза ключа не меняется между запусками, а ключи распределены по интервалу"""
+    keys = [(f"https://site{number}.example.com/", 60, "get", None) for number in range(600)]
+    now = 1_700_000_000.0
+
+    delays = [MonitoringScheduler.phase_delay(key, now) for key in keys]
+    assert delays == [MonitoringScheduler.phase_delay(key, now) for key in keys]
+    assert all(0 <= delay < 60 for delay in delays)
+    # Через 10 секунд до той же фазы остается на 10 секунд меньше (по модулю интервала)
+    assert MonitoringScheduler.phase_delay(keys[0], now + 10) == pytest.approx((delays[0] - 10) % 60)
+    # Каждая десятисекундная доля интервала получает примерно шестую часть ключей
+    for start in range(0, 60, 10):
+        assert 60 < sum(start <= delay < start + 10 for delay in delays) < 140
+
+
+def test_content_keyword_is_part_of_probe_key():
+    """Проверки содержимого одного адреса с разными словами не склеиваются"""
+    scheduler = make_scheduler()
+    base = {'url': "https://example.com", 'user_id': 1, 'check_interval': 60, 'probe_mode': 'content'}
+    scheduler.add_website_to_monitor({**base, 'id': 1, 'content_keyword': "ok"})
+    scheduler.add_website_to_monitor({**base, 'id': 2, 'content_keyword': "ready"})
+    scheduler.add_website_to_monitor({**base, 'id': 3, 'content_keyword': "ok"})
+
+    assert scheduler.probes[("https://example.com/", 60, "content", "ok")] == {1, 3}
+    assert scheduler.probes[("https://example.com/", 60, "content", "ready")] == {2}
+
+
+def test_last_content_subscriber_clears_checker_cache():
+    """Кэш проверки содержимого освобождается, когда уходит последний подписчик"""
+    class FakeChecker:
+        def __init__(self):
+            self.forgotten = []
+
+        def forget(self, cache_key):
+            self.forgotten.append(cache_key)
+
+    scheduler = make_scheduler()
+    scheduler.checker = FakeChecker()
+    base = {'url': "https://example.com", 'user_id': 1, 'check_interval': 60,
+            'probe_mode': 'content', 'content_keyword': "ok"}
+    scheduler.add_website_to_monitor({**base, 'id': 1})
+    scheduler.add_website_to_monitor({**base, 'id': 2})
+    # Тот же адрес с другим интервалом - отдельная проверка со своим кэшем
+    scheduler.add_website_to_monitor({**base, 'id': 3, 'check_interval': 300})
+
+    scheduler.remove_website_from_monitor(1)
+    assert scheduler.checker.forgotten == []
+    scheduler.remove_website_from_monitor(2)
+    assert scheduler.checker.forgotten == [("https://example.com/", 60, "content", "ok")]
+
+
+@pytest.mark.asyncio
+async def test_registry_keeps_website_when_db_delete_fails():
+    """Если база не выключила сайт, он остается в реестре"""
+    class FailingDatabase:
+        async def delete_website(self, user_id, website_id):
+            return False
+
+    registry = WebsiteRegistry(FailingDatabase())
+    registry.put({'id': 1, 'url': "https://example.com", 'user_id': 7, 'check_interval': 60})
+
+    assert not await registry.delete_website(7, 1)
+    assert 1 in registry
+    assert [website['id'] for website in registry.get_user_websites(7)] == [1]
+
+
+@pytest.mark.asyncio
+async def test_start_skips_website_with_unparsable_url():
+    """Строки с некорректным адресом или интервалом пропускаются при запуске, остальные сайты проверяются"""
+    scheduler = make_scheduler()
+    scheduler.registry.put({'id': 1, 'url': "https://example.com:99999", 'user_id': 1, 'check_interval': 60})
+    scheduler.registry.put({'id': 3, 'url': "https://example.org", 'user_id': 1, 'check_interval': 0})
+    scheduler.registry.put({'id': 2, 'url': "https://example.com", 'user_id': 1, 'check_interval': 60})
+
+    await scheduler.start()
+
+    assert list(scheduler.jobs) == [2]
+    assert list(scheduler.engine.scheduled) == [("https://example.com/", 60, "get", None)]
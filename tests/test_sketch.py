@@ -0,0 +1,40 @@
+import random
+import pytest
+from bot.sketch import LatencySketch, RELATIVE_ACCURACY
+
+
+def exact_quantile(values, q):
+    ordered = sorted(values)
+    return ordered[int(q * (len(ordered) - 1))]
+
+
+def test_quantiles_within_relative_accuracy():
+    """Оценки квантилей отличаются от точных не больше заявленной погрешности"""
+    generator = random.Random(1)
+    values = [generator.lognormvariate(4, 1) for _ in range(20000)]
+    sketch = LatencySketch()
+    for value in values:
+        sketch.add(value)
+
+    for q in (0.5, 0.95, 0.99):
+        assert sketch.quantile(q) == pytest.approx(exact_quantile(values, q), rel=RELATIVE_ACCURACY)
+    assert len(sketch.to_bytes()) < 2048
+
+
+def test_merge_equals_single_sketch_and_roundtrips():
+    """Слияние скетчей дает тот же результат, что и один общий скетч"""
+    first, second, combined = LatencySketch(), LatencySketch(), LatencySketch()
+    for value in (0, 0.5, 3, 120, 120, 4500):
+        first.add(value)
+        combined.add(value)
+    for value in (80, 250, 9000):
+        second.add(value)
+        combined.add(value)
+
+    merged = LatencySketch.from_bytes(first.to_bytes()).merge(LatencySketch.from_bytes(second.to_bytes()))
+
+    assert merged.count == combined.count == 9
+    assert merged.bins == combined.bins
+    assert merged.quantile(0) == 0.0
+    assert merged.quantile(1) == pytest.approx(9000, rel=RELATIVE_ACCURACY)
+    assert LatencySketch().quantile(0.5) is None
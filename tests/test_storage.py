@@ -0,0 +1,161 @@
+import os
+import pytest
+import pytest_asyncio
+from datetime import datetime, timedelta
+from bot.config import Config
+from bot.database import AsyncDatabase, Database
+from bot.storage import create_database, parse_db_url, sqlite_path
+
+pytest.importorskip("greenlet")
+pytest.importorskip("aiosqlite")
+from bot.sqlalchemy_storage import SqlAlchemyDatabase
+
+
+def test_parse_db_url():
+    """Диалект и драйвер берутся из схемы, путь без схемы - файл SQLite"""
+    assert parse_db_url("sqlite:///database/monitor.db") == ('sqlite', None)
+    assert parse_db_url("postgresql+asyncpg://bot:secret@db/monitor") == ('postgresql', 'asyncpg')
+    assert parse_db_url("database/monitor.db") == ('sqlite', None)
+
+
+def test_sqlite_path():
+    """Относительные и абсолютные пути SQLite"""
+    assert sqlite_path("sqlite:///database/monitor.db") == os.path.abspath("database/monitor.db")
+    assert sqlite_path("sqlite:////tmp/monitor.db?timeout=5") == "/tmp/monitor.db"
+    with pytest.raises(ValueError):
+        sqlite_path("sqlite:///:memory:")
+
+
+@pytest.mark.asyncio
+async def test_create_database_picks_backend(tmp_path):
+    """Обычный sqlite:// - AsyncDatabase, URL с async-драйвером - пул SQLAlchemy"""
+    db = create_database(Config(db_url=f"sqlite:///{tmp_path / 'plain.db'}"))
+    assert isinstance(db, AsyncDatabase)
+    await db.close()
+
+    db = create_database(Config(db_url=f"sqlite+aiosqlite:///{tmp_path / 'pooled.db'}"))
+    assert isinstance(db, SqlAlchemyDatabase)
+    await db.close()
+
+
+@pytest_asyncio.fixture
+async def sa_db(tmp_path):
+    db = SqlAlchemyDatabase(f"sqlite+aiosqlite:///{tmp_path / 'monitor.db'}", pool_size=2)
+    await db.start()
+    yield db
+    await db.close()
+
+
+def make_result(status='up', response_time=120.0, timestamp=None):
+    return {
+        'status': status,
+        'status_code': 200 if status == 'up' else 0,
+        'response_time': response_time,
+        'timestamp': timestamp or datetime.now()
+    }
+
+
+@pytest.mark.asyncio
+async def test_sqlalchemy_roundtrip(sa_db):
+    """Пул SQLAlchemy выполняет тот же контракт, что и AsyncDatabase"""
+    assert await sa_db.add_user(1, 100)
+    assert await sa_db.add_user(1, 100)
+    website_id = await sa_db.add_website(1, "https://example.com/", 60)
+    imported = await sa_db.add_websites(1, [
+        ("https://a.example.com/", 60, 'get'),
+        ("https://b.example.com/", 300, 'head')
+    ])
+    assert [site['url'] for site in imported] == ["https://a.example.com/", "https://b.example.com/"]
+    assert imported[1]['probe_mode'] == 'head'
+
+    await sa_db.save_check_results([
+        (website_id, make_result('up', 100.0)),
+        (website_id, make_result('up', 300.0)),
+        (website_id, make_result('down', None)),
+    ])
+    await sa_db.save_check_results([(website_id, make_result('up', 200.0))])
+
+    stats = await sa_db.get_website_stats(website_id)
+    assert stats['total_checks'] == 4
+    assert stats['up_checks'] == 3
+    assert stats['avg_response_time'] == pytest.approx(150.0)
+
+    user_stats = await sa_db.get_user_websites_stats(1)
+    assert [row['id'] for row in user_stats] == [website_id] + [site['id'] for site in imported]
+    assert user_stats[0]['last_status'] == 'up'
+
+    hourly = await sa_db.get_hourly_stats(website_id, datetime.now() - timedelta(hours=1))
+    assert sum(row['total_checks'] for row in hourly) == 4
+    assert min(row['response_time_min'] for row in hourly) == 0
+
+    percentiles = await sa_db.get_user_latency_percentiles(1, datetime.now() - timedelta(days=1))
+    assert percentiles[website_id]['p50'] == pytest.approx(200.0, rel=0.02)
+
+    series = await sa_db.get_user_check_series(1, datetime.now() - timedelta(days=1))
+    # Результаты одной минуты сворачиваются в одну точку
+    assert series['total'].sum() == 4
+    assert series['up'].sum() == 3
+    hourly_series = await sa_db.get_user_hourly_series(1, datetime.now() - timedelta(days=1), datetime.now())
+    assert hourly_series['total'].sum() == 4
+
+    user_page = await sa_db.get_user_websites_page(1, before_id=imported[1]['id'], limit=1)
+    assert [site['id'] for site in user_page] == [imported[0]['id']]
+    page = await sa_db.get_active_websites_page(website_id, 1)
+    assert [site['id'] for site in page] == [imported[0]['id']]
+    assert await sa_db.delete_website(1, imported[0]['id'])
+    assert not await sa_db.delete_website(2, website_id)
+    assert [site['id'] async for site in sa_db.iter_active_websites(page_size=1)] == [website_id, imported[1]['id']]
+
+
+@pytest.mark.asyncio
+async def test_sqlalchemy_compaction(sa_db):
+    """Старые результаты сворачиваются в минутные агрегаты, часовые - в дневные"""
+    await sa_db.add_user(1, 100)
+    website_id = await sa_db.add_website(1, "https://example.com/", 60)
+    old = datetime.now() - timedelta(days=10)
+    await sa_db.save_check_results([
+        (website_id, make_result('up', 100.0, old)),
+        (website_id, make_result('up', 300.0, old)),
+        (website_id, make_result('up', 200.0)),
+    ])
+
+    assert await sa_db.compact_raw_results(datetime.now() - timedelta(days=7), 100) == 2
+    series = await sa_db.get_user_check_series(1, old - timedelta(hours=1))
+    assert sorted(series['total'].tolist()) == [1, 2]
+
+    assert await sa_db.compact_hourly_stats(datetime.now() - timedelta(days=7), 100) == 1
+    percentiles = await sa_db.get_user_latency_percentiles(1, datetime.now() - timedelta(days=1))
+    assert percentiles[website_id]['p50'] == pytest.approx(200.0, rel=0.02)
+
+    assert await sa_db.prune_rollup('check_results_minute', datetime.now() - timedelta(days=7), 100) == 1
+    with pytest.raises(ValueError):
+        await sa_db.prune_rollup('websites', datetime.now(), 100)
+
+
+@pytest.mark.asyncio
+async def test_sqlalchemy_shares_sqlite_file_format_with_database(tmp_path):
+    """Пул SQLAlchemy пишет время в файл Database в том же формате и попадает в те же бакеты"""
+    path = tmp_path / 'monitor.db'
+    db = Database(f"sqlite:///{path}")
+    db.add_user(1, 100)
+    website_id = db.add_website(1, "https://example.com/", 60)
+    moment = (datetime.now() - timedelta(hours=2)).replace(minute=10, second=5, microsecond=123456)
+    db.save_check_results([(website_id, make_result('up', 100.0, moment))])
+    db.close()
+
+    sa_db = SqlAlchemyDatabase(f"sqlite+aiosqlite:///{path}", pool_size=2)
+    await sa_db.start()
+    try:
+        await sa_db.save_check_results([(website_id, make_result('down', None, moment + timedelta(minutes=5)))])
+        hourly = await sa_db.get_hourly_stats(website_id, moment - timedelta(hours=1))
+    finally:
+        await sa_db.close()
+
+    assert [(row['total_checks'], row['up_checks']) for row in hourly] == [(2, 1)]
+    db = Database(f"sqlite:///{path}")
+    with db.get_connection() as conn:
+        timestamps = [row[0] for row in conn.execute("SELECT timestamp FROM check_results ORDER BY id")]
+        buckets = [row[0] for row in conn.execute("SELECT bucket FROM check_results_hourly")]
+    db.close()
+    assert all(len(value) == len("2024-01-01 00:00:00") for value in timestamps + buckets)
+    assert len(buckets) == 1
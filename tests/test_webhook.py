@@ -0,0 +1,134 @@
+import asyncio
+import socket
+import pytest
+import aiohttp
+from aiohttp import web
+from aiogram import Bot, Dispatcher, Router, types
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.client.telegram import TelegramAPIServer
+from bot.webhook import WebhookServer, SECRET_HEADER
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def make_update(update_id, text="ping"):
+    return {
+        'update_id': update_id,
+        'message': {
+            'message_id': update_id,
+            'date': 0,
+            'chat': {'id': 7, 'type': 'private'},
+            'from': {'id': 7, 'is_bot': False, 'first_name': "Test"},
+            'text': text
+        }
+    }
+
+
+async def start_fake_telegram(local_server):
+    """Локальная замена Bot API: запоминает вызванные методы и их параметры"""
+    calls = []
+
+    async def handle_method(request):
+        params = dict(await request.post())
+        method = request.match_info['method']
+        calls.append((method, params))
+        if method == 'sendMessage':
+            result = {
+                'message_id': len(calls),
+                'date': 0,
+                'chat': {'id': int(params['chat_id']), 'type': 'private'},
+                'text': params['text']
+            }
+        else:
+            result = True
+        return web.json_response({'ok': True, 'result': result})
+
+    app = web.Application()
+    app.router.add_post('/bot{token}/{method}', handle_method)
+    base_url = await local_server(app)
+    return calls, Bot(token="42:TEST", session=AiohttpSession(api=TelegramAPIServer.from_base(base_url)))
+
+
+@pytest.mark.asyncio
+async def test_webhook_processes_burst_with_concurrency_limit(local_server):
+    """Пачка обновлений обрабатывается полностью, но не больше лимита одновременно"""
+    calls, bot = await start_fake_telegram(local_server)
+    active = 0
+    peak = 0
+
+    router = Router()
+
+    @router.message()
+    async def echo(message: types.Message):
+        nonlocal active, peak
+        active += 1
+        peak = max(peak, active)
+        await asyncio.sleep(0.05)
+        active -= 1
+        await message.answer(f"pong {message.message_id}")
+
+    dp = Dispatcher()
+    dp.include_router(router)
+    port = free_port()
+    server = WebhookServer(dp, bot, "https://bot.example.com/webhook", host='127.0.0.1', port=port,
+                           secret_token="s3cret", max_concurrent_updates=3)
+    await server.start()
+    try:
+        url = f"http://127.0.0.1:{port}/webhook"
+        async with aiohttp.ClientSession() as session:
+            async def post(update_id):
+                async with session.post(url, json=make_update(update_id),
+                                        headers={SECRET_HEADER: "s3cret"}) as response:
+                    return response.status
+
+            statuses = await asyncio.gather(*(post(number) for number in range(1, 21)))
+    finally:
+        await server.stop()
+        await bot.session.close()
+
+    assert statuses == [200] * 20
+    assert 1 < peak <= 3
+    assert calls[0][0] == 'setWebhook'
+    assert calls[0][1]['secret_token'] == "s3cret"
+    replies = sorted(params['text'] for method, params in calls if method == 'sendMessage')
+    assert replies == sorted(f"pong {number}" for number in range(1, 21))
+
+
+@pytest.mark.asyncio
+async def test_webhook_rejects_wrong_secret(local_server):
+    """Обновления без правильного секретного токена отклоняются"""
+    calls, bot = await start_fake_telegram(local_server)
+    handled = []
+
+    router = Router()
+
+    @router.message()
+    async def record(message: types.Message):
+        handled.append(message.message_id)
+
+    dp = Dispatcher()
+    dp.include_router(router)
+    port = free_port()
+    server = WebhookServer(dp, bot, "https://bot.example.com/webhook", host='127.0.0.1', port=port,
+                           secret_token="s3cret")
+    await server.start()
+    try:
+        url = f"http://127.0.0.1:{port}/webhook"
+        async with aiohttp.ClientSession() as session:
+            async with session.post(url, json=make_update(1), headers={SECRET_HEADER: "wrong"}) as response:
+                assert response.status == 401
+            async with session.post(url, json=make_update(2)) as response:
+                assert response.status == 401
+            async with session.post(url, data="not json", headers={SECRET_HEADER: "s3cret"}) as response:
+                assert response.status == 400
+            async with session.post(url, json=make_update(3), headers={SECRET_HEADER: "s3cret"}) as response:
+                assert response.status == 200
+    finally:
+        await server.stop()
+        await bot.session.close()
+
+    assert handled == [3]
@@ -0,0 +1,105 @@
+import asyncio
+import pytest
+from aiohttp import web
+from bot.config import Config
+from bot.metrics import PROBES, SCHEDULED_PROBES
+from bot.registry import WebsiteRegistry
+from bot.workers import IPC_HOST, ShardedScheduler, encode_message
+
+
+class FakeWriter:
+    def __init__(self):
+        self.results = []
+
+    async def put(self, website_id, result):
+        self.results.append((website_id, result))
+
+
+class FakeNotifier:
+    def __init__(self):
+        self.sent = []
+
+    def notify(self, chat_id, text):
+        self.sent.append((chat_id, text))
+
+
+@pytest.mark.asyncio
+async def test_sharded_workers_report_results(local_server):
+    """Воркеры проверяют свои сайты и присылают результаты в основной процесс"""
+    async def handler(request):
+        return web.Response(text="ok")
+
+    app = web.Application()
+    app.router.add_get('/{name}', handler)
+    base_url = await local_server(app)
+
+    websites = [
+        {'id': i, 'url': f"{base_url}/site{i}", 'user_id': 1, 'check_interval': 1, 'last_status': 'unknown'}
+        for i in range(1, 5)
+    ]
+    writer = FakeWriter()
+    notifier = FakeNotifier()
+    registry = WebsiteRegistry()
+    for website in websites:
+        registry.put(website)
+    config = Config(probe_jitter=0, worker_metrics_interval=0.1)
+    scheduler = ShardedScheduler(notifier, registry, writer, config, processes=2)
+
+    local_probes = sum(PROBES.values().values())
+
+    def reported_probes():
+        return sum(PROBES.values().values()) - local_probes
+
+    try:
+        await scheduler.start()
+        for _ in range(100):
+            if {website_id for website_id, _ in writer.results} == {1, 2, 3, 4} and reported_probes() >= 4:
+                break
+            await asyncio.sleep(0.1)
+        # Метрики проверок приходят из воркеров, хотя в этом процессе проверок не было
+        assert reported_probes() >= 4
+        assert SCHEDULED_PROBES.values()[()] == 4
+    finally:
+        await scheduler.stop()
+
+    assert {website_id for website_id, _ in writer.results} == {1, 2, 3, 4}
+    assert all(result['status'] == 'up' for _, result in writer.results)
+    # Переход unknown -> up порождает уведомление по каждому сайту
+    assert len({text for _, text in notifier.sent}) >= 4
+    assert all(website['last_status'] == 'up' for website in registry.websites())
+
+
+@pytest.mark.asyncio
+async def test_ipc_rejects_clients_without_worker_secret():
+    """Чужой локальный клиент не получает сайты шарда и не вызывает перезапуск воркера"""
+    registry = WebsiteRegistry()
+    registry.put({'id': 1, 'url': "https://example.com", 'user_id': 1, 'check_interval': 60})
+    scheduler = ShardedScheduler(FakeNotifier(), registry, FakeWriter(), Config(), processes=2)
+    spawned = []
+    scheduler._spawn = spawned.append
+    scheduler.jobs[1] = registry.get(1)
+    server = await asyncio.start_server(scheduler._handle_worker, IPC_HOST, 0)
+    port = server.sockets[0].getsockname()[1]
+    try:
+        for hello in (
+            {'op': 'hello', 'shard': scheduler.shard_for(scheduler.jobs[1])},
+            {'op': 'hello', 'shard': 0, 'secret': 'guess'},
+            {'op': 'hello', 'shard': 5, 'secret': scheduler._secret},
+        ):
+            reader, stream = await asyncio.open_connection(IPC_HOST, port)
+            stream.write(encode_message(hello))
+            await stream.drain()
+            assert await reader.read() == b''
+            stream.close()
+
+        reader, stream = await asyncio.open_connection(IPC_HOST, port)
+        stream.write(b"not json\n")
+        await stream.drain()
+        assert await reader.read() == b''
+        stream.close()
+    finally:
+        server.close()
+        await server.wait_closed()
+
+    assert spawned == []
+    assert scheduler._streams == {}